@@ -0,0 +1,28 @@
+"""add reservation idempotency_key
+
+Revision ID: 0b6e93d5a7c1
+Revises: f19a6d2c8b47
+Create Date: 2026-10-18 17:48:27.115093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b6e93d5a7c1'
+down_revision: Union[str, None] = 'f19a6d2c8b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('reservation', sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+    op.create_index('ux_reservation_user_idempotency_key', 'reservation', ['user_id', 'idempotency_key'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ux_reservation_user_idempotency_key', table_name='reservation')
+    op.drop_column('reservation', 'idempotency_key')
@@ -0,0 +1,42 @@
+"""add dead_letter
+
+Revision ID: 0c5d7e3a9f16
+Revises: f41b8d6a0c72
+Create Date: 2026-10-18 23:14:27.550381
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c5d7e3a9f16'
+down_revision: Union[str, None] = 'f41b8d6a0c72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('dead_letter',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('task', sa.String(length=200), nullable=False),
+    sa.Column('args', sa.String(), nullable=False),
+    sa.Column('kwargs', sa.String(), nullable=False),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.Column('retries', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('failed_at', sa.DateTime(), nullable=False),
+    sa.Column('replayed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_dead_letter_pending', 'dead_letter', ['id'], unique=False,
+                    sqlite_where=sa.text('replayed_at IS NULL'),
+                    postgresql_where=sa.text('replayed_at IS NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_dead_letter_pending', table_name='dead_letter',
+                  sqlite_where=sa.text('replayed_at IS NULL'),
+                  postgresql_where=sa.text('replayed_at IS NULL'))
+    op.drop_table('dead_letter')
@@ -0,0 +1,51 @@
+"""add reservation_series
+
+Revision ID: 2d7f85a1c3e9
+Revises: 0b6e93d5a7c1
+Create Date: 2026-10-18 18:21:40.662871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2d7f85a1c3e9'
+down_revision: Union[str, None] = '0b6e93d5a7c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('reservation_series',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('trainer_id', sa.Integer(), nullable=False),
+    sa.Column('service_id', sa.Integer(), nullable=False),
+    sa.Column('first_date', sa.String(), nullable=False),
+    sa.Column('time', sa.String(), nullable=False),
+    sa.Column('every_days', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('idempotency_key', sa.String(length=64), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['service_id'], ['service.id'], ),
+    sa.ForeignKeyConstraint(['trainer_id'], ['trainer.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ux_reservation_series_user_idempotency_key', 'reservation_series', ['user_id', 'idempotency_key'], unique=True)
+
+    with op.batch_alter_table('reservation') as batch_op:
+        batch_op.add_column(sa.Column('series_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_reservation_series_id', 'reservation_series', ['series_id'], ['id'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('reservation') as batch_op:
+        batch_op.drop_constraint('fk_reservation_series_id', type_='foreignkey')
+        batch_op.drop_column('series_id')
+
+    op.drop_index('ux_reservation_series_user_idempotency_key', table_name='reservation_series')
+    op.drop_table('reservation_series')
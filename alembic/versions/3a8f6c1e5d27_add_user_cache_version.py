@@ -0,0 +1,30 @@
+"""add user.cache_version and user.versioned_at
+
+Revision ID: 3a8f6c1e5d27
+Revises: 0c5d7e3a9f16
+Create Date: 2026-10-18 23:58:12.604993
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a8f6c1e5d27'
+down_revision: Union[str, None] = '0c5d7e3a9f16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('user', sa.Column('cache_version', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('user', sa.Column('versioned_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_user_versioned_at', 'user', ['versioned_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_versioned_at', table_name='user')
+    op.drop_column('user', 'versioned_at')
+    op.drop_column('user', 'cache_version')
@@ -0,0 +1,51 @@
+"""add data_version and export_job
+
+Revision ID: 3c8a51f2d6e4
+Revises: 9e3f0c6a2b71
+Create Date: 2026-10-18 12:40:05.117492
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c8a51f2d6e4'
+down_revision: Union[str, None] = '9e3f0c6a2b71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('data_version',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('export_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=30), nullable=False),
+    sa.Column('format', sa.String(length=10), nullable=False),
+    sa.Column('params', sa.String(), nullable=False),
+    sa.Column('params_hash', sa.String(length=40), nullable=False),
+    sa.Column('data_version', sa.String(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('progress', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=True),
+    sa.Column('file_path', sa.String(), nullable=True),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.Column('requested_by', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['requested_by'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_export_job_params_hash', 'export_job', ['params_hash', 'data_version'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_export_job_params_hash', table_name='export_job')
+    op.drop_table('export_job')
+    op.drop_table('data_version')
@@ -0,0 +1,50 @@
+"""add waitlist_entry
+
+Revision ID: 5a9c3e7d1b24
+Revises: 2d7f85a1c3e9
+Create Date: 2026-10-18 19:05:12.418306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a9c3e7d1b24'
+down_revision: Union[str, None] = '2d7f85a1c3e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('waitlist_entry',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('trainer_id', sa.Integer(), nullable=False),
+    sa.Column('starts_at', sa.DateTime(), nullable=False),
+    sa.Column('service_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.String(), nullable=False),
+    sa.Column('time', sa.String(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('reservation_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['reservation_id'], ['reservation.id'], ),
+    sa.ForeignKeyConstraint(['service_id'], ['service.id'], ),
+    sa.ForeignKeyConstraint(['trainer_id'], ['trainer.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_waitlist_entry_slot_queue', 'waitlist_entry', ['trainer_id', 'starts_at', 'status', 'id'], unique=False)
+    op.create_index(
+        'ux_waitlist_entry_waiting_user', 'waitlist_entry', ['trainer_id', 'starts_at', 'user_id'], unique=True,
+        sqlite_where=sa.text("status = 'waiting'"),
+        postgresql_where=sa.text("status = 'waiting'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ux_waitlist_entry_waiting_user', table_name='waitlist_entry')
+    op.drop_index('ix_waitlist_entry_slot_queue', table_name='waitlist_entry')
+    op.drop_table('waitlist_entry')
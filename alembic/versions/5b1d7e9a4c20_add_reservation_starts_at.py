@@ -0,0 +1,109 @@
+"""add reservation starts_at / ends_at
+
+Revision ID: 5b1d7e9a4c20
+Revises: c2f26703978f
+Create Date: 2026-10-18 10:12:41.503217
+
+"""
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1d7e9a4c20'
+down_revision: Union[str, None] = 'c2f26703978f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BATCH_SIZE = 5000
+FORMATS = ("%Y-%m-%d %H:%M", "%d.%m.%Y %H:%M")
+
+
+def _parse(date, time):
+    raw = f"{date} {time}"
+    for fmt in FORMATS:
+        try:
+            return datetime.strptime(raw, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _backfill():
+    """ fill starts_at / ends_at from the legacy string columns, chunk by chunk """
+    bind = op.get_bind()
+
+    reservation = sa.table(
+        'reservation',
+        sa.column('id', sa.Integer),
+        sa.column('service_id', sa.Integer),
+        sa.column('date', sa.String),
+        sa.column('time', sa.String),
+        sa.column('starts_at', sa.DateTime),
+        sa.column('ends_at', sa.DateTime),
+    )
+    service = sa.table(
+        'service',
+        sa.column('id', sa.Integer),
+        sa.column('duration', sa.Integer),
+    )
+
+    update = (
+        reservation.update()
+        .where(reservation.c.id == sa.bindparam('row_id'))
+        .values(starts_at=sa.bindparam('new_start'), ends_at=sa.bindparam('new_end'))
+    )
+
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(
+                reservation.c.id,
+                reservation.c.date,
+                reservation.c.time,
+                service.c.duration,
+            )
+            .select_from(reservation.outerjoin(service, service.c.id == reservation.c.service_id))
+            .where(reservation.c.id > last_id)
+            .order_by(reservation.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+
+        if not rows:
+            break
+
+        params = []
+        for row_id, date, time, duration in rows:
+            start = _parse(date, time)
+            if start is None:
+                continue
+            end = start + timedelta(minutes=duration) if duration else None
+            params.append({'row_id': row_id, 'new_start': start, 'new_end': end})
+
+        if params:
+            bind.execute(update, params)
+
+        last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    op.add_column('reservation', sa.Column('starts_at', sa.DateTime(), nullable=True))
+    op.add_column('reservation', sa.Column('ends_at', sa.DateTime(), nullable=True))
+
+    _backfill()
+
+    op.create_index('ix_reservation_trainer_starts_at', 'reservation', ['trainer_id', 'starts_at'])
+    op.create_index('ix_reservation_user_starts_at', 'reservation', ['user_id', 'starts_at'])
+    op.create_index('ix_reservation_status_starts_at', 'reservation', ['status', 'starts_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_reservation_status_starts_at', table_name='reservation')
+    op.drop_index('ix_reservation_user_starts_at', table_name='reservation')
+    op.drop_index('ix_reservation_trainer_starts_at', table_name='reservation')
+    op.drop_column('reservation', 'ends_at')
+    op.drop_column('reservation', 'starts_at')
@@ -0,0 +1,55 @@
+"""seed data_version rows, add per-table version sequences
+
+Revision ID: 6e2a9d4c7b13
+Revises: 3a8f6c1e5d27
+Create Date: 2026-10-19 10:14:37.208415
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e2a9d4c7b13'
+down_revision: Union[str, None] = '3a8f6c1e5d27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# app/versions.py TRACKED_TABLES
+TRACKED_TABLES = ['audit_log', 'reservation', 'service', 'trainer', 'transaction', 'user']
+
+
+def upgrade() -> None:
+    # the app no longer inserts missing counters at runtime
+    for name in TRACKED_TABLES:
+        op.execute(
+            sa.text(
+                "INSERT INTO data_version (name, version) "
+                "SELECT :name, 0 WHERE NOT EXISTS (SELECT 1 FROM data_version WHERE name = :name)"
+            ).bindparams(name=name)
+        )
+
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # Postgres counts in sequences; continue from the row values so no
+    # stamp of an existing export job comes round again
+    for name in TRACKED_TABLES:
+        op.execute(f'CREATE SEQUENCE IF NOT EXISTS "data_version_{name}_seq"')
+        op.execute(
+            sa.text(
+                f"SELECT setval('\"data_version_{name}_seq\"', version) "
+                "FROM data_version WHERE name = :name AND version > 0"
+            ).bindparams(name=name)
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for name in TRACKED_TABLES:
+        op.execute(f'DROP SEQUENCE IF EXISTS "data_version_{name}_seq"')
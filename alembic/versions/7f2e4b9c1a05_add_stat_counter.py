@@ -0,0 +1,45 @@
+"""add stat_counter
+
+Revision ID: 7f2e4b9c1a05
+Revises: 3c8a51f2d6e4
+Create Date: 2026-10-18 13:55:32.640118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f2e4b9c1a05'
+down_revision: Union[str, None] = '3c8a51f2d6e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# initial values; per-day session counters are filled by the reconcile job
+SEED = {
+    'users': 'SELECT count(*) FROM "user"',
+    'trainers': 'SELECT count(*) FROM trainer',
+    'services': 'SELECT count(*) FROM service',
+    'reservations': 'SELECT count(*) FROM reservation',
+    'active_reservations': "SELECT count(*) FROM reservation WHERE status = 'active'",
+    'canceled_reservations': "SELECT count(*) FROM reservation WHERE status = 'canceled'",
+    'revenue': "SELECT -coalesce(sum(amount), 0) FROM \"transaction\" WHERE type IN ('payment', 'refund')",
+}
+
+
+def upgrade() -> None:
+    op.create_table('stat_counter',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+    for name, query in SEED.items():
+        op.execute(f"INSERT INTO stat_counter (name, value) SELECT '{name}', ({query})")
+
+
+def downgrade() -> None:
+    op.drop_table('stat_counter')
@@ -0,0 +1,38 @@
+"""add stat_delta
+
+Revision ID: 8b3f1c6e2a94
+Revises: 6e2a9d4c7b13
+Create Date: 2026-10-19 10:52:18.937260
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b3f1c6e2a94'
+down_revision: Union[str, None] = '6e2a9d4c7b13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('stat_delta',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_stat_delta_name', 'stat_delta', ['name'], unique=False)
+
+
+def downgrade() -> None:
+    # fold what's left before dropping it
+    op.execute(
+        "UPDATE stat_counter SET value = value + "
+        "(SELECT coalesce(sum(value), 0) FROM stat_delta WHERE stat_delta.name = stat_counter.name)"
+    )
+    op.drop_index('ix_stat_delta_name', table_name='stat_delta')
+    op.drop_table('stat_delta')
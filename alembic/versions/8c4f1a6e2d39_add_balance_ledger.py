@@ -0,0 +1,55 @@
+"""add balance ledger: transaction idempotency key, balance_snapshot
+
+Revision ID: 8c4f1a6e2d39
+Revises: 5a9c3e7d1b24
+Create Date: 2026-10-18 19:52:03.907114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4f1a6e2d39'
+down_revision: Union[str, None] = '5a9c3e7d1b24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('transaction', sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+    op.create_index('ix_transaction_user_id_id', 'transaction', ['user_id', 'id'], unique=False)
+    op.create_index('ux_transaction_user_idempotency_key', 'transaction', ['user_id', 'idempotency_key'], unique=True)
+
+    op.create_table('balance_snapshot',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('balance', sa.Integer(), nullable=False),
+    sa.Column('last_transaction_id', sa.Integer(), nullable=False),
+    sa.Column('taken_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # opening entries: balances changed without a transaction row so far
+    op.execute("""
+        INSERT INTO "transaction" (user_id, amount, type, created_at)
+        SELECT u.id,
+               COALESCE(u.funds, 0) - COALESCE(t.total, 0),
+               'adjustment',
+               CURRENT_TIMESTAMP
+        FROM "user" u
+        LEFT JOIN (
+            SELECT user_id, SUM(amount) AS total FROM "transaction" GROUP BY user_id
+        ) t ON t.user_id = u.id
+        WHERE COALESCE(u.funds, 0) != COALESCE(t.total, 0)
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""DELETE FROM "transaction" WHERE type = 'adjustment'""")
+    op.drop_table('balance_snapshot')
+    op.drop_index('ux_transaction_user_idempotency_key', table_name='transaction')
+    op.drop_index('ix_transaction_user_id_id', table_name='transaction')
+    op.drop_column('transaction', 'idempotency_key')
@@ -0,0 +1,42 @@
+"""add reservation search indexes
+
+Revision ID: 9e3f0c6a2b71
+Revises: 5b1d7e9a4c20
+Create Date: 2026-10-18 11:02:17.884310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e3f0c6a2b71'
+down_revision: Union[str, None] = '5b1d7e9a4c20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# SQLite (tests / local dev) gets its FTS5 shadow table from app.search.init_search
+def upgrade() -> None:
+    op.create_index('ix_reservation_service_starts_at', 'reservation', ['service_id', 'starts_at'])
+
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute('CREATE INDEX IF NOT EXISTS ix_user_login_trgm ON "user" USING gin (lower(login) gin_trgm_ops)')
+    op.execute('CREATE INDEX IF NOT EXISTS ix_user_email_trgm ON "user" USING gin (lower(email) gin_trgm_ops)')
+    op.execute('CREATE INDEX IF NOT EXISTS ix_trainer_name_trgm ON trainer USING gin (lower(name) gin_trgm_ops)')
+    op.execute('CREATE INDEX IF NOT EXISTS ix_service_name_trgm ON service USING gin (lower(name) gin_trgm_ops)')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_service_name_trgm')
+        op.execute('DROP INDEX IF EXISTS ix_trainer_name_trgm')
+        op.execute('DROP INDEX IF EXISTS ix_user_email_trgm')
+        op.execute('DROP INDEX IF EXISTS ix_user_login_trgm')
+
+    op.drop_index('ix_reservation_service_starts_at', table_name='reservation')
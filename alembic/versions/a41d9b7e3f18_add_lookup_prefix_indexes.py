@@ -0,0 +1,38 @@
+"""add lookup prefix indexes
+
+Revision ID: a41d9b7e3f18
+Revises: 7f2e4b9c1a05
+Create Date: 2026-10-18 15:08:44.201935
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41d9b7e3f18'
+down_revision: Union[str, None] = '7f2e4b9c1a05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('ix_user_login_lower', '"user"', 'login'),
+    ('ix_user_email_lower', '"user"', 'email'),
+    ('ix_trainer_name_lower', 'trainer', 'name'),
+    ('ix_service_name_lower', 'service', 'name'),
+]
+
+
+def upgrade() -> None:
+    # byte-order collation on Postgres so prefix ranges match "starts with" exactly
+    collate = ' COLLATE "C"' if op.get_bind().dialect.name == 'postgresql' else ''
+    for name, table, column in INDEXES:
+        op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} (lower({column}){collate}, id)')
+
+
+def downgrade() -> None:
+    for name, _table, _column in INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
@@ -0,0 +1,44 @@
+"""add pending_notification and notification_digest
+
+Revision ID: b3e9d2f75c18
+Revises: 8c4f1a6e2d39
+Create Date: 2026-10-18 20:37:48.215590
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e9d2f75c18'
+down_revision: Union[str, None] = '8c4f1a6e2d39'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('pending_notification',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('recipient', sa.String(length=150), nullable=False),
+    sa.Column('username', sa.String(length=50), nullable=True),
+    sa.Column('reservation_id', sa.Integer(), nullable=True),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('payload', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_pending_notification_recipient_id', 'pending_notification', ['recipient', 'id'], unique=False)
+
+    op.create_table('notification_digest',
+    sa.Column('recipient', sa.String(length=150), nullable=False),
+    sa.Column('due_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('recipient')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('notification_digest')
+    op.drop_index('ix_pending_notification_recipient_id', table_name='pending_notification')
+    op.drop_table('pending_notification')
@@ -0,0 +1,30 @@
+"""add keyset pagination indexes
+
+Revision ID: d58c2e0b7a93
+Revises: a41d9b7e3f18
+Create Date: 2026-10-18 15:40:12.518302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd58c2e0b7a93'
+down_revision: Union[str, None] = 'a41d9b7e3f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_reservation_user_id_id', 'reservation', ['user_id', 'id'], unique=False)
+    op.create_index('ix_transaction_user_created_at', 'transaction', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_audit_log_timestamp_id', 'audit_log', ['timestamp', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_audit_log_timestamp_id', table_name='audit_log')
+    op.drop_index('ix_transaction_user_created_at', table_name='transaction')
+    op.drop_index('ix_reservation_user_id_id', table_name='reservation')
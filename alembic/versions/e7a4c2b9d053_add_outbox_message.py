@@ -0,0 +1,43 @@
+"""add outbox_message
+
+Revision ID: e7a4c2b9d053
+Revises: b3e9d2f75c18
+Create Date: 2026-10-18 21:52:06.318417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a4c2b9d053'
+down_revision: Union[str, None] = 'b3e9d2f75c18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('outbox_message',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('task', sa.String(length=200), nullable=False),
+    sa.Column('args', sa.String(), nullable=False),
+    sa.Column('kwargs', sa.String(), nullable=False),
+    sa.Column('eta', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('last_error', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outbox_message_unsent', 'outbox_message', ['id'], unique=False,
+                    sqlite_where=sa.text('sent_at IS NULL'),
+                    postgresql_where=sa.text('sent_at IS NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_outbox_message_unsent', table_name='outbox_message',
+                  sqlite_where=sa.text('sent_at IS NULL'),
+                  postgresql_where=sa.text('sent_at IS NULL'))
+    op.drop_table('outbox_message')
@@ -0,0 +1,33 @@
+"""add trainer_availability
+
+Revision ID: f19a6d2c8b47
+Revises: e7b40c3d9f12
+Create Date: 2026-10-18 17:03:51.904217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f19a6d2c8b47'
+down_revision: Union[str, None] = 'e7b40c3d9f12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('trainer_availability',
+    sa.Column('trainer_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('busy', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['trainer_id'], ['trainer.id'], ),
+    sa.PrimaryKeyConstraint('trainer_id', 'day')
+    )
+    # filled from existing reservations by app.availability.init_availability at startup
+
+
+def downgrade() -> None:
+    op.drop_table('trainer_availability')
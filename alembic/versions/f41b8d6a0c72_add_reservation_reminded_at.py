@@ -0,0 +1,36 @@
+"""add reservation.reminded_at
+
+Revision ID: f41b8d6a0c72
+Revises: e7a4c2b9d053
+Create Date: 2026-10-18 22:31:40.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f41b8d6a0c72'
+down_revision: Union[str, None] = 'e7a4c2b9d053'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('reservation', sa.Column('reminded_at', sa.DateTime(), nullable=True))
+
+    # sessions that already started need no reminder: keep them out of the index
+    op.execute("UPDATE reservation SET reminded_at = starts_at WHERE starts_at < CURRENT_TIMESTAMP")
+
+    op.create_index('ix_reservation_remind_due', 'reservation', ['starts_at', 'id'], unique=False,
+                    sqlite_where=sa.text("status = 'active' AND reminded_at IS NULL"),
+                    postgresql_where=sa.text("status = 'active' AND reminded_at IS NULL"))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_reservation_remind_due', table_name='reservation',
+                  sqlite_where=sa.text("status = 'active' AND reminded_at IS NULL"),
+                  postgresql_where=sa.text("status = 'active' AND reminded_at IS NULL"))
+    op.drop_column('reservation', 'reminded_at')
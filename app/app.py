@@ -8,8 +8,7 @@ from flask_login import LoginManager, current_user
 from werkzeug.utils import secure_filename
 
 from app.database import init_db
-from app import database
-from app.models import User
+from app import database, passwords, user_cache
 from app.routes import auth_bp
 from app.routes.dashboard import dashboard_bp
 from app.routes.services import services_bp
@@ -39,12 +38,20 @@ login_manager.login_view = "auth.login"
 
 @login_manager.user_loader
 def load_user(user_id):
-    user = db_session.get(User, int(user_id))
+    # cached per process, no query on a hit; banned users load as None
+    user = user_cache.load(int(user_id))
     if not user:
-        print("⚠️ user_loader: user not found:", user_id)
+        print("⚠️ user_loader: user not found or banned:", user_id)
     return user
 
 
+# ==================== OVERLOAD ====================
+@app.errorhandler(passwords.HashingBusy)
+def hashing_busy(error):
+    # every password-hash worker is taken: shed instead of queueing (app/passwords.py)
+    return "The server is busy, please try again in a moment.", 503, {"Retry-After": "2"}
+
+
 # ==================== BLUEPRINTS ====================
 app.register_blueprint(auth_bp)
 app.register_blueprint(dashboard_bp)
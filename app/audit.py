@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from flask import has_request_context
+from flask_login import current_user
+
+from app import database
+from app.models import AuditLog
+
+
+def _actor_id(user_id):
+    if user_id is not None:
+        return user_id
+    if has_request_context() and current_user.is_authenticated:
+        return current_user.id
+    return None
+
+
+def _entry(action, entity, entity_id, user_id):
+    return {
+        "user_id": _actor_id(user_id),
+        "action": action,
+        "entity": entity,
+        "entity_id": entity_id,
+        "timestamp": datetime.utcnow(),
+    }
+
+
+# ----------------------- SAME TRANSACTION -------------------------
+def log_action(action, entity, entity_id=None, user_id=None, session=None):
+    """
+    Add an audit entry to the caller's transaction: it commits (or rolls
+    back) together with the change it describes. Does not commit.
+    user_id defaults to the logged-in user, None outside a request.
+    """
+    session = session or database.db_session
+    session.add(AuditLog(**_entry(action, entity, entity_id, user_id)))
@@ -0,0 +1,378 @@
+from datetime import date, datetime, time, timedelta
+
+from itertools import chain
+
+from sqlalchemy import bindparam, delete, event, inspect, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from app import database
+from app.bulk import merge_rows
+from app.models import Trainer, Reservation, TrainerAvailability
+
+
+# bookable hours, in SLOT_MINUTES steps: 07:00-22:00 = 60 slots,
+# so a day fits in one BIGINT (bit i = slot starting at OPEN + i * SLOT_MINUTES)
+SLOT_MINUTES = 15
+OPEN = time(7, 0)
+CLOSE = time(22, 0)
+SLOTS_PER_DAY = (CLOSE.hour * 60 + CLOSE.minute - OPEN.hour * 60 - OPEN.minute) // SLOT_MINUTES
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+
+MAX_DAYS = 31
+
+assert SLOTS_PER_DAY <= 63, "busy bitmap must fit a signed BIGINT"
+
+
+# ----------------------- BITMAPS ----------------------------------
+def _slot_index(moment, day, round_up=False):
+    minutes = (moment - datetime.combine(day, OPEN)).total_seconds() / 60
+    index = -(-minutes // SLOT_MINUTES) if round_up else minutes // SLOT_MINUTES
+    return int(min(max(index, 0), SLOTS_PER_DAY))
+
+
+def interval_masks(starts_at, ends_at):
+    """ {day: bitmask} of the slots [starts_at, ends_at) touches, within bookable hours """
+    if starts_at is None:
+        return {}
+    ends_at = ends_at or starts_at + timedelta(minutes=SLOT_MINUTES)
+
+    masks = {}
+    day = starts_at.date()
+    while datetime.combine(day, time.min) < ends_at:
+        first = _slot_index(max(starts_at, datetime.combine(day, OPEN)), day)
+        last = _slot_index(min(ends_at, datetime.combine(day, CLOSE)), day, round_up=True)
+        if last > first:
+            masks[day] = ((1 << (last - first)) - 1) << first
+        day += timedelta(days=1)
+    return masks
+
+
+def free_starts(busy, slots_needed):
+    """
+    Bitmask of slots where `slots_needed` consecutive slots are free.
+    A handful of shifts and ANDs: no reservation rows involved.
+    """
+    free = FULL_DAY & ~busy
+    starts = free
+    for shift in range(1, slots_needed):
+        starts &= free >> shift
+    # the session must also end before closing
+    return starts & ((1 << max(SLOTS_PER_DAY - slots_needed + 1, 0)) - 1)
+
+
+def slot_time(index):
+    minutes = OPEN.hour * 60 + OPEN.minute + index * SLOT_MINUTES
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+SLOT_TIMES = [slot_time(i) for i in range(SLOTS_PER_DAY)]
+
+
+def _bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+# ----------------------- WRITE ------------------------------------
+TRACKED_FIELDS = ("status", "trainer_id", "starts_at", "ends_at")
+
+
+def _busy_from_reservations(connection, day_from, day_to, trainer_ids=None):
+    """ {(trainer_id, day): busy} for [day_from, day_to), from active reservations """
+    stmt = select(Reservation.trainer_id, Reservation.starts_at, Reservation.ends_at).where(
+        Reservation.status == "active",
+        Reservation.starts_at >= datetime.combine(day_from, time.min) - timedelta(days=1),
+        Reservation.starts_at < datetime.combine(day_to, time.min),
+    )
+    if trainer_ids is not None:
+        stmt = stmt.where(Reservation.trainer_id.in_(sorted(trainer_ids)))
+
+    bitmaps = {}
+    for trainer_id, starts_at, ends_at in connection.execute(stmt):
+        for day, mask in interval_masks(starts_at, ends_at).items():
+            if day_from <= day < day_to:
+                bitmaps[(trainer_id, day)] = bitmaps.get((trainer_id, day), 0) | mask
+    return bitmaps
+
+
+def _lock_rows(connection, where):
+    """ {(trainer_id, day): busy} of the matching rows, locked in key order """
+    table = TrainerAvailability.__table__
+    return {
+        (trainer_id, day): busy
+        for trainer_id, day, busy in connection.execute(
+            select(table.c.trainer_id, table.c.day, table.c.busy)
+            .where(where)
+            .order_by(table.c.trainer_id, table.c.day)
+            .with_for_update()
+        )
+    }
+
+
+def _set_rows(connection, bitmaps):
+    """ overwrite existing rows' busy, one executemany """
+    if not bitmaps:
+        return
+    table = TrainerAvailability.__table__
+    connection.execute(
+        update(table)
+        .where(table.c.trainer_id == bindparam("t"), table.c.day == bindparam("d"))
+        .values(busy=bindparam("b")),
+        [{"t": t, "d": d, "b": busy} for (t, d), busy in sorted(bitmaps.items())],
+    )
+
+
+def _release(connection, trainer_days):
+    """
+    Recompute these trainer-days from their active reservations (this
+    flush included). Clearing the released bits instead would also free
+    a slot still shared with a neighbouring session whose length doesn't
+    fit the 15-minute grid (10:00-10:50 next to 10:50-11:40).
+
+    The rows are locked before the reservations are read: a concurrent
+    booking of the same day is waited for and then seen. A day with no
+    row has no bits to release.
+    """
+    table = TrainerAvailability.__table__
+    current = _lock_rows(connection, tuple_(table.c.trainer_id, table.c.day).in_(sorted(trainer_days)))
+    if not current:
+        return
+
+    days = [day for _, day in current]
+    busy = _busy_from_reservations(
+        connection, min(days), max(days) + timedelta(days=1), {t for t, _ in current}
+    )
+    _set_rows(connection, {
+        key: busy.get(key, 0) for key, old in current.items() if busy.get(key, 0) != old
+    })
+
+
+def _occupy(connection, intervals):
+    """ all (trainer_id, starts_at, ends_at) in one upsert, e.g. a whole series """
+    merged = {}
+    for trainer_id, starts_at, ends_at in intervals:
+        for day, mask in interval_masks(starts_at, ends_at).items():
+            merged[(trainer_id, day)] = merged.get((trainer_id, day), 0) | mask
+
+    merge_rows(
+        connection,
+        TrainerAvailability.__table__,
+        ("trainer_id", "day"),
+        "busy",
+        [{"trainer_id": t, "day": d, "busy": mask} for (t, d), mask in sorted(merged.items())],
+        "|",
+    )
+
+
+_UNKNOWN = object()
+
+
+def _known_old(state, name):
+    """ the value before this flush, if this session has it in memory """
+    history = state.attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    # never loaded (expired, or set without being read first)
+    return _UNKNOWN
+
+
+@event.listens_for(Session, "before_flush")
+def _remember_old_slots(session, flush_context, instances):
+    """
+    Old (status, trainer_id, starts_at, ends_at) of changed and deleted
+    reservations, taken while the database still holds them. Values this
+    session never loaded are read back in one query.
+    """
+    old, missing = {}, []
+    for obj in chain(session.dirty, session.deleted):
+        if not isinstance(obj, Reservation) or obj.id is None:
+            continue
+        state = inspect(obj)
+        if obj not in session.deleted and not any(
+            state.attrs[name].history.has_changes() for name in TRACKED_FIELDS
+        ):
+            continue
+        values = tuple(_known_old(state, name) for name in TRACKED_FIELDS)
+        old[obj.id] = values
+        if _UNKNOWN in values:
+            missing.append(obj.id)
+
+    if missing:
+        columns = [getattr(Reservation, name) for name in TRACKED_FIELDS]
+        for res_id, *values in session.connection().execute(
+            select(Reservation.id, *columns).where(Reservation.id.in_(missing))
+        ):
+            old[res_id] = tuple(values)
+
+    if old:
+        session.info["availability_old"] = old
+
+
+@event.listens_for(Session, "after_flush")
+def _track_reservations(session, flush_context):
+    """
+    Keep bitmaps in step with every Reservation write, in the same
+    transaction: new and deleted rows, status changes and moves.
+    """
+    old_slots = session.info.pop("availability_old", {})
+    released, occupied = set(), []
+
+    def release(obj):
+        status, trainer_id, starts_at, ends_at = old_slots.get(
+            obj.id, tuple(_known_old(inspect(obj), name) for name in TRACKED_FIELDS)
+        )
+        if status == "active":
+            released.update((trainer_id, day) for day in interval_masks(starts_at, ends_at))
+
+    for obj in session.new:
+        if isinstance(obj, Reservation) and (obj.status or "active") == "active":
+            occupied.append((obj.trainer_id, obj.starts_at, obj.ends_at))
+
+    for obj in session.deleted:
+        if isinstance(obj, Reservation):
+            release(obj)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Reservation):
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[name].history.has_changes() for name in TRACKED_FIELDS):
+            continue
+
+        release(obj)
+        if obj.status == "active":
+            occupied.append((obj.trainer_id, obj.starts_at, obj.ends_at))
+
+    if not released and not occupied:
+        return
+
+    connection = session.connection()
+    # recomputed days already include this flush's sessions; the OR below
+    # covers days that had no row yet
+    if released:
+        _release(connection, released)
+    _occupy(connection, occupied)
+
+
+def rebuild(session=None, day_from=None, days=MAX_DAYS):
+    """
+    Recompute bitmaps for [day_from, day_from + days) from reservations.
+
+    Merged, not replaced: existing rows are locked before reservations
+    are read and only rewritten (or dropped) where they differ, missing
+    ones are OR-ed in, so a booking committed while this runs is never
+    overwritten by an older snapshot.
+    """
+    session = session or database.db_session
+    day_from = day_from or date.today()
+    day_to = day_from + timedelta(days=days)
+    table = TrainerAvailability.__table__
+
+    # days that are over are never queried again. First: on SQLite this
+    # write takes the database lock before anything is read
+    session.execute(delete(table).where(table.c.day < date.today() - timedelta(days=1)))
+
+    connection = session.connection()
+    current = _lock_rows(connection, (table.c.day >= day_from) & (table.c.day < day_to))
+    bitmaps = _busy_from_reservations(connection, day_from, day_to)
+
+    _set_rows(connection, {
+        key: bitmaps[key] for key, old in current.items() if bitmaps.get(key, old) != old
+    })
+    emptied = [key for key in current if key not in bitmaps]
+    if emptied:
+        session.execute(delete(table).where(tuple_(table.c.trainer_id, table.c.day).in_(emptied)))
+    merge_rows(
+        connection,
+        table,
+        ("trainer_id", "day"),
+        "busy",
+        [
+            {"trainer_id": t, "day": d, "busy": busy}
+            for (t, d), busy in sorted(bitmaps.items()) if (t, d) not in current
+        ],
+        "|",
+    )
+    session.commit()
+    return len(bitmaps)
+
+
+def init_availability(engine=None):
+    """ first start (or right after the migration): build bitmaps from reservations """
+    engine = engine or database.engine
+    with Session(bind=engine) as session:
+        if session.query(TrainerAvailability.trainer_id).first() is None:
+            rebuild(session)
+
+
+# ----------------------- READ -------------------------------------
+def free_slots(service, gym_id=None, day_from=None, days=7, trainer_id=None, now=None):
+    """
+    Free start times for `service` at every active trainer of the gym,
+    for `days` days from day_from: one indexed read of the bitmaps, the
+    rest is bit arithmetic.
+    """
+    now = now or datetime.now()
+    day_from = day_from or now.date()
+    days = max(1, min(days, MAX_DAYS))
+    gym_id = gym_id or service.fitness_center_id
+    slots_needed = max(1, -(-(service.duration or SLOT_MINUTES) // SLOT_MINUTES))
+
+    session = database.db_session
+    trainers = session.query(Trainer.id, Trainer.name).filter(Trainer.is_active == True)
+    if gym_id:
+        trainers = trainers.filter(Trainer.gym_id == gym_id)
+    if trainer_id:
+        trainers = trainers.filter(Trainer.id == trainer_id)
+    trainers = trainers.order_by(Trainer.id).all()
+
+    busy = dict.fromkeys(((t.id, day_from + timedelta(days=i)) for t in trainers for i in range(days)), 0)
+    if trainers:
+        busy.update(
+            ((row.trainer_id, row.day), row.busy)
+            for row in session.execute(
+                select(TrainerAvailability.trainer_id, TrainerAvailability.day, TrainerAvailability.busy)
+                .where(
+                    TrainerAvailability.trainer_id.in_([t.id for t in trainers]),
+                    TrainerAvailability.day >= day_from,
+                    TrainerAvailability.day < day_from + timedelta(days=days),
+                )
+            )
+        )
+
+    result = []
+    for i in range(days):
+        day = day_from + timedelta(days=i)
+
+        # slots that already started are not bookable
+        past = 0
+        if day == now.date():
+            past = (1 << _slot_index(now, day, round_up=True)) - 1
+        elif day < now.date():
+            past = FULL_DAY
+
+        result.append({
+            "date": day.isoformat(),
+            "trainers": [
+                {
+                    "id": t.id,
+                    "name": t.name,
+                    "times": [
+                        SLOT_TIMES[index]
+                        for index in _bits(free_starts(busy[(t.id, day)], slots_needed) & ~past)
+                    ],
+                }
+                for t in trainers
+            ],
+        })
+
+    return {
+        "service_id": service.id,
+        "duration": service.duration,
+        "slot_minutes": SLOT_MINUTES,
+        "days": result,
+    }
@@ -0,0 +1,65 @@
+from sqlalchemy import select, update
+
+
+def _upsert_insert(connection):
+    """ the dialect's INSERT with ON CONFLICT support, or None """
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    return None
+
+
+def merge_rows(connection, table, keys, column, rows, combine):
+    """
+    Fold many rows into `table` in one executemany:
+    INSERT ... ON CONFLICT (keys) DO UPDATE SET column = combine(old, new).
+
+    `combine` is "+" (counters) or "|" (bitmaps).
+    Other dialects fall back to UPDATE-then-INSERT per row.
+    """
+    if not rows:
+        return
+
+    insert = _upsert_insert(connection)
+    if insert is not None:
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[k] for k in keys],
+            set_={column: table.c[column].op(combine)(stmt.excluded[column])},
+        )
+        connection.execute(stmt, rows)
+        return
+
+    for row in rows:
+        result = connection.execute(
+            update(table)
+            .where(*[table.c[k] == row[k] for k in keys])
+            .values({column: table.c[column].op(combine)(row[column])})
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**row))
+
+
+def insert_missing(connection, table, keys, row):
+    """
+    INSERT ... ON CONFLICT (keys) DO NOTHING for one row.
+    True if this call inserted it, i.e. won the race for the keys.
+    """
+    insert = _upsert_insert(connection)
+    if insert is not None:
+        stmt = insert(table).values(**row).on_conflict_do_nothing(
+            index_elements=[table.c[k] for k in keys],
+        )
+        return connection.execute(stmt).rowcount == 1
+
+    exists = connection.execute(
+        select(*[table.c[k] for k in keys]).where(*[table.c[k] == row[k] for k in keys])
+    ).first()
+    if exists:
+        return False
+    connection.execute(table.insert().values(**row))
+    return True
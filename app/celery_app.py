@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.signals import worker_process_shutdown
 
 celery = Celery(
     'app',
@@ -7,3 +8,50 @@ celery = Celery(
 )
 
 celery.autodiscover_tasks(['app'], force=True)
+
+# publisher confirms: the outbox relay marks a message sent only once
+# RabbitMQ has taken it (app/outbox.py)
+celery.conf.broker_transport_options = {'confirm_publish': True}
+
+# periodic jobs (run with: celery -A app.celery_app.celery beat)
+celery.conf.beat_schedule = {
+    # dashboard counters = stat_counter + unfolded stat_delta rows
+    'fold-stats': {
+        'task': 'app.tasks.fold_stats_task',
+        'schedule': 60,
+    },
+    'reconcile-stats': {
+        'task': 'app.tasks.reconcile_stats_task',
+        'schedule': 15 * 60,
+    },
+    # safety net for writes that bypass the ORM; also drops past days
+    'rebuild-availability': {
+        'task': 'app.tasks.rebuild_availability_task',
+        'schedule': 60 * 60,
+    },
+    # keeps ledger.balance() a snapshot + a short tail
+    'snapshot-balances': {
+        'task': 'app.tasks.snapshot_balances_task',
+        'schedule': 60 * 60,
+    },
+    'flush-digests': {
+        'task': 'app.tasks.flush_digests_task',
+        'schedule': 60,
+    },
+    'reconcile-ledger': {
+        'task': 'app.tasks.reconcile_ledger_task',
+        'schedule': 24 * 60 * 60,
+    },
+    # window query over ix_reservation_remind_due; see app/reminders.py
+    'schedule-reminders': {
+        'task': 'app.tasks.schedule_reminders_task',
+        'schedule': 5 * 60,
+    },
+}
+
+
+@worker_process_shutdown.connect
+def close_smtp_pool(**kwargs):
+    """ QUIT pooled SMTP sessions instead of dropping the sockets """
+    from app.smtp_pool import close_pool
+    close_pool()
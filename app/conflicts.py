@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+
+from app import database
+from app.models import Reservation
+
+
+# Postgres: created by migration e7b40c3d9f12
+EXCLUSION_CONSTRAINT = "reservation_trainer_no_overlap"
+
+# lower bound for the SQLite overlap scan: no session is longer than this
+MAX_SESSION = timedelta(hours=24)
+
+
+class SlotConflict(Exception):
+    """ the trainer already has an active session overlapping this one """
+
+
+def _is_exclusion_violation(error):
+    orig = getattr(error, "orig", None)
+    return (
+        getattr(orig, "pgcode", None) == "23P01"
+        or EXCLUSION_CONSTRAINT in str(orig)
+    )
+
+
+def overlap_filter(trainer_id, starts_at, ends_at, exclude_ids=()):
+    """ active sessions of the trainer intersecting [starts_at, ends_at) """
+    ends_at = ends_at or starts_at + timedelta(minutes=1)
+
+    conditions = [
+        Reservation.trainer_id == trainer_id,
+        Reservation.status == "active",
+        # both bounds on starts_at: a range scan of ix_reservation_trainer_starts_at
+        Reservation.starts_at > starts_at - MAX_SESSION,
+        Reservation.starts_at < ends_at,
+        or_(
+            Reservation.ends_at > starts_at,
+            and_(Reservation.ends_at.is_(None), Reservation.starts_at >= starts_at),
+        ),
+    ]
+    if exclude_ids:
+        conditions.append(Reservation.id.notin_(exclude_ids))
+    return and_(*conditions)
+
+
+def claim_slot(reservation, session=None):
+    """
+    Flush a new or moved reservation and make sure its trainer is free.
+    Call right before commit. On conflict the transaction is rolled back
+    and SlotConflict is raised.
+
+    Postgres: the exclusion constraint rejects the write itself.
+    SQLite: the overlap query runs after our own write, i.e. while this
+    transaction holds the database write lock, so a concurrent booking
+    can't slip in between the check and the commit.
+    """
+    claim_slots([reservation], session)
+
+
+def claim_slots(reservations, session=None):
+    """ claim_slot for a set (e.g. a series): one flush, one overlap query """
+    session = session or database.db_session
+
+    try:
+        session.flush()
+    except IntegrityError as e:
+        session.rollback()
+        if _is_exclusion_violation(e):
+            raise SlotConflict() from e
+        raise
+
+    if session.get_bind().dialect.name == "postgresql":
+        return
+
+    active = [r for r in reservations if r.status == "active" and r.starts_at is not None]
+    if not active:
+        return
+
+    own_ids = [r.id for r in reservations]
+    clash = (
+        session.query(Reservation.id)
+        .filter(or_(*[
+            overlap_filter(r.trainer_id, r.starts_at, r.ends_at, exclude_ids=own_ids)
+            for r in active
+        ]))
+        .first()
+    )
+    if clash:
+        session.rollback()
+        raise SlotConflict()
@@ -22,6 +22,17 @@ from app.models import Base   # ← Safe to import now because models.py does no
 
 Base.query = db_session.query_property()
 
+from app import versions  # noqa: F401  registers the data-version commit listener
+from app import availability  # noqa: F401  registers the slot-bitmap flush listener
+from app import user_cache  # noqa: F401  registers the user-version flush listener
+
+
 def init_db():
     from app import models  # Importing the models
+    from app.search import init_search
+    from app.availability import init_availability
+    from app.versions import init_versions
     Base.metadata.create_all(bind=engine)
+    init_versions(engine)
+    init_search(engine)
+    init_availability(engine)
@@ -0,0 +1,132 @@
+"""
+Dead-letter table for Celery tasks that failed for good: a permanent
+error, or a transient one that outlasted its retries (see EmailTask in
+app/tasks.py). Nothing is dropped silently; once the cause is fixed the
+tasks are replayed through the outbox.
+
+    python -m app.dead_letters list
+    python -m app.dead_letters replay --all
+    python -m app.dead_letters replay --task app.tasks.send_welcome_email_task
+    python -m app.dead_letters replay --id 12 --id 15
+"""
+import argparse
+import json
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+
+from app import database, outbox, stats
+from app.models import DeadLetter
+
+
+# ----------------------- WRITE ------------------------------------
+def record(task, args, kwargs, error, retries=0, session=None):
+    """ park a failed task (own transaction: the task's work is gone anyway) """
+    session = session or database.db_session
+    session.add(DeadLetter(
+        task=task,
+        args=json.dumps(list(args or ())),
+        kwargs=json.dumps(kwargs or {}),
+        error=f"{type(error).__name__}: {error}"[:500],
+        retries=retries,
+    ))
+    stats.incr("email_dead_letters", session=session)
+    session.commit()
+    print(f"[DLQ] {task} failed after {retries} retries: {error}")
+
+
+def record_retry(session=None):
+    session = session or database.db_session
+    stats.incr("email_retries", session=session)
+    session.commit()
+
+
+# ----------------------- READ -------------------------------------
+def _waiting(query, ids=None, task=None):
+    query = query.where(DeadLetter.replayed_at.is_(None))
+    if ids:
+        query = query.where(DeadLetter.id.in_(ids))
+    if task:
+        query = query.where(DeadLetter.task == task)
+    return query
+
+
+def depth(session=None):
+    """ tasks waiting for a replay """
+    session = session or database.db_session
+    return session.execute(_waiting(select(func.count(DeadLetter.id)))).scalar()
+
+
+def metrics(session=None):
+    """ retry and dead-letter counters for the admin dashboard """
+    session = session or database.db_session
+    counters = stats.read(("email_retries", "email_dead_letters"), session)
+    return {
+        "retries": counters["email_retries"],
+        "dead_letters": counters["email_dead_letters"],
+        "depth": depth(session),
+    }
+
+
+def waiting(session=None, ids=None, task=None, limit=None):
+    session = session or database.db_session
+    query = _waiting(select(DeadLetter), ids, task).order_by(DeadLetter.id).limit(limit)
+    return session.execute(query).scalars().all()
+
+
+# ----------------------- REPLAY -----------------------------------
+def replay(session=None, ids=None, task=None, limit=None):
+    """
+    Re-publish waiting tasks through the outbox and mark them replayed,
+    in one transaction. A replayed task that fails again comes back as a
+    new row. Returns how many were replayed.
+    """
+    session = session or database.db_session
+    letters = waiting(session, ids, task, limit)
+    if not letters:
+        return 0
+
+    for letter in letters:
+        outbox.publish(letter.task, json.loads(letter.args), json.loads(letter.kwargs), session=session)
+
+    table = DeadLetter.__table__
+    session.execute(
+        update(table)
+        .where(table.c.id.in_([letter.id for letter in letters]))
+        .values(replayed_at=datetime.utcnow())
+    )
+    session.commit()
+    return len(letters)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.dead_letters")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="show tasks waiting for a replay")
+
+    replay_parser = commands.add_parser("replay", help="re-publish tasks through the outbox")
+    replay_parser.add_argument("--id", type=int, action="append", dest="ids")
+    replay_parser.add_argument("--task")
+    replay_parser.add_argument("--limit", type=int)
+    replay_parser.add_argument("--all", action="store_true")
+
+    options = parser.parse_args(argv)
+    try:
+        if options.command == "list":
+            for letter in waiting():
+                print(f"{letter.id}\t{letter.failed_at:%Y-%m-%d %H:%M}\t{letter.task}\t{letter.error}")
+            print(f"{depth()} waiting")
+            return 0
+
+        if not (options.ids or options.task or options.all):
+            parser.error("replay needs --id, --task or --all")
+        replayed = replay(ids=options.ids, task=options.task, limit=options.limit)
+        print(f"replayed {replayed}, {depth()} still waiting")
+        return 0
+    finally:
+        database.db_session.remove()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
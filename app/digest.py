@@ -0,0 +1,234 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+
+from app import database, outbox
+from app.bulk import insert_missing
+from app.models import PendingNotification, NotificationDigest
+
+
+# member emails are held this long (seconds) and sent as one digest;
+# 0 sends every email on its own, right away
+WINDOW = float(os.environ.get("NOTIFY_DIGEST_WINDOW", 60))
+
+
+def enabled():
+    return WINDOW > 0
+
+
+# ----------------------- BUFFER -----------------------------------
+def enqueue(recipient, username, kind, reservation_id=None, session=None, **details):
+    """ buffer one member email (see enqueue_many) """
+    return enqueue_many([{
+        "recipient": recipient,
+        "username": username,
+        "kind": kind,
+        "reservation_id": reservation_id,
+        "details": details,
+    }], session)
+
+
+def enqueue_many(items, session=None):
+    """
+    Buffer member emails in the caller's transaction (call before its
+    commit). The first email of a recipient's window also schedules
+    send_digest_task for the end of it, through the outbox: one broker
+    message per recipient per window, however many changes happen
+    meanwhile. Returns the recipients scheduled now.
+
+    A window that is already open is locked until the caller commits, so
+    collect() cannot end it between these inserts and that commit and
+    leave them behind.
+    """
+    if not items:
+        return []
+
+    session = session or database.db_session
+    now = datetime.utcnow()
+
+    session.execute(PendingNotification.__table__.insert(), [
+        {
+            "recipient": item["recipient"],
+            "username": item["username"],
+            "reservation_id": item.get("reservation_id"),
+            "kind": item["kind"],
+            "payload": json.dumps(item.get("details") or {}),
+            "created_at": now,
+        }
+        for item in items
+    ])
+
+    recipients = list(dict.fromkeys(item["recipient"] for item in items))
+    due_at = now + timedelta(seconds=WINDOW)
+    # sorted: two writers lock shared recipients in the same order
+    opened = {
+        recipient
+        for recipient in sorted(recipients)
+        if _open_window(session.connection(), recipient, due_at)
+    }
+    scheduled = [recipient for recipient in recipients if recipient in opened]
+    for recipient in scheduled:
+        outbox.publish("app.tasks.send_digest_task", (recipient,), countdown=WINDOW, session=session)
+    return scheduled
+
+
+def _open_window(connection, recipient, due_at):
+    """
+    True if this call opened the recipient's window; False if one is open,
+    its row now locked for the rest of the transaction. A window ended
+    between the two statements is opened again.
+    """
+    table = NotificationDigest.__table__
+    while True:
+        if insert_missing(connection, table, ("recipient",), {"recipient": recipient, "due_at": due_at}):
+            return True
+        locked = connection.execute(
+            select(table.c.recipient).where(table.c.recipient == recipient).with_for_update()
+        ).first()
+        if locked:
+            return False
+
+
+def collect(recipient):
+    """
+    Take everything buffered for the recipient, in order, and end the
+    window: later emails open a new one.
+    """
+    table = PendingNotification.__table__
+    with database.engine.begin() as conn:
+        conn.execute(delete(NotificationDigest.__table__).where(
+            NotificationDigest.__table__.c.recipient == recipient
+        ))
+        rows = conn.execute(
+            select(table).where(table.c.recipient == recipient).order_by(table.c.id)
+        ).all()
+        if rows:
+            conn.execute(delete(table).where(
+                table.c.recipient == recipient, table.c.id <= rows[-1].id
+            ))
+
+    return [
+        {
+            "username": row.username,
+            "kind": row.kind,
+            "reservation_id": row.reservation_id,
+            **json.loads(row.payload),
+        }
+        for row in rows
+    ]
+
+
+def overdue(now=None, grace=None):
+    """
+    Recipients whose digest should have gone out already: its task was
+    lost, or emails are buffered with no window open for them at all.
+    """
+    now = now or datetime.utcnow()
+    grace = timedelta(seconds=WINDOW) if grace is None else grace
+    digests = NotificationDigest.__table__
+    pending = PendingNotification.__table__
+    # pending_notification is drained every window: scanning it is cheap
+    orphaned = (
+        select(pending.c.recipient)
+        .where(
+            pending.c.created_at < now - timedelta(seconds=WINDOW) - grace,
+            ~select(digests.c.recipient).where(digests.c.recipient == pending.c.recipient).exists(),
+        )
+    )
+    with database.engine.connect() as conn:
+        return [
+            recipient for recipient, in conn.execute(
+                select(digests.c.recipient).where(digests.c.due_at < now - grace).union(orphaned)
+            )
+        ]
+
+
+# ----------------------- COALESCE ---------------------------------
+def coalesce(events):
+    """
+    Collapse superseded changes of the same reservation:
+
+        booked ... canceled      -> nothing
+        booked, updated ...      -> booked, at the final date/time
+        updated, updated ...     -> one update, to the final date/time
+        ... canceled             -> canceled
+
+    Events without a reservation (e.g. a series) are kept as they are.
+    """
+    groups = {}
+    for i, event in enumerate(events):
+        key = event.get("reservation_id") or ("single", i)
+        groups.setdefault(key, []).append(event)
+
+    result = []
+    for group in groups.values():
+        first, last = group[0], group[-1]
+        if first["kind"] == "booked" and last["kind"] == "canceled":
+            continue
+        if first["kind"] == "booked" and len(group) > 1:
+            last = {**first, "date": last.get("date"), "time": last.get("time")}
+        result.append(last)
+    return result
+
+
+# ----------------------- SEND -------------------------------------
+def _line(event):
+    kind = event["kind"]
+    if kind == "booked":
+        return (
+            f"Booked <b>{event['service_name']}</b> with <b>{event['trainer_name']}</b>: "
+            f"{event['date']}, {event['time']}"
+        )
+    if kind == "series":
+        return (
+            f"Booked {len(event['dates'])} sessions of <b>{event['service_name']}</b> "
+            f"with <b>{event['trainer_name']}</b> at {event['time']}: {', '.join(event['dates'])}"
+        )
+    if kind == "updated":
+        return f"Moved to <b>{event['date']}</b>, <b>{event['time']}</b>"
+    when = f": {event['date']}, {event['time']}" if event.get("date") else ""
+    return f"Canceled{when}"
+
+
+def render(events):
+    """ (subject, html) of a digest of several events """
+    items = "".join(f"<li>{_line(e)}</li>" for e in events)
+    html = f"""
+    <h2>Your Booking Updates</h2>
+    <p>Hello {events[-1]['username']},</p>
+    <ul>{items}</ul>
+    """
+    return f"Your bookings: {len(events)} updates", html
+
+
+def deliver(recipient, events):
+    """
+    Send what's left after coalescing: a lone event keeps its usual
+    email, several become one digest. Returns the number of emails sent.
+    """
+    from app import tasks
+
+    events = coalesce(events)
+    if not events:
+        return 0
+
+    if len(events) > 1:
+        tasks.send_email(recipient, *render(events))
+        return 1
+
+    e = events[0]
+    if e["kind"] == "booked":
+        tasks.send_booking_confirmation_email_task(
+            recipient, e["username"], e["service_name"], e["trainer_name"], e["date"], e["time"]
+        )
+    elif e["kind"] == "series":
+        tasks.send_series_confirmation_email_task(
+            recipient, e["username"], e["service_name"], e["trainer_name"], e["dates"], e["time"]
+        )
+    elif e["kind"] == "updated":
+        tasks.send_booking_updated_email_task(recipient, e["username"], e["date"], e["time"])
+    else:
+        tasks.send_booking_canceled_email_task(recipient, e["username"])
+    return 1
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from app import database
+from app.models import ExportJob
+from app.exports import EXPORTS, STATUSES, iter_csv, iter_ndjson, write_xlsx
+from app.versions import version_stamp
+
+
+# shared between the web app and the worker (both mount ./app)
+EXPORT_DIR = os.environ.get("EXPORT_DIR", "app/export_files")
+
+FORMATS = ("xlsx", "csv", "ndjson")
+
+# commit progress every N rows
+PROGRESS_EVERY = 5000
+
+
+def _params_hash(kind, export_format, params):
+    raw = json.dumps({"kind": kind, "format": export_format, **params}, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _normalize_params(kind, params):
+    params = {
+        "status": params.get("status") or "all",
+        "date_from": params.get("date_from") or None,
+        "date_to": params.get("date_to") or None,
+    }
+    # upcoming / today / past move with the clock, not only with the data
+    if kind == "reservations" and params["status"] in STATUSES:
+        params["as_of"] = datetime.now().strftime("%Y-%m-%d %H:00")
+    return params
+
+
+# ----------------------- REQUEST ----------------------------------
+def request_export(kind, export_format, params, user_id=None):
+    """
+    Return a job for these parameters: an existing one if the data has
+    not changed since it was produced, otherwise a freshly queued one.
+    """
+    from app.tasks import run_export_job_task
+
+    if kind not in EXPORTS or export_format not in FORMATS:
+        raise ValueError(f"unknown export {kind}/{export_format}")
+
+    session = database.db_session
+    params = _normalize_params(kind, params)
+    params_hash = _params_hash(kind, export_format, params)
+    data_version = version_stamp(session, EXPORTS[kind][3])
+
+    existing = (
+        session.query(ExportJob)
+        .filter(
+            ExportJob.params_hash == params_hash,
+            ExportJob.data_version == data_version,
+            ExportJob.status.in_(("pending", "running", "done")),
+        )
+        .order_by(ExportJob.id.desc())
+        .first()
+    )
+
+    if existing and (existing.status != "done" or os.path.exists(existing.file_path or "")):
+        return existing
+
+    job = ExportJob(
+        kind=kind,
+        format=export_format,
+        params=json.dumps(params, sort_keys=True),
+        params_hash=params_hash,
+        data_version=data_version,
+        requested_by=user_id,
+    )
+    session.add(job)
+    session.commit()
+
+    run_export_job_task.delay(job.id)
+
+    return job
+
+
+# ----------------------- WORKER -----------------------------------
+def run_export_job(job_id):
+    session = database.db_session
+    job = session.get(ExportJob, job_id)
+    if not job or job.status == "done":
+        return
+
+    rows_fn, header, title, _tables = EXPORTS[job.kind]
+    params = json.loads(job.params)
+    params.pop("as_of", None)
+
+    job.status = "running"
+    job.progress = 0
+    session.commit()
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = os.path.join(EXPORT_DIR, f"{job.kind}-{job.params_hash[:12]}-{job.id}.{job.format}")
+    tmp_path = path + ".part"
+
+    progress = {"rows": 0}
+
+    def counted(rows):
+        for row in rows:
+            yield row
+            progress["rows"] += 1
+            if progress["rows"] % PROGRESS_EVERY == 0:
+                job.progress = progress["rows"]
+                session.commit()
+
+    try:
+        rows = counted(rows_fn(**params))
+
+        if job.format == "xlsx":
+            with open(tmp_path, "wb") as f:
+                write_xlsx(rows, f, header=header, title=title)
+        else:
+            chunks = iter_csv(rows, header) if job.format == "csv" else iter_ndjson(rows, header)
+            with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+
+        os.replace(tmp_path, path)
+    except Exception as e:
+        session.rollback()
+        job.status = "failed"
+        job.error = str(e)[:500]
+        job.finished_at = datetime.utcnow()
+        session.commit()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    job.status = "done"
+    job.progress = progress["rows"]
+    job.total = progress["rows"]
+    job.file_path = path
+    job.finished_at = datetime.utcnow()
+    session.commit()
+
+
+def job_status(job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "format": job.format,
+        "status": job.status,
+        "progress": job.progress,
+        "total": job.total,
+        "error": job.error,
+        "download_url": f"/admin/exports/{job.id}/download" if job.status == "done" else None,
+    }
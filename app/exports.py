@@ -0,0 +1,219 @@
+import csv
+import io
+import json
+import tempfile
+from datetime import datetime
+
+from openpyxl import Workbook
+from sqlalchemy import select
+
+from app import database
+from app.models import User, Trainer, Service, Reservation, Transaction, AuditLog
+from app.reservation_query import STATUSES, day_bounds, reservation_ui_status
+
+
+BATCH_SIZE = 1000
+
+RESERVATION_HEADER = ["ID", "User login", "User email", "Trainer", "Service", "Date", "Status"]
+TRANSACTION_HEADER = ["ID", "User login", "Amount", "Type", "Created at"]
+AUDIT_LOG_HEADER = ["ID", "Admin login", "Action", "Entity", "Entity ID", "Timestamp"]
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+# ----------------------- ROWS -------------------------------------
+def _parse_day(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def _keyset_batches(stmt, id_column, batch_size):
+    last_id = 0
+    while True:
+        batch = database.db_session.execute(
+            stmt.where(id_column > last_id)
+            .order_by(id_column)
+            .limit(batch_size)
+        ).all()
+
+        if not batch:
+            break
+
+        yield batch
+        last_id = batch[-1][0]
+
+
+def _date_range(stmt, column, date_from, date_to):
+    day_from = _parse_day(date_from)
+    if day_from:
+        stmt = stmt.where(column >= day_bounds(day_from)[0])
+
+    day_to = _parse_day(date_to)
+    if day_to:
+        stmt = stmt.where(column < day_bounds(day_to)[1])
+
+    return stmt
+
+
+def reservation_export_rows(status="all", date_from=None, date_to=None, batch_size=BATCH_SIZE):
+    """
+    Yield export rows in id order, one bounded keyset batch at a time.
+    Related names come from the same SELECT (outer joins), so there are
+    no lazy loads and nothing piles up in the session.
+    """
+    stmt = (
+        select(
+            Reservation.id,
+            User.login,
+            User.email,
+            Trainer.name,
+            Service.name,
+            Reservation.date,
+            Reservation.time,
+            Reservation.status,
+        )
+        .select_from(Reservation)
+        .outerjoin(User, Reservation.user_id == User.id)
+        .outerjoin(Trainer, Reservation.trainer_id == Trainer.id)
+        .outerjoin(Service, Reservation.service_id == Service.id)
+    )
+
+    if status in STATUSES:
+        stmt = stmt.where(reservation_ui_status() == status)
+
+    stmt = _date_range(stmt, Reservation.starts_at, date_from, date_to)
+
+    for batch in _keyset_batches(stmt, Reservation.id, batch_size):
+        for res_id, login, email, trainer, service, date, time, res_status in batch:
+            yield [
+                res_id,
+                login or "",
+                email or "",
+                trainer or "",
+                service or "",
+                f"{date} {time}",
+                res_status,
+            ]
+
+
+def transaction_export_rows(status="all", date_from=None, date_to=None, batch_size=BATCH_SIZE):
+    """ status filters on Transaction.type (payment / refund / topup) """
+    stmt = (
+        select(
+            Transaction.id,
+            User.login,
+            Transaction.amount,
+            Transaction.type,
+            Transaction.created_at,
+        )
+        .select_from(Transaction)
+        .outerjoin(User, Transaction.user_id == User.id)
+    )
+
+    if status and status != "all":
+        stmt = stmt.where(Transaction.type == status)
+
+    stmt = _date_range(stmt, Transaction.created_at, date_from, date_to)
+
+    for batch in _keyset_batches(stmt, Transaction.id, batch_size):
+        for tx_id, login, amount, tx_type, created_at in batch:
+            yield [tx_id, login or "", amount, tx_type, created_at]
+
+
+def audit_log_export_rows(status="all", date_from=None, date_to=None, batch_size=BATCH_SIZE):
+    """ status filters on AuditLog.action """
+    stmt = (
+        select(
+            AuditLog.id,
+            User.login,
+            AuditLog.action,
+            AuditLog.entity,
+            AuditLog.entity_id,
+            AuditLog.timestamp,
+        )
+        .select_from(AuditLog)
+        .outerjoin(User, AuditLog.user_id == User.id)
+    )
+
+    if status and status != "all":
+        stmt = stmt.where(AuditLog.action == status)
+
+    stmt = _date_range(stmt, AuditLog.timestamp, date_from, date_to)
+
+    for batch in _keyset_batches(stmt, AuditLog.id, batch_size):
+        for log_id, login, action, entity, entity_id, timestamp in batch:
+            yield [log_id, login or "", action, entity, entity_id, timestamp]
+
+
+# kind -> (rows, header, sheet title, tables the export reads)
+EXPORTS = {
+    "reservations": (
+        reservation_export_rows,
+        RESERVATION_HEADER,
+        "Reservations",
+        ("reservation", "user", "trainer", "service"),
+    ),
+    "transactions": (
+        transaction_export_rows,
+        TRANSACTION_HEADER,
+        "Transactions",
+        ("transaction", "user"),
+    ),
+    "audit_log": (
+        audit_log_export_rows,
+        AUDIT_LOG_HEADER,
+        "Audit log",
+        ("audit_log", "user"),
+    ),
+}
+
+
+# ----------------------- FORMATS ----------------------------------
+def iter_csv(rows, header=RESERVATION_HEADER, batch_size=BATCH_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if i % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def iter_ndjson(rows, header=RESERVATION_HEADER, batch_size=BATCH_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(dict(zip(header, row)), default=str))
+        if len(chunk) >= batch_size:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+
+def write_xlsx(rows, fileobj, header=RESERVATION_HEADER, title="Reservations"):
+    """ write-only workbook: rows go straight to disk, not into memory """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    ws.append(header)
+
+    for row in rows:
+        ws.append(row)
+
+    wb.save(fileobj)
+
+
+def xlsx_file(rows, header=RESERVATION_HEADER, title="Reservations"):
+    fileobj = tempfile.TemporaryFile()
+    write_xlsx(rows, fileobj, header=header, title=title)
+    fileobj.seek(0)
+    return fileobj
@@ -0,0 +1,176 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm.util import identity_key
+
+from app import database, user_cache
+from app.models import User, Transaction, BalanceSnapshot
+
+
+# entries younger than this stay in the tail: a transaction that took an id
+# but hasn't committed yet must not end up behind a snapshot
+SNAPSHOT_LAG = timedelta(minutes=5)
+
+SNAPSHOT_CHUNK = 500
+
+
+class InsufficientFunds(Exception):
+    """ the balance doesn't cover the price """
+
+
+# ----------------------- WRITE ------------------------------------
+def post(user_id, amount, type, idempotency_key=None, require_funds=False, session=None):
+    """
+    Append one entry and move the cached User.funds in the caller's
+    transaction: the only way a balance changes.
+
+    require_funds: the debit is a conditional UPDATE, so concurrent
+    spends can't take the balance below zero (raises InsufficientFunds).
+    A repeated idempotency_key returns None and changes nothing.
+    """
+    session = session or database.db_session
+
+    if idempotency_key and _entry(session, user_id, idempotency_key) is not None:
+        return None
+
+    table = User.__table__
+    stmt = update(table).where(table.c.id == user_id)
+    if require_funds:
+        stmt = stmt.where(table.c.funds >= -amount)
+    result = session.execute(stmt.values(
+        funds=func.coalesce(table.c.funds, 0) + amount,
+        **user_cache.bump_values(),
+    ))
+    if result.rowcount == 0:
+        raise InsufficientFunds()
+    user_cache.note_bumped(session, [user_id])
+
+    entry = Transaction(
+        user_id=user_id,
+        amount=amount,
+        type=type,
+        idempotency_key=idempotency_key,
+        created_at=datetime.utcnow(),
+    )
+    session.add(entry)
+
+    user = session.identity_map.get(identity_key(User, user_id))
+    if user is not None:
+        session.expire(user, ["funds", "cache_version", "versioned_at"])
+
+    return entry
+
+
+def _entry(session, user_id, idempotency_key):
+    return (
+        session.query(Transaction)
+        .filter_by(user_id=user_id, idempotency_key=idempotency_key)
+        .first()
+    )
+
+
+# ----------------------- READ -------------------------------------
+def _tail():
+    """ (user_id, snapshot balance, sum and max id of the entries after it) """
+    snapshot = BalanceSnapshot.__table__
+    entries = Transaction.__table__
+    return (
+        select(
+            User.id.label("user_id"),
+            func.coalesce(snapshot.c.balance, 0).label("snapshot"),
+            func.coalesce(func.sum(entries.c.amount), 0).label("tail"),
+            func.max(entries.c.id).label("last_id"),
+        )
+        .select_from(User.__table__)
+        .outerjoin(snapshot, snapshot.c.user_id == User.id)
+        .outerjoin(entries, (entries.c.user_id == User.id) & (
+            entries.c.id > func.coalesce(snapshot.c.last_transaction_id, 0)
+        ))
+        .group_by(User.id, snapshot.c.balance)
+    )
+
+
+def balance(user_id, session=None):
+    """
+    Balance from the ledger: snapshot + the entries after it. Reads one
+    snapshot row and a short range of ix_transaction_user_id_id, however
+    long the history is.
+    """
+    session = session or database.db_session
+    row = session.execute(_tail().where(User.id == user_id)).first()
+    return row.snapshot + row.tail if row else 0
+
+
+# ----------------------- SNAPSHOTS --------------------------------
+def take_snapshots(session=None, now=None):
+    """
+    Fold every user's settled tail into their snapshot, so balance()
+    never sums more than SNAPSHOT_LAG (+ the schedule) worth of entries.
+    Returns the number of snapshots written.
+    """
+    session = session or database.db_session
+    cutoff = (now or datetime.utcnow()) - SNAPSHOT_LAG
+
+    boundary = session.execute(
+        select(func.max(Transaction.id)).where(Transaction.created_at < cutoff)
+    ).scalar()
+    if boundary is None:
+        return 0
+
+    rows = session.execute(
+        _tail()
+        .where(Transaction.__table__.c.id <= boundary)
+        .having(func.count(Transaction.__table__.c.id) > 0)
+    ).all()
+
+    table = BalanceSnapshot.__table__
+    taken_at = datetime.utcnow()
+    for start in range(0, len(rows), SNAPSHOT_CHUNK):
+        chunk = rows[start:start + SNAPSHOT_CHUNK]
+        session.execute(delete(table).where(table.c.user_id.in_([r.user_id for r in chunk])))
+        session.execute(table.insert(), [
+            {
+                "user_id": r.user_id,
+                "balance": r.snapshot + r.tail,
+                "last_transaction_id": r.last_id,
+                "taken_at": taken_at,
+            }
+            for r in chunk
+        ])
+    session.commit()
+    return len(rows)
+
+
+# ----------------------- RECONCILE --------------------------------
+def reconcile(session=None, fix=False, user_ids=None):
+    """
+    Compare every User.funds (or those of user_ids) with the ledger in
+    one grouped query. Returns {user_id: (funds, ledger)} for users that
+    disagree.
+
+    fix=True records each difference as an "adjustment" entry (the
+    ledger stays append-only), e.g. once for balances that predate it.
+    """
+    session = session or database.db_session
+    tail = _tail()
+    if user_ids is not None:
+        tail = tail.where(User.id.in_(user_ids))
+    tail = tail.subquery()
+
+    drift = {
+        user_id: (funds or 0, ledger)
+        for user_id, funds, ledger in session.execute(
+            select(User.id, User.funds, tail.c.snapshot + tail.c.tail)
+            .join(tail, tail.c.user_id == User.id)
+            .where(func.coalesce(User.funds, 0) != tail.c.snapshot + tail.c.tail)
+        )
+    }
+
+    if fix and drift:
+        session.add_all([
+            Transaction(user_id=user_id, amount=funds - ledger, type="adjustment", created_at=datetime.utcnow())
+            for user_id, (funds, ledger) in drift.items()
+        ])
+        session.commit()
+
+    return drift
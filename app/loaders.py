@@ -0,0 +1,36 @@
+from flask import g, has_request_context
+from sqlalchemy.orm import joinedload
+
+from app.models import Reservation
+
+
+# Named eager-loading profiles.
+# Every view that walks reservations and touches r.user / r.trainer / r.service
+# picks one of these instead of relying on per-row lazy SELECTs.
+PROFILES = {
+    # admin tables, exports and the single reservation page: who booked what with whom
+    "reservation_list": (
+        joinedload(Reservation.user),
+        joinedload(Reservation.trainer),
+        joinedload(Reservation.service),
+    ),
+    # a member's own reservations - the user is already known
+    "member_reservations": (
+        joinedload(Reservation.trainer),
+        joinedload(Reservation.service),
+    ),
+}
+
+
+# SQL statements a GET request that loads one of these profiles may run,
+# the user loader included; tests/conftest.py checks every test request
+QUERY_BUDGETS = {
+    "reservation_list": 3,
+    "member_reservations": 2,
+}
+
+
+def load_options(profile):
+    if has_request_context():
+        g.setdefault("loader_profiles", set()).add(profile)
+    return PROFILES[profile]
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import func
+
+from app import database
+from app.models import User, Trainer, Service
+from app.pagination import keyset_page
+
+
+MAX_LIMIT = 50
+CACHE_SIZE = 1024
+CACHE_TTL = 30  # seconds
+
+
+# ----------------------- TTL LRU CACHE ----------------------------
+class TTLCache:
+    """ small per-process LRU whose entries also expire after `ttl` seconds """
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_cache = TTLCache()
+
+
+# ----------------------- PREFIX SEARCH ----------------------------
+def _prefix_key(column):
+    key = func.lower(column)
+    # byte order, so the range below is exactly "starts with"
+    if database.engine.dialect.name == "postgresql":
+        key = key.collate("C")
+    return key
+
+
+def _prefix_range(key, prefix):
+    """ key starts with prefix, as an index-friendly range """
+    if not prefix:
+        return None
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return (key >= prefix) & (key < upper)
+
+
+def _lookup(model, column, prefix, cursor, limit):
+    key = _prefix_key(column)
+
+    query = database.db_session.query(model.id, column, key.label("sort_key"))
+
+    match = _prefix_range(key, prefix.lower())
+    if match is not None:
+        query = query.filter(match)
+
+    rows, next_cursor = keyset_page(
+        query,
+        [key, model.id],
+        key_fn=lambda row: (row.sort_key, row.id),
+        cursor=cursor,
+        limit=limit,
+    )
+
+    return {
+        "results": [{"id": row.id, "label": row[1]} for row in rows],
+        "next_cursor": next_cursor,
+    }
+
+
+def _cached(kind, prefix, cursor, limit, build):
+    limit = max(1, min(int(limit or 20), MAX_LIMIT))
+    prefix = (prefix or "").strip()
+
+    cache_key = (kind, prefix.lower(), cursor or "", limit)
+    result = _cache.get(cache_key)
+    if result is None:
+        result = build(prefix, cursor, limit)
+        _cache.set(cache_key, result)
+    return result
+
+
+def lookup_users(prefix, cursor=None, limit=20):
+    """ login prefix, or email prefix when the query contains "@" """
+    def build(prefix, cursor, limit):
+        column = User.email if "@" in prefix else User.login
+        return _lookup(User, column, prefix, cursor, limit)
+
+    kind = "users:email" if "@" in (prefix or "") else "users:login"
+    return _cached(kind, prefix, cursor, limit, build)
+
+
+def lookup_trainers(prefix, cursor=None, limit=20):
+    def build(prefix, cursor, limit):
+        return _lookup(Trainer, Trainer.name, prefix, cursor, limit)
+
+    return _cached("trainers", prefix, cursor, limit, build)
+
+
+def lookup_services(prefix, cursor=None, limit=20):
+    def build(prefix, cursor, limit):
+        return _lookup(Service, Service.name, prefix, cursor, limit)
+
+    return _cached("services", prefix, cursor, limit, build)
+
+
+def clear_cache():
+    _cache.clear()
@@ -4,8 +4,11 @@ from sqlalchemy import (
     Integer,
     String,
     DateTime,
+    Date,
+    BigInteger,
     ForeignKey,
-    Boolean
+    Boolean,
+    Index,
 )
 from sqlalchemy.orm import relationship, declarative_base
 from flask_login import UserMixin
@@ -70,6 +73,14 @@ class User(UserMixin, Base):
     # Telegram
     telegram_id = Column(String, nullable=True)
 
+    # bumped with every change of the row (see app/user_cache.py)
+    cache_version = Column(Integer, nullable=False, default=0)
+    versioned_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_user_versioned_at", "versioned_at"),
+    )
+
     def __repr__(self):
         return f"<User {self.login}>"
 
@@ -113,17 +124,113 @@ class Reservation(Base):
     date = Column(String, nullable=False)   # YYYY-MM-DD
     time = Column(String, nullable=False)   # HH:MM
 
+    # real timestamps, kept in sync with date/time (see utils.set_reservation_slot)
+    starts_at = Column(DateTime, nullable=True)
+    ends_at = Column(DateTime, nullable=True)
+
     status = Column(String(20), nullable=False, default="active")
     # active | canceled | completed
 
+    # client-supplied key of the booking request; a retried POST finds its reservation
+    idempotency_key = Column(String(64), nullable=True)
+
+    # set for occurrences booked together as a recurring series
+    series_id = Column(Integer, ForeignKey("reservation_series.id"), nullable=True)
+
+    # when the upcoming-session reminder was queued (see app/reminders.py);
+    # cleared when the session moves
+    reminded_at = Column(DateTime, nullable=True)
+
     trainer = relationship("Trainer", back_populates="reservations")
     service = relationship("Service", back_populates="reservations")
     user = relationship("User", back_populates="reservations")
 
+    __table_args__ = (
+        Index("ix_reservation_trainer_starts_at", "trainer_id", "starts_at"),
+        Index("ix_reservation_user_starts_at", "user_id", "starts_at"),
+        Index("ix_reservation_service_starts_at", "service_id", "starts_at"),
+        Index("ix_reservation_status_starts_at", "status", "starts_at"),
+        Index("ix_reservation_user_id_id", "user_id", "id"),
+        Index("ux_reservation_user_idempotency_key", "user_id", "idempotency_key", unique=True),
+        # the reminder scheduler's queue: only sessions still to be reminded
+        Index(
+            "ix_reservation_remind_due",
+            "starts_at",
+            "id",
+            sqlite_where=((status == "active") & reminded_at.is_(None)),
+            postgresql_where=((status == "active") & reminded_at.is_(None)),
+        ),
+    )
+
     def __repr__(self):
         return f"<Reservation {self.id}>"
 
 
+# ----------------- RESERVATION SERIES ----------------- #
+class ReservationSeries(Base):
+    """ a recurring booking: `count` sessions, `every_days` apart (see utils.create_series) """
+    __tablename__ = "reservation_series"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("user.id"), nullable=False)
+    trainer_id = Column(Integer, ForeignKey("trainer.id"), nullable=False)
+    service_id = Column(Integer, ForeignKey("service.id"), nullable=False)
+
+    first_date = Column(String, nullable=False)  # YYYY-MM-DD
+    time = Column(String, nullable=False)        # HH:MM
+    every_days = Column(Integer, nullable=False, default=7)
+    count = Column(Integer, nullable=False)
+
+    idempotency_key = Column(String(64), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    reservations = relationship("Reservation")
+
+    __table_args__ = (
+        Index("ux_reservation_series_user_idempotency_key", "user_id", "idempotency_key", unique=True),
+    )
+
+    def __repr__(self):
+        return f"<ReservationSeries {self.id} x{self.count}>"
+
+
+# ----------------- WAITLIST ----------------- #
+class WaitlistEntry(Base):
+    """ a member queued for a taken trainer slot, promoted FIFO (see utils.promote_waitlist_head) """
+    __tablename__ = "waitlist_entry"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)   # FIFO order
+    trainer_id = Column(Integer, ForeignKey("trainer.id"), nullable=False)
+    starts_at = Column(DateTime, nullable=False)
+    service_id = Column(Integer, ForeignKey("service.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("user.id"), nullable=False)
+
+    date = Column(String, nullable=False)   # YYYY-MM-DD
+    time = Column(String, nullable=False)   # HH:MM
+
+    status = Column(String(20), nullable=False, default="waiting")
+    # waiting | promoted | skipped
+
+    reservation_id = Column(Integer, ForeignKey("reservation.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # head of a slot's queue is one index seek
+        Index("ix_waitlist_entry_slot_queue", "trainer_id", "starts_at", "status", "id"),
+        # a member waits at most once per slot
+        Index(
+            "ux_waitlist_entry_waiting_user",
+            "trainer_id", "starts_at", "user_id",
+            unique=True,
+            sqlite_where=(status == "waiting"),
+            postgresql_where=(status == "waiting"),
+        ),
+    )
+
+    def __repr__(self):
+        return f"<WaitlistEntry {self.id} trainer={self.trainer_id} {self.starts_at} {self.status}>"
+
+
 # ----------------- REVIEW ----------------- #
 class Review(Base):
     __tablename__ = "review"
@@ -159,11 +266,31 @@ class Transaction(Base):
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("user.id"), nullable=False)
     amount = Column(Integer, nullable=False)   # + top-up / - deduction
-    type = Column(String(20), nullable=False)  # payment / refund / topup
+    type = Column(String(20), nullable=False)  # payment / refund / topup / adjustment
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # append-only ledger (see app/ledger.py): a retried write with the same key is a no-op
+    idempotency_key = Column(String(64), nullable=True)
+
     user = relationship("User", back_populates="transactions")
 
+    __table_args__ = (
+        Index("ix_transaction_user_created_at", "user_id", "created_at", "id"),
+        # balance = snapshot + sum of the entries after it
+        Index("ix_transaction_user_id_id", "user_id", "id"),
+        Index("ux_transaction_user_idempotency_key", "user_id", "idempotency_key", unique=True),
+    )
+
+
+class BalanceSnapshot(Base):
+    """ ledger balance of a user up to and including transaction `last_transaction_id` """
+    __tablename__ = "balance_snapshot"
+
+    user_id = Column(Integer, ForeignKey("user.id"), primary_key=True)
+    balance = Column(Integer, nullable=False, default=0)
+    last_transaction_id = Column(Integer, nullable=False, default=0)
+    taken_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
 
 class AuditLog(Base):
     __tablename__ = "audit_log"
@@ -175,5 +302,181 @@ class AuditLog(Base):
     entity_id = Column(Integer)
     timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        Index("ix_audit_log_timestamp_id", "timestamp", "id"),
+    )
+
     def __repr__(self):
         return f"<AuditLog {self.action} {self.entity}:{self.entity_id}>"
+
+
+# ----------------- DATA VERSION ----------------- #
+class DataVersion(Base):
+    """ per-table change counter, bumped after commits (see app/versions.py) """
+    __tablename__ = "data_version"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DataVersion {self.name}:{self.version}>"
+
+
+# ----------------- EXPORT JOB ----------------- #
+class ExportJob(Base):
+    __tablename__ = "export_job"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(30), nullable=False)       # reservations | transactions | audit_log
+    format = Column(String(10), nullable=False)     # xlsx | csv | ndjson
+    params = Column(String, nullable=False)         # JSON
+    params_hash = Column(String(40), nullable=False)
+    data_version = Column(String, nullable=False)
+
+    status = Column(String(20), nullable=False, default="pending")
+    # pending | running | done | failed
+    progress = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=True)
+    file_path = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+
+    requested_by = Column(Integer, ForeignKey("user.id"))
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_export_job_params_hash", "params_hash", "data_version"),
+    )
+
+    def __repr__(self):
+        return f"<ExportJob {self.id} {self.kind} {self.status}>"
+
+
+# ----------------- STAT COUNTER ----------------- #
+class StatCounter(Base):
+    """ dashboard counters: folded totals, the latest changes are in stat_delta (see app/stats.py) """
+    __tablename__ = "stat_counter"
+
+    name = Column(String(50), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<StatCounter {self.name}={self.value}>"
+
+
+class StatDelta(Base):
+    """ one transaction's change of a counter, folded into stat_counter by app/stats.py """
+    __tablename__ = "stat_delta"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), nullable=False)
+    value = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_stat_delta_name", "name"),
+    )
+
+
+# ----------------- TRAINER AVAILABILITY ----------------- #
+class TrainerAvailability(Base):
+    """ busy 15-minute slots of a trainer's day as a bitmap (see app/availability.py) """
+    __tablename__ = "trainer_availability"
+
+    trainer_id = Column(Integer, ForeignKey("trainer.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    busy = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<TrainerAvailability {self.trainer_id} {self.day} {self.busy:#x}>"
+
+
+# ----------------- NOTIFICATION DIGEST ----------------- #
+class PendingNotification(Base):
+    """ a member email waiting for its recipient's digest (see app/digest.py) """
+    __tablename__ = "pending_notification"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    recipient = Column(String(150), nullable=False)
+    username = Column(String(50), nullable=True)
+    # no FK: a canceled reservation is deleted before its email goes out
+    reservation_id = Column(Integer, nullable=True)
+    kind = Column(String(20), nullable=False)   # booked | series | updated | canceled
+    payload = Column(String, nullable=False)    # JSON
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_pending_notification_recipient_id", "recipient", "id"),
+    )
+
+    def __repr__(self):
+        return f"<PendingNotification {self.kind} → {self.recipient}>"
+
+
+class NotificationDigest(Base):
+    """ one row per recipient with a digest scheduled; whoever inserts it queues the task """
+    __tablename__ = "notification_digest"
+
+    recipient = Column(String(150), primary_key=True)
+    due_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<NotificationDigest {self.recipient} at {self.due_at}>"
+
+
+# ----------------- OUTBOX ----------------- #
+class OutboxMessage(Base):
+    """ a Celery task to publish, written in the business transaction (see app/outbox.py) """
+    __tablename__ = "outbox_message"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    task = Column(String(200), nullable=False)
+    args = Column(String, nullable=False)       # JSON
+    kwargs = Column(String, nullable=False)     # JSON
+    eta = Column(DateTime, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+
+    __table_args__ = (
+        # the relay's queue: only unsent rows are indexed
+        Index(
+            "ix_outbox_message_unsent",
+            "id",
+            sqlite_where=(sent_at.is_(None)),
+            postgresql_where=(sent_at.is_(None)),
+        ),
+    )
+
+    def __repr__(self):
+        return f"<OutboxMessage {self.id} {self.task}>"
+
+
+# ----------------- DEAD LETTER ----------------- #
+class DeadLetter(Base):
+    """ a Celery task that failed for good, kept for replay (see app/dead_letters.py) """
+    __tablename__ = "dead_letter"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    task = Column(String(200), nullable=False)
+    args = Column(String, nullable=False)       # JSON
+    kwargs = Column(String, nullable=False)     # JSON
+    error = Column(String, nullable=True)
+    retries = Column(Integer, nullable=False, default=0)
+
+    failed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    replayed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # the queue's depth and the replay command only look at these
+        Index(
+            "ix_dead_letter_pending",
+            "id",
+            sqlite_where=(replayed_at.is_(None)),
+            postgresql_where=(replayed_at.is_(None)),
+        ),
+    )
+
+    def __repr__(self):
+        return f"<DeadLetter {self.id} {self.task}>"
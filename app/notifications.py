@@ -0,0 +1,283 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+
+
+# bounded: when sinks fall behind, submit() drops instead of blocking a request
+QUEUE_SIZE = int(os.environ.get("NOTIFY_QUEUE_SIZE", 1000))
+BATCH_SIZE = int(os.environ.get("NOTIFY_BATCH_SIZE", 50))
+BATCH_WAIT = float(os.environ.get("NOTIFY_BATCH_WAIT", 0.05))  # seconds
+
+# comma separated: email, telegram, webhook. None by default: admin
+# reschedule / cancel / restore never messaged members before
+SINKS = os.environ.get("NOTIFY_SINKS", "")
+TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
+WEBHOOK_URL = os.environ.get("NOTIFY_WEBHOOK_URL")
+
+
+def reservation_event(reservation, action):
+    """
+    Plain-dict snapshot of a reservation change. Taken in the request,
+    so the dispatcher thread never touches the request's ORM session.
+    """
+    user = reservation.user
+    return {
+        "action": action,
+        "reservation_id": reservation.id,
+        "user_id": reservation.user_id,
+        "email": user.email if user else None,
+        "login": user.login if user else None,
+        "telegram_id": user.telegram_id if user else None,
+        "date": reservation.date,
+        "time": reservation.time,
+    }
+
+
+# ----------------------- SINKS ------------------------------------
+class EmailSink:
+    """
+    member emails through the existing Celery tasks, via the outbox; with
+    digests on, the whole batch is buffered in one transaction
+    (app/digest.py). Runs on the dispatcher thread, so it commits and
+    releases that thread's session itself.
+    """
+    name = "email"
+
+    def send(self, events):
+        from app import database, digest
+        from app.tasks import send_booking_updated_email, send_booking_canceled_email
+
+        events = [e for e in events if e["email"]]
+
+        try:
+            if digest.enabled():
+                digest.enqueue_many([
+                    {
+                        "recipient": e["email"],
+                        "username": e["login"],
+                        "kind": "canceled" if e["action"] == "canceled" else "updated",
+                        "reservation_id": e["reservation_id"],
+                        "details": {"date": e["date"], "time": e["time"]},
+                    }
+                    for e in events
+                ])
+            else:
+                for e in events:
+                    if e["action"] == "canceled":
+                        send_booking_canceled_email(e["email"], e["login"])
+                    else:
+                        send_booking_updated_email(e["email"], e["login"], e["date"], e["time"])
+            database.db_session.commit()
+        except Exception:
+            database.db_session.rollback()
+            raise
+        finally:
+            database.db_session.remove()
+
+
+class TelegramSink:
+    """ one message per member per batch, to User.telegram_id """
+    name = "telegram"
+
+    def __init__(self, token=TELEGRAM_BOT_TOKEN, timeout=5):
+        self.token = token
+        self.timeout = timeout
+
+    def send(self, events):
+        if not self.token:
+            return
+
+        per_chat = defaultdict(list)
+        for e in events:
+            if e["telegram_id"]:
+                per_chat[e["telegram_id"]].append(
+                    f"Reservation #{e['reservation_id']} {e['action']}: {e['date']} {e['time']}"
+                )
+
+        for chat_id, lines in per_chat.items():
+            _post_json(
+                f"https://api.telegram.org/bot{self.token}/sendMessage",
+                {"chat_id": chat_id, "text": "\n".join(lines)},
+                self.timeout,
+            )
+
+
+class WebhookSink:
+    """ the whole batch as one JSON POST """
+    name = "webhook"
+
+    def __init__(self, url=WEBHOOK_URL, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, events):
+        if self.url:
+            _post_json(self.url, {"events": events}, self.timeout)
+
+
+class FakeSink:
+    """ keeps batches in memory; for tests and benchmarks """
+    name = "fake"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+
+    def send(self, events):
+        if self.delay:
+            time.sleep(self.delay)
+        self.batches.append(list(events))
+
+    @property
+    def events(self):
+        return [e for batch in self.batches for e in batch]
+
+
+def _post_json(url, payload, timeout):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload, default=str).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+
+
+SINK_TYPES = {
+    "email": EmailSink,
+    "telegram": TelegramSink,
+    "webhook": WebhookSink,
+}
+
+
+def default_sinks():
+    names = [name.strip() for name in SINKS.split(",") if name.strip()]
+    return [SINK_TYPES[name]() for name in names if name in SINK_TYPES]
+
+
+# ----------------------- DISPATCHER -------------------------------
+class Dispatcher:
+    """
+    One long-lived worker thread per process. Requests submit() events
+    without waiting; the worker drains the queue in batches of up to
+    batch_size (or whatever arrived within batch_wait) and hands each
+    batch to every sink. A failing sink doesn't stop the others.
+    """
+
+    def __init__(self, sinks, maxsize=QUEUE_SIZE, batch_size=BATCH_SIZE, batch_wait=BATCH_WAIT):
+        self.sinks = list(sinks)
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = False
+        self.stats = {"submitted": 0, "dropped": 0, "sent": 0, "failed": 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="notify-dispatcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, event):
+        """ False when the queue is full (the event is dropped) """
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            print(f"[NOTIFY] queue full, dropped {event.get('action')} #{event.get('reservation_id')}")
+            return False
+        self.stats["submitted"] += 1
+        return True
+
+    def _next_batch(self):
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if self._stopping:
+                    return
+                continue
+
+            for sink in self.sinks:
+                try:
+                    sink.send(batch)
+                except Exception as e:
+                    self.stats["failed"] += len(batch)
+                    print(f"[NOTIFY] {sink.name} sink failed for {len(batch)} events: {e}")
+            self.stats["sent"] += len(batch)
+
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self, timeout=5.0):
+        """ wait until everything submitted so far went through the sinks """
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def stop(self, timeout=5.0):
+        self.flush(timeout)
+        self._stopping = True
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = Dispatcher(default_sinks())
+            atexit.register(_dispatcher.stop)
+        return _dispatcher
+
+
+def configure(sinks, **kwargs):
+    """ replace the process dispatcher (tests, benchmarks) """
+    global _dispatcher
+    with _dispatcher_lock:
+        old = _dispatcher
+        _dispatcher = Dispatcher(sinks, **kwargs)
+    if old is not None:
+        old.stop(timeout=1.0)
+    return _dispatcher
+
+
+def notify_reservation_update(reservation, action):
+    """ non-blocking; the sinks run on the dispatcher thread """
+    return get_dispatcher().submit(reservation_event(reservation, action))
@@ -0,0 +1,146 @@
+"""
+Transactional outbox: Celery tasks are recorded as rows in the same
+transaction as the change that triggers them, and a relay process
+publishes them to the broker afterwards.
+
+A slow or unreachable broker no longer stalls requests, and a crash
+between commit and publish no longer loses the task.
+
+    python -m app.outbox        # the relay (see docker-compose.yml)
+"""
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select, update
+
+from app import database
+from app.models import OutboxMessage
+
+
+BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", 200))
+POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", 0.5))   # seconds, when idle
+KEEP_SENT = timedelta(days=int(os.environ.get("OUTBOX_KEEP_SENT_DAYS", 1)))
+
+
+# ----------------------- WRITE ------------------------------------
+def publish(task, args=(), kwargs=None, countdown=None, session=None):
+    """
+    Queue a Celery task (object or name) in the caller's transaction:
+    call before the commit; it's published only if the commit succeeds.
+    """
+    session = session or database.db_session
+    message = OutboxMessage(
+        task=task if isinstance(task, str) else task.name,
+        args=json.dumps(list(args)),
+        kwargs=json.dumps(kwargs or {}),
+        eta=datetime.utcnow() + timedelta(seconds=countdown) if countdown else None,
+    )
+    session.add(message)
+    return message
+
+
+# ----------------------- RELAY ------------------------------------
+def relay_once(session=None, batch_size=BATCH_SIZE, celery=None):
+    """
+    Publish up to batch_size unsent messages, oldest first, over one
+    broker connection, and mark them sent. Returns how many went out.
+
+    Postgres: rows are locked with SKIP LOCKED, so several relays can
+    drain the table side by side. With confirm_publish on, a message
+    counts as sent only once the broker confirmed it; on a failure the
+    rest of the batch stays for the next round.
+    """
+    if celery is None:
+        from app.celery_app import celery
+
+    session = session or database.db_session
+    query = (
+        select(OutboxMessage)
+        .where(OutboxMessage.sent_at.is_(None))
+        .order_by(OutboxMessage.id)
+        .limit(batch_size)
+    )
+    if session.get_bind().dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+
+    messages = session.execute(query).scalars().all()
+    if not messages:
+        session.rollback()
+        return 0
+
+    now = datetime.utcnow()
+    sent = []
+    try:
+        with celery.producer_or_acquire() as producer:
+            for message in messages:
+                celery.send_task(
+                    message.task,
+                    args=json.loads(message.args),
+                    kwargs=json.loads(message.kwargs),
+                    eta=message.eta if message.eta and message.eta > now else None,
+                    producer=producer,
+                )
+                sent.append(message.id)
+    except Exception as e:
+        failed = messages[len(sent)]
+        failed.attempts += 1
+        failed.last_error = str(e)[:500]
+        print(f"[OUTBOX] publishing {failed.task} #{failed.id} failed: {e}")
+
+    if sent:
+        table = OutboxMessage.__table__
+        session.execute(update(table).where(table.c.id.in_(sent)).values(sent_at=now))
+    session.commit()
+    return len(sent)
+
+
+def purge_sent(session=None, keep=KEEP_SENT):
+    """ drop messages published more than `keep` ago """
+    session = session or database.db_session
+    table = OutboxMessage.__table__
+    removed = session.execute(
+        delete(table).where(table.c.sent_at < datetime.utcnow() - keep)
+    ).rowcount
+    session.commit()
+    return removed
+
+
+def pending(session=None):
+    """ unsent messages (the relay's backlog) """
+    session = session or database.db_session
+    return session.query(OutboxMessage.id).filter(OutboxMessage.sent_at.is_(None)).count()
+
+
+def run(poll_interval=POLL_INTERVAL, batch_size=BATCH_SIZE):
+    """ relay loop: drain while there's work, back off while the broker is down """
+    print(f"[OUTBOX] relay started (batch {batch_size})")
+    failures = 0
+    last_purge = 0.0
+
+    while True:
+        try:
+            sent = relay_once(batch_size=batch_size)
+            failures = 0
+        except Exception as e:
+            database.db_session.rollback()
+            failures += 1
+            print(f"[OUTBOX] relay error: {e}")
+            sent = 0
+        finally:
+            database.db_session.remove()
+
+        if time.monotonic() - last_purge > 3600:
+            purge_sent()
+            database.db_session.remove()
+            last_purge = time.monotonic()
+
+        if failures:
+            time.sleep(min(30.0, poll_interval * 2 ** failures))
+        elif sent < batch_size:
+            time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+    run()
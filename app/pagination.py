@@ -0,0 +1,84 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import literal, tuple_
+
+
+PAGE_SIZE = 50
+
+
+# ----------------------- CURSORS ----------------------------------
+def _dump(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _load(value):
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(values):
+    raw = json.dumps([_dump(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """ None for a missing or tampered cursor (= start from the first page) """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list):
+        return None
+    try:
+        return [_load(v) for v in values]
+    except (ValueError, TypeError):
+        return None
+
+
+def _fits(values, order_columns):
+    """ a decoded cursor that can be compared with these columns """
+    if len(values) != len(order_columns):
+        return False
+    for value, column in zip(values, order_columns):
+        try:
+            expected = column.type.python_type
+        except NotImplementedError:
+            continue
+        # bool is an int, but never a valid key
+        if isinstance(value, bool) or not isinstance(value, expected):
+            return False
+    return True
+
+
+# ----------------------- KEYSET PAGE ------------------------------
+def keyset_page(query, order_columns, key_fn, cursor=None, limit=20, descending=False):
+    """
+    One page of `query` ordered by `order_columns` (last one must be unique,
+    e.g. the id), continuing after `cursor`.
+    `key_fn(row)` returns the values of order_columns for a row.
+    Returns (rows, next_cursor).
+    """
+    after = decode_cursor(cursor)
+    # well-formed but of the wrong types counts as tampered too
+    if after is not None and _fits(after, order_columns):
+        key = tuple_(*order_columns)
+        bound = tuple_(*[literal(v, type_=c.type) for v, c in zip(after, order_columns)])
+        query = query.filter(key < bound if descending else key > bound)
+
+    ordering = [c.desc() if descending else c.asc() for c in order_columns]
+    rows = query.order_by(*ordering).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(key_fn(rows[-1]))
+
+    return rows, next_cursor
@@ -0,0 +1,123 @@
+"""
+Password hashing off the request thread.
+
+werkzeug's KDFs are slow on purpose; run inline, a burst of logins pins
+every request thread on CPU (and, in one process, on the GIL). Here they
+run in a small process pool. Callers wait for their result, but only
+WORKERS + QUEUE of them at a time: past that, HashingBusy is raised and
+the request is answered 503 with Retry-After (see app/app.py) instead of
+piling up behind the pool.
+
+Hashes carry their parameters ("scrypt:32768:8:1$salt$hash"); one made
+with other than METHOD is re-hashed at the next successful login
+(utils.check_credentials).
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+# werkzeug method string, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000"
+METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+SALT_LENGTH = int(os.environ.get("PASSWORD_SALT_LENGTH", 16))
+
+WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+QUEUE = int(os.environ.get("PASSWORD_HASH_QUEUE", 16))        # callers waiting beyond the busy workers
+TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 10))  # seconds
+
+
+class HashingBusy(Exception):
+    """ every worker is busy and the queue is full: shed the request """
+
+
+class HashPool:
+    """
+    Bounded process pool for the KDF. workers=0 hashes inline on the
+    calling thread, still bounded (for tests and benchmarks).
+    """
+
+    def __init__(self, workers=WORKERS, queue=QUEUE, timeout=TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(1, workers) + queue)
+        self._executor = ProcessPoolExecutor(workers) if workers else None
+        self.stats = {"hashed": 0, "checked": 0, "shed": 0}
+
+    def _run(self, name, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.stats["shed"] += 1
+            raise HashingBusy()
+        if self._executor is None:
+            try:
+                result = fn(*args)
+            finally:
+                self._slots.release()
+        else:
+            try:
+                future = self._executor.submit(fn, *args)
+            except BaseException:
+                self._slots.release()
+                raise
+            # a caller that gave up leaves the work running or queued: the
+            # slot is freed when the worker is done with it, not before
+            future.add_done_callback(lambda _future: self._slots.release())
+            try:
+                result = future.result(self.timeout)
+            except TimeoutError:
+                future.cancel()
+                raise HashingBusy() from None
+        self.stats[name] += 1
+        return result
+
+    def hash(self, password, method=METHOD, salt_length=SALT_LENGTH):
+        return self._run("hashed", generate_password_hash, password, method, salt_length)
+
+    def check(self, pwhash, password):
+        return self._run("checked", check_password_hash, pwhash, password)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """ the pool of this process; a forked child starts its own """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = HashPool()
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def configure(**kwargs):
+    """ replace the process pool (tests, benchmarks) """
+    global _pool, _pool_pid
+    with _pool_lock:
+        old = _pool if _pool_pid == os.getpid() else None
+        _pool = HashPool(**kwargs)
+        _pool_pid = os.getpid()
+    if old is not None:
+        old.close()
+    return _pool
+
+
+# ----------------------- API --------------------------------------
+def hash_password(password):
+    return get_pool().hash(password)
+
+
+def check_password(pwhash, password):
+    return get_pool().check(pwhash, password)
+
+
+def needs_rehash(pwhash, method=METHOD):
+    """ made with other parameters than the configured ones """
+    return pwhash.split("$", 1)[0] != method
@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta
+from math import ceil
+
+from sqlalchemy import case, func, select
+
+from app import database
+from app.models import User, Trainer, Service, Reservation
+from app.search import apply_search
+from app.loaders import load_options
+
+
+STATUSES = ("upcoming", "today", "past", "canceled")
+
+MAX_PER_PAGE = 100
+
+
+def _as_id(value):
+    """ an id filter from a query string; anything else filters nothing """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# ----------------------- SQL EXPRESSIONS ---------------------------
+def day_bounds(day):
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+
+def reservation_ui_status(now=None):
+    """ canceled | today | past | upcoming, derived by the database """
+    now = now or datetime.now()
+    today_start, tomorrow_start = day_bounds(now.date())
+
+    return case(
+        (Reservation.status == "canceled", "canceled"),
+        (
+            (Reservation.starts_at >= today_start)
+            & (Reservation.starts_at < tomorrow_start),
+            "today",
+        ),
+        (Reservation.starts_at < now, "past"),
+        else_="upcoming",
+    )
+
+
+# ----------------------- FILTERED QUERY ----------------------------
+def reservation_query(
+    status="all",
+    q="",
+    user_id=None,
+    trainer_id=None,
+    service_id=None,
+    date=None,
+    now=None,
+):
+    """
+    Query of (Reservation, ui_status) rows with every filter applied in SQL.
+    """
+    ui_status = reservation_ui_status(now)
+
+    query = (
+        database.db_session.query(Reservation, ui_status.label("ui_status"))
+        .options(*load_options("reservation_list"))
+    )
+
+    user_id, trainer_id, service_id = _as_id(user_id), _as_id(trainer_id), _as_id(service_id)
+    if user_id:
+        query = query.filter(Reservation.user_id == user_id)
+    if trainer_id:
+        query = query.filter(Reservation.trainer_id == trainer_id)
+    if service_id:
+        query = query.filter(Reservation.service_id == service_id)
+    if date:
+        try:
+            day_start, day_end = day_bounds(datetime.strptime(date, "%Y-%m-%d").date())
+        except ValueError:
+            query = query.filter(Reservation.date == date)
+        else:
+            query = query.filter(
+                Reservation.starts_at >= day_start,
+                Reservation.starts_at < day_end,
+            )
+
+    if status in STATUSES:
+        query = query.filter(ui_status == status)
+
+    order_by = [Reservation.starts_at, Reservation.id]
+
+    if q:
+        query, rank = apply_search(query, q)
+        if rank is not None:
+            order_by.insert(0, rank)
+
+    return query.order_by(*order_by)
+
+
+def with_ui_status(rows):
+    """ attach the SQL-derived status to each reservation for templates """
+    reservations = []
+    for r, ui_status in rows:
+        r.ui_status = ui_status
+        reservations.append(r)
+    return reservations
+
+
+# ----------------------- PAGINATION --------------------------------
+def paginate(query, page=1, per_page=10):
+    """
+    One COUNT plus one LIMIT/OFFSET query, at most MAX_PER_PAGE rows.
+    Returns (rows, total, total_pages, page).
+    """
+    per_page = min(max(1, per_page), MAX_PER_PAGE)
+
+    total = (
+        query.order_by(None)
+        .with_entities(func.count(Reservation.id))
+        .scalar()
+    ) or 0
+    total_pages = max(1, ceil(total / per_page))
+    page = min(max(1, page), total_pages)
+
+    rows = query.limit(per_page).offset((page - 1) * per_page).all()
+
+    return rows, total, total_pages, page
+
+
+# ----------------------- CALENDAR FEED -----------------------------
+def calendar_events(start, end, trainer_id=None, gym_id=None):
+    """
+    FullCalendar events for reservations starting in [start, end).
+    Names come from the same SELECT - no per-row lazy loads.
+    """
+    stmt = (
+        select(
+            Reservation.id,
+            Reservation.starts_at,
+            Reservation.ends_at,
+            Reservation.status,
+            User.login,
+            Trainer.name,
+            Service.name,
+        )
+        .select_from(Reservation)
+        .join(Trainer, Reservation.trainer_id == Trainer.id)
+        .outerjoin(User, Reservation.user_id == User.id)
+        .outerjoin(Service, Reservation.service_id == Service.id)
+        .where(Reservation.starts_at >= start, Reservation.starts_at < end)
+    )
+
+    trainer_id, gym_id = _as_id(trainer_id), _as_id(gym_id)
+    if trainer_id:
+        stmt = stmt.where(Reservation.trainer_id == trainer_id)
+    if gym_id:
+        stmt = stmt.where(Trainer.gym_id == gym_id)
+
+    events = []
+    for res_id, starts_at, ends_at, status, login, trainer, service in database.db_session.execute(
+        stmt.order_by(Reservation.starts_at)
+    ):
+        events.append({
+            "id": str(res_id),
+            "title": f"{login or 'User'} - {service or ''} ({trainer})",
+            "start": starts_at.isoformat(),
+            "end": ends_at.isoformat() if ends_at else None,
+            "url": f"/admin/reservations/{res_id}",
+            "classNames": ["canceled"] if status == "canceled" else [],
+        })
+    return events
@@ -1,50 +1,58 @@
-import asyncio
-from flask import Blueprint, render_template, request, redirect, abort, send_file
-from datetime import datetime
-from math import ceil
-from openpyxl import Workbook
-import io
-from sqlalchemy import func
+import hashlib
+import os
+from datetime import datetime, timedelta
+from flask import (
+    Blueprint,
+    Response,
+    jsonify,
+    render_template,
+    request,
+    redirect,
+    abort,
+    flash,
+    send_file,
+    stream_with_context,
+)
 from flask_login import current_user
 
-from app import database
-from app.models import User, Trainer, Service, Reservation, AuditLog
+from app import database, dead_letters, stats
+from app.audit import log_action
+from app.conflicts import SlotConflict, claim_slot
+from app.notifications import notify_reservation_update
+from app.models import User, Trainer, Service, Reservation, AuditLog, ExportJob
 from app.decorators import login_required, admin_required
+from app.reservation_query import reservation_query, with_ui_status, paginate, calendar_events, MAX_PER_PAGE
+from app.utils import parse_reservation_start, set_reservation_slot, waitlist_slot_freed
+from app.exports import EXPORTS, XLSX_MIMETYPE, iter_csv, iter_ndjson, xlsx_file
+from app.export_jobs import request_export, job_status
+from app.versions import version_stamp
+from app.loaders import load_options
+from app.lookups import lookup_users, lookup_trainers, lookup_services
+from app.pagination import PAGE_SIZE, keyset_page
 
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
 
 
-# ================== STUB NOTIFIER (safe) ==================
-# if we return to Telegram later — we will simply replace this
-async def notify_reservation_update(reservation, action):
-    # intentionally empty
-    return
-
-
-# ====== helper: write audit records ======
-def log_action(action, entity, entity_id=None):
-    entry = AuditLog(
-        user_id=current_user.id,
-        action=action,
-        entity=entity,
-        entity_id=entity_id,
-    )
-    database.db_session.add(entry)
-    database.db_session.commit()
-
-
 # ================= DASHBOARD =================
 @admin_bp.route("/")
 @login_required
 @admin_required
 def admin_dashboard():
+    counters = stats.dashboard_stats()
+    delivery = dead_letters.metrics()
     return render_template(
         "admin/dashboard.html",
-        users_count=database.db_session.query(User).count(),
-        services_count=database.db_session.query(Service).count(),
-        trainers_count=database.db_session.query(Trainer).count(),
-        reservations_count=database.db_session.query(Reservation).count(),
+        users_count=counters["users"],
+        services_count=counters["services"],
+        trainers_count=counters["trainers"],
+        reservations_count=counters["reservations"],
+        active_reservations=counters["active_reservations"],
+        canceled_reservations=counters["canceled_reservations"],
+        today_sessions=counters["today_sessions"],
+        revenue=counters["revenue"],
+        email_retries=delivery["retries"],
+        dead_letters_waiting=delivery["depth"],
         active="admin",
     )
 
@@ -84,13 +92,15 @@ def admin_edit_service(service_id):
                 is_active=True,
             )
             database.db_session.add(service)
-            database.db_session.commit()
+            stats.incr("services")
+            database.db_session.flush()
             log_action("create", "service", service.id)
+            database.db_session.commit()
         else:
             service.name = request.form["name"]
             service.price = float(request.form.get("price", 0))
-            database.db_session.commit()
             log_action("update", "service", service.id)
+            database.db_session.commit()
 
         return redirect("/admin/services")
 
@@ -104,8 +114,8 @@ def admin_delete_service(service_id):
     service = database.db_session.get(Service, service_id)
     if service:
         service.is_active = False
-        database.db_session.commit()
         log_action("deactivate", "service", service.id)
+        database.db_session.commit()
 
     return redirect("/admin/services")
 
@@ -142,8 +152,10 @@ def admin_add_trainer():
             gym_id=int(request.form["gym_id"]),
         )
         database.db_session.add(trainer)
-        database.db_session.commit()
+        stats.incr("trainers")
+        database.db_session.flush()
         log_action("create", "trainer", trainer.id)
+        database.db_session.commit()
         return redirect("/admin/trainers")
 
     return render_template("admin/trainer_form.html", trainer=None, active="admin")
@@ -160,8 +172,8 @@ def admin_edit_trainer(trainer_id):
     if request.method == "POST":
         trainer.name = request.form["name"]
         trainer.gym_id = int(request.form["gym_id"])
-        database.db_session.commit()
         log_action("update", "trainer", trainer.id)
+        database.db_session.commit()
         return redirect("/admin/trainers")
 
     return render_template("admin/trainer_form.html", trainer=trainer, active="admin")
@@ -174,8 +186,8 @@ def admin_delete_trainer(trainer_id):
     trainer = database.db_session.get(Trainer, trainer_id)
     if trainer:
         trainer.is_active = False
-        database.db_session.commit()
         log_action("deactivate", "trainer", trainer.id)
+        database.db_session.commit()
 
     return redirect("/admin/trainers")
 
@@ -190,50 +202,27 @@ def admin_reservations():
     trainer_id = request.args.get("trainer_id")
     service_id = request.args.get("service_id")
     date = request.args.get("date")
-
-    query = database.db_session.query(Reservation)
-
-    if user_id:
-        query = query.filter(Reservation.user_id == int(user_id))
-    if trainer_id:
-        query = query.filter(Reservation.trainer_id == int(trainer_id))
-    if service_id:
-        query = query.filter(Reservation.service_id == int(service_id))
-    if date:
-        query = query.filter(Reservation.date == date)
-
-    reservations = query.order_by(Reservation.date, Reservation.time).all()
-
-    now = datetime.now()
-    enriched = []
-
-    for r in reservations:
-        raw = f"{r.date} {r.time}"
-        try:
-            dt = datetime.strptime(raw, "%Y-%m-%d %H:%M")
-        except ValueError:
-            dt = datetime.strptime(raw, "%d.%m.%Y %H:%M")
-
-        if r.status == "canceled":
-            derived = "canceled"
-        elif dt.date() == now.date():
-            derived = "today"
-        elif dt < now:
-            derived = "past"
-        else:
-            derived = "upcoming"
-
-        r.ui_status = derived
-
-        if status == "all" or derived == status:
-            enriched.append(r)
+    # junk falls back to the defaults
+    page = request.args.get("page", 1, type=int)
+    per_page = min(max(1, request.args.get("per_page", 10, type=int)), MAX_PER_PAGE)
+
+    rows, total, total_pages, page = paginate(
+        reservation_query(
+            status=status,
+            user_id=user_id,
+            trainer_id=trainer_id,
+            service_id=service_id,
+            date=date,
+        ),
+        page=page,
+        per_page=per_page,
+    )
 
     return render_template(
         "admin/reservations.html",
-        reservations=enriched,
-        users=database.db_session.query(User).all(),
-        trainers=database.db_session.query(Trainer).all(),
-        services=database.db_session.query(Service).all(),
+        reservations=with_ui_status(rows),
+        page=page,
+        total_pages=total_pages,
         active="admin",
         selected={
             "status": status,
@@ -252,62 +241,31 @@ def admin_reservations():
 def reservations_partial():
     q = request.args.get("q", "").lower()
     status = request.args.get("status", "all")
-    page = int(request.args.get("page", 1))
-    per_page = int(request.args.get("per_page", 10))
-
-    query = database.db_session.query(Reservation)
-
-    if q:
-        query = (
-            query.join(User)
-            .join(Trainer)
-            .join(Service)
-            .filter(
-                func.lower(User.login).like(f"%{q}%")
-                | func.lower(User.email).like(f"%{q}%")
-                | func.lower(Trainer.name).like(f"%{q}%")
-                | func.lower(Service.name).like(f"%{q}%")
-            )
-        )
-
-    reservations = query.order_by(Reservation.date, Reservation.time).all()
-
-    now = datetime.now()
-    enriched = []
-
-    for r in reservations:
-        raw = f"{r.date} {r.time}"
-        try:
-            dt = datetime.strptime(raw, "%Y-%m-%d %H:%M")
-        except ValueError:
-            dt = datetime.strptime(raw, "%d.%m.%Y %H:%M")
-
-        if r.status == "canceled":
-            derived = "canceled"
-        elif dt.date() == now.date():
-            derived = "today"
-        elif dt < now:
-            derived = "past"
-        else:
-            derived = "upcoming"
-
-        r.ui_status = derived
-
-        if status == "all" or derived == status:
-            enriched.append(r)
-
-    total = len(enriched)
-    total_pages = max(1, ceil(total / per_page))
+    user_id = request.args.get("user_id") or None
+    trainer_id = request.args.get("trainer_id") or None
+    service_id = request.args.get("service_id") or None
+    # junk falls back to the defaults
+    page = request.args.get("page", 1, type=int)
+    per_page = min(max(1, request.args.get("per_page", 10, type=int)), MAX_PER_PAGE)
+
+    rows, total, total_pages, page = paginate(
+        reservation_query(
+            status=status,
+            q=q,
+            user_id=user_id,
+            trainer_id=trainer_id,
+            service_id=service_id,
+        ),
+        page=page,
+        per_page=per_page,
+    )
 
     prev_page = page - 1 if page > 1 else None
     next_page = page + 1 if page < total_pages else None
 
-    start = (page - 1) * per_page
-    enriched = enriched[start:start + per_page]
-
     return render_template(
         "admin/partials/reservations_table.html",
-        reservations=enriched,
+        reservations=with_ui_status(rows),
         page=page,
         total_pages=total_pages,
         prev_page=prev_page,
@@ -315,15 +273,51 @@ def reservations_partial():
         q=q,
         status=status,
         per_page=per_page,
+        filters={
+            "user_id": user_id or "",
+            "trainer_id": trainer_id or "",
+            "service_id": service_id or "",
+        },
     )
 
 
+# ================= TYPEAHEAD LOOKUPS =================
+LOOKUPS = {
+    "users": lookup_users,
+    "trainers": lookup_trainers,
+    "services": lookup_services,
+}
+
+
+@admin_bp.route("/lookup/<kind>")
+@login_required
+@admin_required
+def admin_lookup(kind):
+    """ ?q=<prefix>&cursor=<next_cursor>&limit=20 """
+    lookup = LOOKUPS.get(kind)
+    if not lookup:
+        abort(404)
+
+    try:
+        limit = int(request.args.get("limit", 20))
+    except ValueError:
+        abort(400)
+
+    return jsonify(lookup(
+        request.args.get("q", ""),
+        cursor=request.args.get("cursor"),
+        limit=limit,
+    ))
+
+
 # ================= RESERVATION DETAILS =================
 @admin_bp.route("/reservations/<int:res_id>")
 @login_required
 @admin_required
 def reservation_detail(res_id):
-    r = database.db_session.get(Reservation, res_id)
+    r = database.db_session.get(
+        Reservation, res_id, options=load_options("reservation_list")
+    )
     return render_template("admin/reservation_detail.html", r=r, error=None)
 
 
@@ -336,30 +330,31 @@ def reservation_reschedule(res_id):
 
     new_date = request.form["date"]
     new_time = request.form["time"]
+    new_start = parse_reservation_start(new_date, new_time)
 
-    conflict = (
-        database.db_session.query(Reservation)
-        .filter(
-            Reservation.trainer_id == r.trainer_id,
-            Reservation.date == new_date,
-            Reservation.time == new_time,
-            Reservation.id != res_id,
+    if not new_start:
+        return render_template(
+            "admin/reservation_detail.html",
+            r=r,
+            error="Invalid date or time.",
         )
-        .first()
-    )
 
-    if conflict:
+    old_starts_at = r.starts_at
+    set_reservation_slot(r, new_date, new_time)
+    stats.reservation_moved(r, old_starts_at)
+    log_action("reschedule", "reservation", r.id)
+
+    try:
+        claim_slot(r)
+    except SlotConflict:
         return render_template(
             "admin/reservation_detail.html",
             r=r,
-            error="Trainer already has reservation at this time.",
+            error="Trainer already has a session overlapping this time.",
         )
-
-    r.date = new_date
-    r.time = new_time
     database.db_session.commit()
 
-    asyncio.run(notify_reservation_update(r, "rescheduled"))
+    notify_reservation_update(r, "rescheduled")
 
     return redirect(f"/admin/reservations/{res_id}")
 
@@ -370,10 +365,15 @@ def reservation_reschedule(res_id):
 @admin_required
 def reservation_cancel(res_id):
     r = database.db_session.get(Reservation, res_id)
+    old_status = r.status
     r.status = "canceled"
+    stats.reservation_status_changed(r, old_status)
+    log_action("cancel", "reservation", r.id)
+    if old_status == "active":
+        waitlist_slot_freed(r.trainer_id, r.starts_at)
     database.db_session.commit()
 
-    asyncio.run(notify_reservation_update(r, "canceled"))
+    notify_reservation_update(r, "canceled")
 
     return redirect(f"/admin/reservations/{res_id}")
 
@@ -384,56 +384,179 @@ def reservation_cancel(res_id):
 @admin_required
 def reservation_restore(res_id):
     r = database.db_session.get(Reservation, res_id)
+    old_status = r.status
     r.status = "active"
+    stats.reservation_status_changed(r, old_status)
+    log_action("restore", "reservation", r.id)
+
+    # the freed slot may have been re-booked since (e.g. by the waitlist)
+    try:
+        claim_slot(r)
+    except SlotConflict:
+        flash("Trainer already has a session overlapping this time.", "error")
+        return redirect(f"/admin/reservations/{res_id}")
     database.db_session.commit()
 
-    asyncio.run(notify_reservation_update(r, "restored"))
+    notify_reservation_update(r, "restored")
 
     return redirect(f"/admin/reservations/{res_id}")
 
 
 # ================= CALENDAR =================
+# the page is a static shell, events come from the JSON feed below
+CALENDAR_MAX_DAYS = 62
+
+
 @admin_bp.route("/reservations/calendar")
 @login_required
 @admin_required
 def reservations_calendar():
-    reservations = database.db_session.query(Reservation).all()
-    return render_template("admin/calendar.html", reservations=reservations)
+    return render_template(
+        "admin/calendar.html",
+        filters={
+            "trainer_id": request.args.get("trainer_id", ""),
+            "gym_id": request.args.get("gym_id", ""),
+        },
+    )
+
+
+def _parse_calendar_bound(value):
+    # FullCalendar sends ISO dates, sometimes with an offset / "Z"
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except (AttributeError, ValueError):
+        return None
+
+
+@admin_bp.route("/reservations/calendar/events")
+@login_required
+@admin_required
+def reservations_calendar_events():
+    start = _parse_calendar_bound(request.args.get("start"))
+    end = _parse_calendar_bound(request.args.get("end"))
+    trainer_id = request.args.get("trainer_id") or None
+    gym_id = request.args.get("gym_id") or None
+
+    if not start or not end or end <= start:
+        abort(400)
+    end = min(end, start + timedelta(days=CALENDAR_MAX_DAYS))
+
+    # unchanged data + same window = same ETag, answered before any reservation query
+    stamp = version_stamp(database.db_session, ("reservation", "user", "trainer", "service"))
+    etag = hashlib.sha1(
+        f"{stamp}|{start}|{end}|{trainer_id}|{gym_id}".encode("utf-8")
+    ).hexdigest()
+
+    if etag in request.if_none_match:
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+    response = jsonify(calendar_events(start, end, trainer_id=trainer_id, gym_id=gym_id))
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+# ================= EXPORT =================
+def _export_response(kind):
+    """
+    ?format=xlsx|csv|ndjson&status=...&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD
+    &background=1 queues a Celery job instead of streaming
+    """
+    export_format = request.args.get("format", "xlsx")
+    params = {
+        "status": request.args.get("status", "all"),
+        "date_from": request.args.get("date_from"),
+        "date_to": request.args.get("date_to"),
+    }
+
+    if request.args.get("background") == "1":
+        try:
+            job = request_export(kind, export_format, params, user_id=current_user.id)
+        except ValueError:
+            abort(400)
+        return redirect(f"/admin/exports/{job.id}")
+
+    rows_fn, header, title, _tables = EXPORTS[kind]
+    rows = rows_fn(**params)
+
+    if export_format == "csv":
+        return Response(
+            stream_with_context(iter_csv(rows, header)),
+            mimetype="text/csv",
+            headers={"Content-Disposition": f"attachment; filename={kind}.csv"},
+        )
+
+    if export_format == "ndjson":
+        return Response(
+            stream_with_context(iter_ndjson(rows, header)),
+            mimetype="application/x-ndjson",
+            headers={"Content-Disposition": f"attachment; filename={kind}.ndjson"},
+        )
+
+    # xlsx is a zip, so it can only be sent once complete:
+    # build it in write-only mode on disk, then stream the file
+    return send_file(
+        xlsx_file(rows, header=header, title=title),
+        as_attachment=True,
+        download_name=f"{kind}.xlsx",
+        mimetype=XLSX_MIMETYPE,
+    )
 
 
-# ================= EXPORT EXCEL =================
 @admin_bp.route("/reservations/export")
 @login_required
 @admin_required
 def reservations_export():
-    reservations = database.db_session.query(Reservation).all()
+    return _export_response("reservations")
+
+
+@admin_bp.route("/transactions/export")
+@login_required
+@admin_required
+def transactions_export():
+    return _export_response("transactions")
+
+
+@admin_bp.route("/logs/export")
+@login_required
+@admin_required
+def logs_export():
+    return _export_response("audit_log")
+
+
+# ====== BACKGROUND EXPORT JOBS ======
+@admin_bp.route("/exports/<int:job_id>")
+@login_required
+@admin_required
+def export_job_page(job_id):
+    job = database.db_session.get(ExportJob, job_id)
+    if not job:
+        abort(404)
+    return render_template("admin/export_job.html", job=job_status(job), active="admin")
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Reservations"
 
-    ws.append(["ID", "User login", "User email", "Trainer", "Service", "Date", "Status"])
+@admin_bp.route("/exports/<int:job_id>/status")
+@login_required
+@admin_required
+def export_job_status(job_id):
+    job = database.db_session.get(ExportJob, job_id)
+    if not job:
+        abort(404)
+    return jsonify(job_status(job))
 
-    for r in reservations:
-        ws.append([
-            r.id,
-            r.user.login if r.user else "",
-            r.user.email if r.user else "",
-            r.trainer.name if r.trainer else "",
-            r.service.name if r.service else "",
-            f"{r.date} {r.time}",
-            r.status,
-        ])
 
-    stream = io.BytesIO()
-    wb.save(stream)
-    stream.seek(0)
+@admin_bp.route("/exports/<int:job_id>/download")
+@login_required
+@admin_required
+def export_job_download(job_id):
+    job = database.db_session.get(ExportJob, job_id)
+    if not job or job.status != "done" or not os.path.exists(job.file_path or ""):
+        abort(404)
 
     return send_file(
-        stream,
+        os.path.abspath(job.file_path),
         as_attachment=True,
-        download_name="reservations.xlsx",
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        download_name=f"{job.kind}.{job.format}",
     )
 
 
@@ -456,8 +579,19 @@ def reservation_log(res_id):
 @login_required
 @admin_required
 def admin_users():
-    users = database.db_session.query(User).order_by(User.id).all()
-    return render_template("admin/users.html", users=users, active="admin")
+    users, next_cursor = keyset_page(
+        database.db_session.query(User),
+        [User.id],
+        key_fn=lambda u: (u.id,),
+        cursor=request.args.get("cursor"),
+        limit=PAGE_SIZE,
+    )
+    return render_template(
+        "admin/users.html",
+        users=users,
+        next_cursor=next_cursor,
+        active="admin",
+    )
 
 
 @admin_bp.route("/users/<int:user_id>")
@@ -465,13 +599,25 @@ def admin_users():
 @admin_required
 def admin_user_detail(user_id):
     user = database.db_session.get(User, user_id)
-    reservations = (
-        database.db_session.query(Reservation).filter_by(user_id=user_id).all()
+    if not user:
+        abort(404)
+
+    # newest first; id follows booking order and is never NULL, unlike starts_at
+    reservations, next_cursor = keyset_page(
+        database.db_session.query(Reservation)
+        .options(*load_options("member_reservations"))
+        .filter_by(user_id=user_id),
+        [Reservation.id],
+        key_fn=lambda r: (r.id,),
+        cursor=request.args.get("cursor"),
+        limit=PAGE_SIZE,
+        descending=True,
     )
     return render_template(
         "admin/user_detail.html",
         user=user,
         reservations=reservations,
+        next_cursor=next_cursor,
         active="admin",
     )
 
@@ -483,8 +629,8 @@ def admin_ban_user(user_id):
     user = database.db_session.get(User, user_id)
     if user:
         user.is_banned = True
-        database.db_session.commit()
         log_action("ban", "user", user.id)
+        database.db_session.commit()
 
     return redirect("/admin/users")
 
@@ -496,8 +642,8 @@ def admin_unban_user(user_id):
     user = database.db_session.get(User, user_id)
     if user:
         user.is_banned = False
-        database.db_session.commit()
         log_action("unban", "user", user.id)
+        database.db_session.commit()
 
     return redirect("/admin/users")
 
@@ -507,10 +653,17 @@ def admin_unban_user(user_id):
 @login_required
 @admin_required
 def admin_logs():
-    logs = (
-        database.db_session.query(AuditLog)
-        .order_by(AuditLog.timestamp.desc())
-        .limit(100)
-        .all()
+    logs, next_cursor = keyset_page(
+        database.db_session.query(AuditLog),
+        [AuditLog.timestamp, AuditLog.id],
+        key_fn=lambda log: (log.timestamp, log.id),
+        cursor=request.args.get("cursor"),
+        limit=PAGE_SIZE,
+        descending=True,
+    )
+    return render_template(
+        "admin/logs.html",
+        logs=logs,
+        next_cursor=next_cursor,
+        active="admin",
     )
-    return render_template("admin/logs.html", logs=logs, active="admin")
@@ -2,11 +2,10 @@
 
 from flask import Blueprint, render_template, request, redirect, session, flash
 from flask_login import login_user, logout_user, login_required
-from app import database
+from app import database, passwords, stats, user_cache
 from app.models import User, UserRegistrationLog
 from app.utils import check_credentials
 from app.tasks import send_welcome_email, send_admin_new_user_email
-from werkzeug.security import generate_password_hash, check_password_hash
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -16,7 +15,7 @@ def register():
     if request.method == "POST":
         form = request.form
 
-        hashed_password = generate_password_hash(form["password"])
+        hashed_password = passwords.hash_password(form["password"])
 
         new_user = User(
             login=form["login"],
@@ -27,7 +26,7 @@ def register():
         )
 
         database.db_session.add(new_user)
-        database.db_session.commit()
+        stats.incr("users")
 
         log = UserRegistrationLog(
             login=new_user.login,
@@ -35,8 +34,8 @@ def register():
             phone=new_user.phone,
         )
         database.db_session.add(log)
-        database.db_session.commit()
 
+        # outbox rows: the emails go out only if the account is committed
         send_welcome_email(
             new_user.email,
             new_user.login,
@@ -48,6 +47,7 @@ def register():
             new_user.email,
             new_user.phone,
         )
+        database.db_session.commit()
 
         return redirect("/registration_success")
 
@@ -67,11 +67,16 @@ def login():
             request.form["password"]
         )
 
+        if user and user.is_banned:
+            flash("This account is banned", "error")
+            return render_template("auth/login.html")
+
         if user:
             # 🔹 Save user_id for our custom decorator
             session["user_id"] = user.id
             # 🔹 Flask-Login
             login_user(user)
+            user_cache.remember(user)
             return redirect("/user")
 
         flash("Invalid credentials", "error")
@@ -84,5 +89,6 @@ def login():
 def logout():
     # 🔹 Clear session and Flask-Login
     session.pop("user_id", None)
+    session.pop(user_cache.SESSION_KEY, None)
     logout_user()
     return redirect("/")
@@ -6,6 +6,7 @@ from flask_login import login_required, current_user
 
 from app import database
 from app.models import Reservation
+from app.loaders import load_options
 
 dashboard_bp = Blueprint("dashboard", __name__)
 
@@ -17,6 +18,7 @@ def user_dashboard():
 
     reservations = (
         database.db_session.query(Reservation)
+        .options(*load_options("member_reservations"))
         .filter_by(user_id=user.id)
         .order_by(Reservation.date, Reservation.time)
         .all()
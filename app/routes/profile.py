@@ -1,12 +1,15 @@
+import uuid
+
 import stripe
 from flask import Blueprint, render_template, request, redirect, flash
 from werkzeug.utils import secure_filename
-from werkzeug.security import check_password_hash, generate_password_hash
 import os
 from flask_login import current_user, login_required
+from sqlalchemy.exc import IntegrityError
 
-from app import database
+from app import database, ledger, passwords
 from app.models import User, Reservation, Transaction
+from app.pagination import PAGE_SIZE, keyset_page
 
 profile_bp = Blueprint("profile", __name__)
 
@@ -64,7 +67,7 @@ def change_password():
         confirm_password = request.form["confirm_password"]
 
         # 🔐 verify old password hash
-        if not check_password_hash(user.password, old_password):
+        if not passwords.check_password(user.password, old_password):
             return render_template(
                 "profile/change_password.html",
                 error="Old password is incorrect.",
@@ -81,7 +84,7 @@ def change_password():
             )
 
         # 🔐 save NEW password as hash
-        user.password = generate_password_hash(new_password)
+        user.password = passwords.hash_password(new_password)
         database.db_session.commit()
 
         flash("Password successfully updated!", "success")
@@ -148,7 +151,9 @@ def create_checkout_session():
             "quantity": 1,
         }],
         mode="payment",
-        success_url="http://localhost:5000/profile/payment_success?amount=" + request.form["amount"],
+        # the key makes a reloaded success page credit only once
+        success_url="http://localhost:5000/profile/payment_success?amount=" + request.form["amount"]
+        + "&key=" + uuid.uuid4().hex,
         cancel_url="http://localhost:5000/profile/add_funds",
     )
 
@@ -158,10 +163,15 @@ def create_checkout_session():
 @profile_bp.route("/profile/payment_success")
 @login_required
 def payment_success():
-    amount = float(request.args.get("amount", 0))
+    amount = int(float(request.args.get("amount", 0)))
+    key = request.args.get("key")
 
-    current_user.funds += amount
-    database.db_session.commit()
+    ledger.post(current_user.id, amount, "topup", idempotency_key=key and f"checkout:{key}")
+    try:
+        database.db_session.commit()
+    except IntegrityError:
+        # the same key was credited concurrently
+        database.db_session.rollback()
 
     flash(f"Balance topped-up by ${amount}", "success")
     return redirect("/profile")
@@ -175,6 +185,8 @@ def payment_page():
     return render_template(
         "profile/payment.html",
         amount=amount,
+        # a resubmitted form carries the same key and is credited once
+        idempotency_key=uuid.uuid4().hex,
         active="profile"
     )
 
@@ -182,16 +194,19 @@ def payment_page():
 @profile_bp.route("/profile/transactions")
 @login_required
 def transactions_page():
-    transactions = (
-        database.db_session.query(Transaction)
-        .filter_by(user_id=current_user.id)
-        .order_by(Transaction.created_at.desc())
-        .all()
+    transactions, next_cursor = keyset_page(
+        database.db_session.query(Transaction).filter_by(user_id=current_user.id),
+        [Transaction.created_at, Transaction.id],
+        key_fn=lambda t: (t.created_at, t.id),
+        cursor=request.args.get("cursor"),
+        limit=PAGE_SIZE,
+        descending=True,
     )
 
     return render_template(
         "profile/transactions.html",
         transactions=transactions,
+        next_cursor=next_cursor,
         active="profile",
         user=current_user
     )
@@ -206,16 +221,13 @@ def process_payment():
     print("PAYMENT SUCCESS:", amount)
 
     # update balance
-    current_user.funds += amount
-
-    tx = Transaction(
-        user_id=current_user.id,
-        amount=amount,
-        type="topup"
-    )
-
-    database.db_session.add(tx)
-    database.db_session.commit()
+    key = request.form.get("idempotency_key")
+    ledger.post(current_user.id, amount, "topup", idempotency_key=key and f"payment:{key}")
+    try:
+        database.db_session.commit()
+    except IntegrityError:
+        # the same key was credited concurrently
+        database.db_session.rollback()
 
     flash("Payment successful! Balance updated.", "success")
 
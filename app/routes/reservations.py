@@ -4,7 +4,9 @@ from flask_login import login_required, current_user
 
 from app import database
 from app.models import Reservation
+from app.loaders import load_options
 from app.utils import update_reservation, cancel_reservation
+from app.conflicts import SlotConflict
 
 reservations_bp = Blueprint("reservations", __name__)
 
@@ -15,6 +17,7 @@ def reservations_page():
 
     reservations = (
         database.db_session.query(Reservation)
+        .options(*load_options("member_reservations"))
         .filter_by(user_id=current_user.id)
         .order_by(Reservation.date, Reservation.time)
         .all()
@@ -61,6 +64,7 @@ def cancel_reservation_route(reservation_id):
 def edit_reservation_route(reservation_id):
     reservation = (
         database.db_session.query(Reservation)
+        .options(*load_options("member_reservations"))
         .filter_by(id=reservation_id, user_id=current_user.id)
         .first()
     )
@@ -71,7 +75,24 @@ def edit_reservation_route(reservation_id):
     if request.method == "POST":
         new_date = request.form["date"]
         new_time = request.form["time"]
-        update_reservation(reservation_id, current_user.id, new_date, new_time)
+        try:
+            update_reservation(reservation_id, current_user.id, new_date, new_time)
+        except SlotConflict:
+            return render_template(
+                "reservations/edit.html",
+                reservation=reservation,
+                active="reservations",
+                user=current_user,
+                error="The trainer is already booked at this time."
+            )
+        except ValueError:
+            return render_template(
+                "reservations/edit.html",
+                reservation=reservation,
+                active="reservations",
+                user=current_user,
+                error="Please pick a valid date and time."
+            )
         return redirect("/reservations")
 
     return render_template(
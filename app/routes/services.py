@@ -1,8 +1,21 @@
-from flask import Blueprint, render_template, request, redirect
+import uuid
+from datetime import datetime
+
+from flask import Blueprint, render_template, request, redirect, jsonify, flash
 from flask_login import login_required, current_user
 from app import database
 from app.models import Service, Trainer
-from app.utils import create_reservation
+from app.utils import (
+    create_reservation,
+    create_series,
+    join_waitlist,
+    waitlist_position,
+    InsufficientFunds,
+    InvalidSeries,
+    MAX_SERIES,
+)
+from app.conflicts import SlotConflict
+from app.availability import free_slots
 
 services_bp = Blueprint("services", __name__)
 
@@ -56,6 +69,30 @@ def service_details(service_id):
         user=current_user
     )
 
+@services_bp.route("/services/<int:service_id>/availability")
+@login_required
+def service_availability(service_id):
+    """ ?date=YYYY-MM-DD&days=7&gym_id=&trainer_id= """
+    service = database.db_session.get(Service, service_id)
+    if not service:
+        return jsonify({"error": "Service not found"}), 404
+
+    try:
+        day_from = datetime.strptime(request.args["date"], "%Y-%m-%d").date() if request.args.get("date") else None
+        days = int(request.args.get("days", 7))
+        gym_id = int(request.args["gym_id"]) if request.args.get("gym_id") else None
+        trainer_id = int(request.args["trainer_id"]) if request.args.get("trainer_id") else None
+    except ValueError:
+        return jsonify({"error": "Invalid parameters"}), 400
+
+    return jsonify(free_slots(
+        service,
+        gym_id=gym_id,
+        day_from=day_from,
+        days=days,
+        trainer_id=trainer_id,
+    ))
+
 @services_bp.route("/book/<int:service_id>", methods=["GET", "POST"])
 @login_required
 def book_service(service_id):
@@ -69,37 +106,96 @@ def book_service(service_id):
         .all()
     )
 
+    def form(error=None, waitlist=None):
+        return render_template(
+            "services/book.html",
+            service=service,
+            trainers=trainers,
+            user=current_user,
+            # a resubmitted form carries the same key and gets the same booking
+            idempotency_key=uuid.uuid4().hex,
+            error=error,
+            # the taken slot, offered as a waitlist spot
+            waitlist=waitlist,
+        )
+
     if request.method == "POST":
-        user = current_user
-
-        # Check funds
-        if user.funds < service.price:
-            return render_template(
-                "services/book.html",
-                service=service,
-                trainers=trainers,
-                user=user,
-                error="❗ Insufficient funds. Please top up your balance."
+        idempotency_key = (
+            request.headers.get("Idempotency-Key")
+            or request.form.get("idempotency_key")
+            or None
+        )
+
+        try:
+            weeks = int(request.form.get("repeat_weeks") or 1)
+        except ValueError:
+            return form(f"❗ A series can have 1 to {MAX_SERIES} weekly sessions.")
+
+        try:
+            if weeks > 1:
+                reservation = create_series(
+                    user_id=current_user.id,
+                    service_id=service.id,
+                    trainer_id=int(request.form["trainer_id"]),
+                    first_date=request.form["date"],
+                    time=request.form["time"],
+                    count=weeks,
+                    every_days=7,
+                    idempotency_key=idempotency_key,
+                )
+            else:
+                reservation = create_reservation(
+                    user_id=current_user.id,
+                    service_id=service.id,
+                    trainer_id=int(request.form["trainer_id"]),
+                    date=request.form["date"],
+                    time=request.form["time"],
+                    idempotency_key=idempotency_key,
+                )
+        except InvalidSeries:
+            return form(f"❗ A series can have 1 to {MAX_SERIES} weekly sessions.")
+        except ValueError:
+            return form("❗ Please pick a valid date and time.")
+        except InsufficientFunds:
+            return form("❗ Insufficient funds. Please top up your balance.")
+        except SlotConflict:
+            return form(
+                "❗ The trainer is already booked at this time (or on one of the series dates). Please pick another slot.",
+                waitlist=None if weeks > 1 else {
+                    "trainer_id": request.form["trainer_id"],
+                    "date": request.form["date"],
+                    "time": request.form["time"],
+                },
             )
 
-        # deduct funds
-        user.funds -= service.price
+        if reservation is None:
+            return form("❗ This trainer is not available.")
+
+        return redirect("/reservations")
 
-        create_reservation(
-            user_id=user.id,
-            service_id=service.id,
+    return form()
+
+
+@services_bp.route("/book/<int:service_id>/waitlist", methods=["POST"])
+@login_required
+def join_service_waitlist(service_id):
+    try:
+        entry = join_waitlist(
+            user_id=current_user.id,
+            service_id=service_id,
             trainer_id=int(request.form["trainer_id"]),
             date=request.form["date"],
             time=request.form["time"],
         )
+    except (KeyError, ValueError):
+        return "Invalid slot", 400
 
-        database.db_session.commit()
-
-        return redirect("/reservations")
+    if entry is None:
+        return "Service not found", 404
 
-    return render_template(
-        "services/book.html",
-        service=service,
-        trainers=trainers,
-        user=current_user
+    flash(
+        f"You're #{waitlist_position(entry)} on the waitlist for {entry.date} {entry.time}. "
+        "If the slot frees up, it's booked and charged automatically.",
+        "success",
     )
+    return redirect("/reservations")
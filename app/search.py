@@ -0,0 +1,213 @@
+from sqlalchemy import column, func, or_, select, table, text
+
+from app import database
+from app.models import User, Trainer, Service, Reservation
+
+
+# trigram indexes need at least 3 characters to match anything
+MIN_INDEXED_QUERY = 3
+
+# ----------------------- SQLITE: FTS5 SHADOW TABLES ---------------
+# one trigram index per searchable entity, rowid = entity id
+SEARCH_TABLES = {
+    "user_search": ('"user"', ("login", "email")),
+    "trainer_search": ("trainer", ("name",)),
+    "service_search": ("service", ("name",)),
+}
+
+
+def _sqlite_ddl(search_table, source, columns):
+    cols = ", ".join(columns)
+    new_cols = ", ".join(f"NEW.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {search_table} "
+        f"USING fts5({cols}, tokenize='trigram')",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {search_table}_ai AFTER INSERT ON {source} BEGIN
+            INSERT INTO {search_table} (rowid, {cols}) VALUES (NEW.id, {new_cols});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {search_table}_au AFTER UPDATE OF {cols} ON {source} BEGIN
+            DELETE FROM {search_table} WHERE rowid = OLD.id;
+            INSERT INTO {search_table} (rowid, {cols}) VALUES (NEW.id, {new_cols});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {search_table}_ad AFTER DELETE ON {source} BEGIN
+            DELETE FROM {search_table} WHERE rowid = OLD.id;
+        END
+        """,
+    ]
+
+
+# ----------------------- PREFIX LOOKUP INDEXES ---------------------
+# (lower(name), id) btrees behind app/lookups.py range scans
+_LOOKUP_INDEXES = [
+    ("ix_user_login_lower", '"user"', "login"),
+    ("ix_user_email_lower", '"user"', "email"),
+    ("ix_trainer_name_lower", "trainer", "name"),
+    ("ix_service_name_lower", "service", "name"),
+]
+
+
+def _lookup_ddl():
+    return [
+        f"CREATE INDEX IF NOT EXISTS {name} ON {source} (lower({column}), id)"
+        for name, source, column in _LOOKUP_INDEXES
+    ]
+
+
+def init_search(engine=None):
+    """
+    SQLite: create the FTS5 shadow tables and lookup indexes (idempotent).
+    Postgres gets its pg_trgm and lookup indexes from migrations
+    9e3f0c6a2b71 and a41d9b7e3f18.
+    """
+    engine = engine or database.engine
+    if engine.dialect.name != "sqlite":
+        return
+
+    with engine.begin() as conn:
+        for ddl in _lookup_ddl():
+            conn.exec_driver_sql(ddl)
+
+        for search_table, (source, columns) in SEARCH_TABLES.items():
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+                {"name": search_table},
+            ).first()
+
+            for ddl in _sqlite_ddl(search_table, source, columns):
+                conn.exec_driver_sql(ddl)
+
+            if not exists:
+                _rebuild_sqlite(conn, search_table)
+
+
+def _rebuild_sqlite(conn, search_table):
+    source, columns = SEARCH_TABLES[search_table]
+    cols = ", ".join(columns)
+    conn.exec_driver_sql(f"DELETE FROM {search_table}")
+    conn.exec_driver_sql(
+        f"INSERT INTO {search_table} (rowid, {cols}) SELECT id, {cols} FROM {source}"
+    )
+
+
+def rebuild_search_index(engine=None):
+    engine = engine or database.engine
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            for search_table in SEARCH_TABLES:
+                _rebuild_sqlite(conn, search_table)
+
+
+# ----------------------- QUERY ------------------------------------
+def _like_search(query, q):
+    """ unindexed fallback: short queries and other databases """
+    pattern = f"%{q}%"
+    query = (
+        query.join(User, Reservation.user_id == User.id)
+        .join(Trainer, Reservation.trainer_id == Trainer.id)
+        .join(Service, Reservation.service_id == Service.id)
+        .filter(
+            or_(
+                func.lower(User.login).like(pattern),
+                func.lower(User.email).like(pattern),
+                func.lower(Trainer.name).like(pattern),
+                func.lower(Service.name).like(pattern),
+            )
+        )
+    )
+    return query, None
+
+
+def _sqlite_hits(search_table, phrase):
+    fts = table(search_table, column("rowid"), column("rank"))
+    # materialized, so MATCH runs once instead of once per reservation row
+    return (
+        select(fts.c.rowid.label("id"), fts.c.rank.label("rank"))
+        .where(text(f"{search_table} MATCH :phrase").bindparams(phrase=phrase))
+        .cte(f"{search_table}_hits")
+        .prefix_with("MATERIALIZED")
+    )
+
+
+def _sqlite_search(query, q):
+    # a quoted phrase is a plain substring match for the trigram tokenizer
+    phrase = '"' + q.replace('"', '""') + '"'
+
+    users = _sqlite_hits("user_search", phrase)
+    trainers = _sqlite_hits("trainer_search", phrase)
+    services = _sqlite_hits("service_search", phrase)
+
+    query = query.filter(
+        or_(
+            Reservation.user_id.in_(select(users.c.id)),
+            Reservation.trainer_id.in_(select(trainers.c.id)),
+            Reservation.service_id.in_(select(services.c.id)),
+        )
+    )
+
+    def hit_rank(hits, fk):
+        # correlated lookups get an automatic index on the materialized hits
+        scalar = select(hits.c.rank).where(hits.c.id == fk).scalar_subquery()
+        return func.coalesce(scalar, 0)
+
+    # bm25 is negative, lower is better
+    rank = func.min(
+        hit_rank(users, Reservation.user_id),
+        hit_rank(trainers, Reservation.trainer_id),
+        hit_rank(services, Reservation.service_id),
+    )
+    return query, rank.asc()
+
+
+def _postgres_search(query, q):
+    pattern = f"%{q}%"
+
+    user_ids = select(User.id).where(
+        or_(func.lower(User.login).like(pattern), func.lower(User.email).like(pattern))
+    )
+    trainer_ids = select(Trainer.id).where(func.lower(Trainer.name).like(pattern))
+    service_ids = select(Service.id).where(func.lower(Service.name).like(pattern))
+
+    query = (
+        query.join(User, Reservation.user_id == User.id)
+        .join(Trainer, Reservation.trainer_id == Trainer.id)
+        .join(Service, Reservation.service_id == Service.id)
+        .filter(
+            or_(
+                Reservation.user_id.in_(user_ids),
+                Reservation.trainer_id.in_(trainer_ids),
+                Reservation.service_id.in_(service_ids),
+            )
+        )
+    )
+
+    rank = func.greatest(
+        func.similarity(func.lower(User.login), q),
+        func.similarity(func.lower(User.email), q),
+        func.similarity(func.lower(Trainer.name), q),
+        func.similarity(func.lower(Service.name), q),
+    )
+    return query, rank.desc()
+
+
+def apply_search(query, q):
+    """
+    Filter a Reservation query by q.
+    Returns (query, order_by) where order_by ranks the best matches first
+    (None when the database can't rank).
+    """
+    q = q.strip().lower()
+    dialect = database.engine.dialect.name
+
+    if len(q) < MIN_INDEXED_QUERY:
+        return _like_search(query, q)
+    if dialect == "sqlite":
+        return _sqlite_search(query, q)
+    if dialect == "postgresql":
+        return _postgres_search(query, q)
+
+    return _like_search(query, q)
@@ -0,0 +1,191 @@
+import os
+import queue
+import smtplib
+import ssl
+import threading
+import time
+
+
+POOL_SIZE = int(os.environ.get("SMTP_POOL_SIZE", 4))
+# a session is closed after this many messages (servers cap it too, e.g. Gmail ~100)
+MAX_MESSAGES = int(os.environ.get("SMTP_MAX_MESSAGES", 100))
+# a session idle longer than this is checked with NOOP before reuse (seconds)
+NOOP_AFTER = float(os.environ.get("SMTP_NOOP_AFTER", 5))
+TIMEOUT = float(os.environ.get("SMTP_TIMEOUT", 10))
+
+
+def _dropped(error):
+    """ the session is gone (vs. an SMTP error about this message) """
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421   # service closing channel
+    # SMTPException is an OSError too: what's left here are socket errors
+    return not isinstance(error, smtplib.SMTPException)
+
+
+class _Connection:
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    """
+    Authenticated SMTP sessions kept open between messages: one TCP
+    connect, STARTTLS handshake and login per `max_messages` emails
+    instead of per email.
+
+    Thread safe and bounded: at most `size` sessions; a caller waits for
+    a free one rather than opening more.
+    """
+
+    def __init__(self, host, port, username=None, password=None, starttls=True,
+                 size=POOL_SIZE, max_messages=MAX_MESSAGES, noop_after=NOOP_AFTER, timeout=TIMEOUT):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.size = size
+        self.max_messages = max_messages
+        self.noop_after = noop_after
+        self.timeout = timeout
+
+        # built once: creating a context loads the CA bundle
+        self._context = ssl.create_default_context() if starttls else None
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.stats = {"connects": 0, "reuses": 0, "noops": 0, "reconnects": 0, "sent": 0}
+
+    # ----------------------- CONNECTIONS --------------------------
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls(context=self._context)
+            if self.password:
+                smtp.login(self.username, self.password)
+        except Exception:
+            _close(smtp)
+            raise
+        self._count("connects")
+        return _Connection(smtp)
+
+    def _healthy(self, conn):
+        if time.monotonic() - conn.last_used < self.noop_after:
+            return True
+        self._count("noops")
+        try:
+            return conn.smtp.noop()[0] == 250
+        except OSError:
+            return False
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if self._healthy(conn):
+                    self._count("reuses")
+                    return conn
+                _close(conn.smtp)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, conn, broken=False):
+        try:
+            if broken or conn.sent >= self.max_messages:
+                _close(conn.smtp)
+            else:
+                conn.last_used = time.monotonic()
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    # ----------------------- SEND ---------------------------------
+    def send(self, sender, recipients, message):
+        """
+        sendmail() over a pooled session. A dropped connection is replaced
+        and the message retried once; SMTP errors about the message itself
+        (refused recipient, ...) are raised as they are.
+        """
+        for attempt in (1, 2):
+            conn = self._acquire()
+            try:
+                conn.smtp.sendmail(sender, recipients, message)
+            except OSError as e:
+                if not _dropped(e):
+                    self._release(conn)
+                    raise
+                self._release(conn, broken=True)
+                if attempt == 2:
+                    raise
+                self._count("reconnects")
+                continue
+            except BaseException:
+                # a timeout or interrupt mid-DATA leaves the session in an
+                # unknown state: drop it, but give the slot back
+                self._release(conn, broken=True)
+                raise
+
+            conn.sent += 1
+            self._count("sent")
+            self._release(conn)
+            return
+
+    def close(self):
+        """ QUIT every idle session (worker shutdown) """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            _close(conn.smtp)
+
+
+def _close(smtp):
+    try:
+        smtp.quit()
+    except Exception:
+        try:
+            smtp.close()
+        except Exception:
+            pass
+
+
+# ----------------------- PER PROCESS ------------------------------
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(**settings):
+    """
+    The pool of this process. Prefork children get their own: sockets
+    inherited across fork() must not be shared.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = SMTPPool(**settings)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
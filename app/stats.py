@@ -0,0 +1,262 @@
+"""
+Dashboard counters without a shared hot row on the write path.
+
+Write paths call incr() inside their own transaction; the deltas are
+appended as stat_delta rows when it commits (inserts only, so concurrent
+bookings never wait on one another) and vanish with a rollback. fold(),
+run by the beat, moves committed deltas into stat_counter; read() adds
+whatever is not folded yet.
+"""
+from collections import Counter
+from datetime import date, timedelta
+
+from sqlalchemy import delete, event, func, select, union_all
+from sqlalchemy.orm import Session
+
+from app import database
+from app.bulk import merge_rows
+from app.models import (
+    User,
+    Trainer,
+    Service,
+    Reservation,
+    Transaction,
+    StatCounter,
+    StatDelta,
+)
+from app.reservation_query import day_bounds
+
+
+DASHBOARD_COUNTERS = (
+    "users",
+    "trainers",
+    "services",
+    "reservations",
+    "active_reservations",
+    "canceled_reservations",
+    "revenue",
+)
+
+# how many days ahead the per-day session counters get reconciled
+RECONCILE_DAYS = 7
+
+
+def day_counter(day):
+    """ active sessions scheduled on a day, e.g. "sessions:2026-10-18" """
+    return f"sessions:{day.isoformat()}"
+
+
+# ----------------------- WRITE ------------------------------------
+def incr(name, delta=1, session=None):
+    """
+    Add delta to a counter as part of the caller's transaction:
+    it commits (or rolls back) together with the change it counts.
+    """
+    if not delta:
+        return
+
+    session = session or database.db_session
+    session.connection()   # the deltas belong to this transaction: start it if need be
+    session.info.setdefault("stat_deltas", Counter())[name] += delta
+
+
+def incr_many(deltas, session=None):
+    """ several counters at once, same transaction as incr() """
+    for name, delta in deltas.items():
+        incr(name, delta, session)
+
+
+@event.listens_for(Session, "before_commit")
+def _write_deltas(session):
+    deltas = session.info.pop("stat_deltas", None)
+    rows = [{"name": name, "value": value} for name, value in sorted((deltas or {}).items()) if value]
+    if rows:
+        session.execute(StatDelta.__table__.insert(), rows)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_uncommitted(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("stat_deltas", None)
+
+
+def reservations_added(reservations, session=None):
+    """ reservation_added for a batch (e.g. a series) """
+    deltas = Counter(reservations=len(reservations))
+    for r in reservations:
+        status = r.status or "active"
+        if status == "active":
+            deltas["active_reservations"] += 1
+            if r.starts_at:
+                deltas[day_counter(r.starts_at.date())] += 1
+        elif status == "canceled":
+            deltas["canceled_reservations"] += 1
+    incr_many(deltas, session)
+
+
+def reservation_added(reservation, session=None):
+    incr("reservations", 1, session)
+    _reservation_status(reservation.status or "active", reservation.starts_at, 1, session)
+
+
+def reservation_removed(reservation, session=None):
+    incr("reservations", -1, session)
+    _reservation_status(reservation.status, reservation.starts_at, -1, session)
+
+
+def reservation_status_changed(reservation, old_status, session=None):
+    if old_status == reservation.status:
+        return
+    _reservation_status(old_status, reservation.starts_at, -1, session)
+    _reservation_status(reservation.status, reservation.starts_at, 1, session)
+
+
+def reservation_moved(reservation, old_starts_at, session=None):
+    if reservation.status != "active" or old_starts_at == reservation.starts_at:
+        return
+    if old_starts_at:
+        incr(day_counter(old_starts_at.date()), -1, session)
+    if reservation.starts_at:
+        incr(day_counter(reservation.starts_at.date()), 1, session)
+
+
+def _reservation_status(status, starts_at, delta, session):
+    if status == "active":
+        incr("active_reservations", delta, session)
+        if starts_at:
+            incr(day_counter(starts_at.date()), delta, session)
+    elif status == "canceled":
+        incr("canceled_reservations", delta, session)
+
+
+# ----------------------- READ -------------------------------------
+def read(names, session=None):
+    """ folded value + the deltas not folded yet """
+    session = session or database.db_session
+    parts = union_all(
+        select(StatCounter.name, StatCounter.value).where(StatCounter.name.in_(names)),
+        select(StatDelta.name, StatDelta.value).where(StatDelta.name.in_(names)),
+    ).subquery()
+    values = dict.fromkeys(names, 0)
+    values.update(
+        session.execute(
+            select(parts.c.name, func.sum(parts.c.value)).group_by(parts.c.name)
+        ).all()
+    )
+    return values
+
+
+def dashboard_stats(today=None):
+    today = today or date.today()
+    values = read(DASHBOARD_COUNTERS + (day_counter(today),))
+    values["today_sessions"] = values.pop(day_counter(today))
+    return values
+
+
+# ----------------------- FOLD -------------------------------------
+def fold(session=None):
+    """
+    Move committed deltas into stat_counter. The rows summed are exactly
+    the rows deleted (DELETE ... RETURNING), so a delta committed while
+    this runs is folded next time, never lost or counted twice.
+    Returns the number of deltas folded.
+    """
+    session = session or database.db_session
+
+    folded = session.execute(
+        delete(StatDelta).returning(StatDelta.name, StatDelta.value)
+    ).all()
+    totals = Counter()
+    for name, value in folded:
+        totals[name] += value
+
+    # one writer (the beat), and rows in name order all the same
+    merge_rows(
+        session.connection(),
+        StatCounter.__table__,
+        ("name",),
+        "value",
+        [{"name": name, "value": value} for name, value in sorted(totals.items()) if value],
+        "+",
+    )
+    session.commit()
+    return len(folded)
+
+
+# ----------------------- RECONCILE --------------------------------
+def exact_counts(session, today=None):
+    """ the full-scan truth the counters must agree with """
+    today = today or date.today()
+
+    counts = {
+        "users": session.query(func.count(User.id)).scalar(),
+        "trainers": session.query(func.count(Trainer.id)).scalar(),
+        "services": session.query(func.count(Service.id)).scalar(),
+        "reservations": session.query(func.count(Reservation.id)).scalar(),
+        "active_reservations": session.query(func.count(Reservation.id))
+        .filter(Reservation.status == "active").scalar(),
+        "canceled_reservations": session.query(func.count(Reservation.id))
+        .filter(Reservation.status == "canceled").scalar(),
+        # payments are negative, refunds positive
+        "revenue": -(
+            session.query(func.coalesce(func.sum(Transaction.amount), 0))
+            .filter(Transaction.type.in_(("payment", "refund")))
+            .scalar()
+        ),
+    }
+
+    for offset in range(-1, RECONCILE_DAYS + 1):
+        day = today + timedelta(days=offset)
+        start, end = day_bounds(day)
+        counts[day_counter(day)] = (
+            session.query(func.count(Reservation.id))
+            .filter(
+                Reservation.status == "active",
+                Reservation.starts_at >= start,
+                Reservation.starts_at < end,
+            )
+            .scalar()
+        )
+
+    return counts
+
+
+def reconcile(session=None, today=None):
+    """
+    Correct counters to exact values. Returns {name: (old, new)}
+    for every counter that had drifted.
+    """
+    session = session or database.db_session
+    table = StatCounter.__table__
+
+    fold(session)
+    exact = exact_counts(session, today)
+    current = read(tuple(exact), session)
+
+    drift = {
+        name: (current[name], value)
+        for name, value in exact.items()
+        if current[name] != value
+    }
+    # a correcting delta, not an overwrite: deltas committed since the
+    # fold are still to be added on top
+    merge_rows(
+        session.connection(),
+        table,
+        ("name",),
+        "value",
+        [{"name": name, "value": new - old} for name, (old, new) in sorted(drift.items())],
+        "+",
+    )
+
+    # per-day counters for past days are never read again
+    yesterday = (today or date.today()) - timedelta(days=1)
+    session.execute(
+        delete(table).where(
+            table.c.name.like("sessions:%"),
+            table.c.name < day_counter(yesterday),
+        )
+    )
+
+    session.commit()
+    return drift
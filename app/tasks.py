@@ -1,22 +1,58 @@
 from app.celery_app import celery
 import os
 import smtplib
+from celery.utils.time import get_exponential_backoff_interval
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.header import Header
-import ssl
 
+from app.smtp_pool import get_pool
 
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
+
+SMTP_SERVER = os.environ.get("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", 587))
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "1") == "1"
 SENDER_EMAIL = "vasylenkodmytrii@gmail.com"
 PASSWORD = os.environ.get("EMAIL_PASSWORD")
 
+# Gmail throttles bursts (421/454): stay under this per worker process
+SMTP_RATE_PER_MINUTE = int(os.environ.get("SMTP_RATE_PER_MINUTE", 60))
+EMAIL_MAX_RETRIES = int(os.environ.get("EMAIL_MAX_RETRIES", 6))
+EMAIL_RETRY_BACKOFF = int(os.environ.get("EMAIL_RETRY_BACKOFF", 30))          # seconds, doubled per retry
+EMAIL_RETRY_BACKOFF_MAX = int(os.environ.get("EMAIL_RETRY_BACKOFF_MAX", 30 * 60))
+
+
+class TransientEmailError(Exception):
+    """ the send may succeed later: throttling, a dropped or refused connection """
+
+
+def _transient(error):
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return bool(codes) and all(400 <= code < 500 for code in codes)
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    # socket errors and timeouts; other SMTPExceptions are permanent
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+def smtp_pool():
+    """ this worker process's authenticated SMTP sessions """
+    return get_pool(
+        host=SMTP_SERVER,
+        port=SMTP_PORT,
+        username=SENDER_EMAIL,
+        password=PASSWORD,
+        starttls=SMTP_STARTTLS,
+    )
+
 
 def send_email(recipient: str, subject: str, html_body: str):
     """
     Core function for sending emails, used by Celery tasks.
-    Works through Gmail SMTP with TLS.
+    Works through Gmail SMTP with TLS, over pooled sessions (app/smtp_pool.py).
     """
     if not PASSWORD:
         print("❌ EMAIL_PASSWORD is missing – email will NOT be sent")
@@ -34,18 +70,17 @@ def send_email(recipient: str, subject: str, html_body: str):
     msg["To"] = recipient
     msg.attach(MIMEText(html_body, "html", "utf-8"))
 
-    ctx = ssl.create_default_context()
-
     try:
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls(context=ctx)
-            server.login(SENDER_EMAIL, PASSWORD)
-            server.sendmail(SENDER_EMAIL, recipient, msg.as_string())
+        smtp_pool().send(SENDER_EMAIL, recipient, msg.as_string())
     except smtplib.SMTPException as e:
         print(f"❌ SMTP error while sending email to {recipient}: {e}")
+        if _transient(e):
+            raise TransientEmailError(str(e)) from e
         raise
     except Exception as e:
         print(f"❌ Unexpected error while sending email to {recipient}: {e}")
+        if _transient(e):
+            raise TransientEmailError(str(e)) from e
         raise
     else:
         print(f"📧 Email successfully sent to {recipient}")
@@ -53,13 +88,63 @@ def send_email(recipient: str, subject: str, html_body: str):
 
 # ====================== CELERY TASKS ==========================
 
+class EmailTask(celery.Task):
+    """
+    Base of the notification tasks: transient errors retry with
+    exponential backoff and full jitter, sends are rate limited per
+    worker, and a task that fails for good (permanent error, or retries
+    used up) is parked in the dead-letter table for replay
+    (app/dead_letters.py). Nobody reads their results: none are stored.
+    """
+    autoretry_for = (TransientEmailError,)
+    max_retries = EMAIL_MAX_RETRIES
+    retry_backoff = EMAIL_RETRY_BACKOFF
+    retry_backoff_max = EMAIL_RETRY_BACKOFF_MAX
+    retry_jitter = True
+    rate_limit = f"{SMTP_RATE_PER_MINUTE}/m"
+    ignore_result = True
+
+    def backoff(self):
+        return get_exponential_backoff_interval(
+            self.retry_backoff, self.request.retries, self.retry_backoff_max, self.retry_jitter
+        )
+
+    def retry_rest(self, exc, args=None, kwargs=None):
+        """
+        For tasks that send several emails: retry only what's left
+        (args/kwargs replace the original ones), or dead-letter just that
+        once retries are used up.
+        """
+        if self.request.retries >= self.max_retries:
+            self._dead_letter(args, kwargs, exc)
+            return
+        raise self.retry(exc=exc, args=args, kwargs=kwargs, countdown=self.backoff())
+
+    def _dead_letter(self, args, kwargs, exc):
+        from app import database, dead_letters
+        try:
+            dead_letters.record(self.name, args, kwargs, exc, self.request.retries)
+        finally:
+            database.db_session.remove()
+
+    def on_retry(self, exc, task_id, args, kwargs, einfo):
+        from app import database, dead_letters
+        try:
+            dead_letters.record_retry()
+        finally:
+            database.db_session.remove()
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        self._dead_letter(args, kwargs, exc)
+
+
 @celery.task
 def test_task():
     print("Celery OK!")
     return "OK"
 
 
-@celery.task
+@celery.task(base=EmailTask)
 def send_welcome_email_task(recipient: str, username: str, login_url: str):
     print(f"[TASK] send_welcome_email_task → {recipient}")
     html = f"""
@@ -70,7 +155,7 @@ def send_welcome_email_task(recipient: str, username: str, login_url: str):
     send_email(recipient, "Welcome to FitnessApp!", html)
 
 
-@celery.task
+@celery.task(base=EmailTask)
 def send_admin_new_user_email_task(login: str, email: str, phone: str):
     print(f"[TASK] send_admin_new_user_email_task → admin notification for {login}")
     html = f"""
@@ -82,7 +167,7 @@ def send_admin_new_user_email_task(login: str, email: str, phone: str):
     send_email("vasylenkodmytrii@gmail.com", "New Registration Alert", html)
 
 
-@celery.task
+@celery.task(base=EmailTask)
 def send_booking_confirmation_email_task(recipient, username, service_name, trainer_name, date, time):
     print(f"[TASK] send_booking_confirmation_email_task → {recipient}")
     html = f"""
@@ -95,7 +180,21 @@ def send_booking_confirmation_email_task(recipient, username, service_name, trai
     send_email(recipient, "Booking Confirmation", html)
 
 
-@celery.task
+@celery.task(base=EmailTask)
+def send_series_confirmation_email_task(recipient, username, service_name, trainer_name, dates, time):
+    print(f"[TASK] send_series_confirmation_email_task → {recipient} ({len(dates)} sessions)")
+    items = "".join(f"<li>{d}, {time}</li>" for d in dates)
+    html = f"""
+    <h2>Your Series Is Booked!</h2>
+    <p>Hello {username},</p>
+    <p>You booked <b>{len(dates)}</b> sessions of <b>{service_name}</b></p>
+    <p>Trainer: <b>{trainer_name}</b></p>
+    <ul>{items}</ul>
+    """
+    send_email(recipient, "Series Booking Confirmation", html)
+
+
+@celery.task(base=EmailTask)
 def send_booking_updated_email_task(recipient, username, date, time):
     print(f"[TASK] send_booking_updated_email_task → {recipient}")
     html = f"""
@@ -107,7 +206,7 @@ def send_booking_updated_email_task(recipient, username, date, time):
     send_email(recipient, "Booking Updated", html)
 
 
-@celery.task
+@celery.task(base=EmailTask)
 def send_booking_canceled_email_task(recipient, username):
     print(f"[TASK] send_booking_canceled_email_task → {recipient}")
     html = f"""
@@ -119,27 +218,258 @@ def send_booking_canceled_email_task(recipient, username):
 
 
 # ========= PUBLIC FUNCTIONS (alias for app/utils) ==================
+# Call these before the caller's commit: the task is written to the outbox
+# in the same transaction and published by the relay (app/outbox.py).
+
+def _publish(task, *args, countdown=None):
+    from app import outbox
+    outbox.publish(task, args, countdown=countdown)
+
 
 def send_welcome_email(recipient, username, login_url):
-    print(f"[PUBLIC] send_welcome_email → queue task for {recipient}")
-    send_welcome_email_task.delay(recipient, username, login_url)
+    print(f"[PUBLIC] send_welcome_email → outbox for {recipient}")
+    _publish(send_welcome_email_task, recipient, username, login_url)
 
 
 def send_admin_new_user_email(login, email, phone):
-    print(f"[PUBLIC] send_admin_new_user_email → queue task for {login}")
-    send_admin_new_user_email_task.delay(login, email, phone)
+    print(f"[PUBLIC] send_admin_new_user_email → outbox for {login}")
+    _publish(send_admin_new_user_email_task, login, email, phone)
 
 
-def send_booking_confirmation_email(recipient, username, service_name, trainer_name, date, time):
-    print(f"[PUBLIC] send_booking_confirmation_email → queue task for {recipient}")
-    send_booking_confirmation_email_task.delay(recipient, username, service_name, trainer_name, date, time)
+def _digest(kind, recipient, username, reservation_id=None, **details):
+    """ member emails go through the recipient's digest unless it's off (app/digest.py) """
+    from app import digest
 
+    if not digest.enabled():
+        return False
+    digest.enqueue(recipient, username, kind, reservation_id, **details)
+    return True
 
-def send_booking_updated_email(recipient, username, date, time):
-    print(f"[PUBLIC] send_booking_updated_email → queue task for {recipient}")
-    send_booking_updated_email_task.delay(recipient, username, date, time)
 
+def send_booking_confirmation_email(recipient, username, service_name, trainer_name, date, time,
+                                    reservation_id=None):
+    print(f"[PUBLIC] send_booking_confirmation_email → outbox for {recipient}")
+    if _digest("booked", recipient, username, reservation_id,
+               service_name=service_name, trainer_name=trainer_name, date=date, time=time):
+        return
+    _publish(send_booking_confirmation_email_task, recipient, username, service_name, trainer_name, date, time)
 
-def send_booking_canceled_email(recipient, username):
-    print(f"[PUBLIC] send_booking_canceled_email → queue task for {recipient}")
-    send_booking_canceled_email_task.delay(recipient, username)
+
+def send_series_confirmation_email(recipient, username, service_name, trainer_name, dates, time):
+    print(f"[PUBLIC] send_series_confirmation_email → outbox for {recipient}")
+    if _digest("series", recipient, username,
+               service_name=service_name, trainer_name=trainer_name, dates=dates, time=time):
+        return
+    _publish(send_series_confirmation_email_task, recipient, username, service_name, trainer_name, dates, time)
+
+
+def send_booking_updated_email(recipient, username, date, time, reservation_id=None):
+    print(f"[PUBLIC] send_booking_updated_email → outbox for {recipient}")
+    if _digest("updated", recipient, username, reservation_id, date=date, time=time):
+        return
+    _publish(send_booking_updated_email_task, recipient, username, date, time)
+
+
+def send_booking_canceled_email(recipient, username, reservation_id=None, date=None, time=None):
+    print(f"[PUBLIC] send_booking_canceled_email → outbox for {recipient}")
+    if _digest("canceled", recipient, username, reservation_id, date=date, time=time):
+        return
+    _publish(send_booking_canceled_email_task, recipient, username)
+
+
+def promote_waitlist(trainer_id, starts_at):
+    print(f"[PUBLIC] promote_waitlist → outbox for trainer {trainer_id} at {starts_at}")
+    _publish(promote_waitlist_task, trainer_id, starts_at)
+
+
+# ====================== EXPORT JOBS ==========================
+
+@celery.task
+def run_export_job_task(job_id):
+    print(f"[TASK] run_export_job_task → job {job_id}")
+    from app.export_jobs import run_export_job
+    run_export_job(job_id)
+
+
+# ====================== STATS ==========================
+
+@celery.task
+def reconcile_stats_task():
+    from app import database
+    from app.stats import reconcile
+
+    try:
+        drift = reconcile()
+    finally:
+        database.db_session.remove()
+
+    if drift:
+        print(f"[TASK] reconcile_stats_task → corrected {drift}")
+    return len(drift)
+
+
+@celery.task
+def fold_stats_task():
+    from app import database
+    from app.stats import fold
+
+    try:
+        return fold()
+    finally:
+        database.db_session.remove()
+
+
+# ====================== AVAILABILITY ==========================
+
+@celery.task
+def rebuild_availability_task():
+    from app import database
+    from app.availability import rebuild
+
+    try:
+        rows = rebuild()
+    finally:
+        database.db_session.remove()
+
+    print(f"[TASK] rebuild_availability_task → {rows} trainer-days")
+    return rows
+
+
+# ====================== WAITLIST ==========================
+
+@celery.task
+def promote_waitlist_task(trainer_id, starts_at):
+    from datetime import datetime
+    from app import database
+    from app.utils import promote_waitlist_head
+
+    try:
+        reservation = promote_waitlist_head(trainer_id, datetime.fromisoformat(starts_at))
+        reservation_id = reservation.id if reservation else None
+    finally:
+        database.db_session.remove()
+
+    print(f"[TASK] promote_waitlist_task → trainer {trainer_id} at {starts_at}: reservation {reservation_id}")
+    return reservation_id
+
+
+# ====================== LEDGER ==========================
+
+@celery.task
+def snapshot_balances_task():
+    from app import database
+    from app.ledger import take_snapshots
+
+    try:
+        written = take_snapshots()
+    finally:
+        database.db_session.remove()
+
+    print(f"[TASK] snapshot_balances_task → {written} snapshots")
+    return written
+
+
+@celery.task
+def reconcile_ledger_task():
+    """ report only: a drifted balance needs a look before it's adjusted """
+    from app import database
+    from app.ledger import reconcile
+
+    try:
+        drift = reconcile()
+    finally:
+        database.db_session.remove()
+
+    if drift:
+        print(f"[TASK] reconcile_ledger_task → funds disagree with the ledger: {drift}")
+    return len(drift)
+
+
+# ====================== DIGEST ==========================
+
+@celery.task(base=EmailTask, bind=True, autoretry_for=())
+def send_digest_task(self, recipient, events=None):
+    """ collected events are no longer buffered: a retry carries them along """
+    from app import digest
+
+    if events is None:
+        events = digest.collect(recipient)
+    try:
+        sent = digest.deliver(recipient, events)
+    except TransientEmailError as e:
+        return self.retry_rest(e, (recipient,), {"events": events})
+    except Exception as e:
+        # not on_failure: that would park the bare recipient, and a replay
+        # would collect an empty buffer
+        self._dead_letter((recipient,), {"events": events}, e)
+        return 0
+    print(f"[TASK] send_digest_task → {recipient}: {len(events)} events, {sent} emails")
+    return sent
+
+
+@celery.task
+def flush_digests_task():
+    """
+    Safety net for digests whose task was never queued or got lost; each
+    runs as its own task, with its own retries. Published directly: if
+    this publish is lost too, the next run finds the digest again.
+    """
+    from app import digest
+
+    recipients = digest.overdue()
+    for recipient in recipients:
+        send_digest_task.delay(recipient)
+    if recipients:
+        print(f"[TASK] flush_digests_task → {len(recipients)} overdue digests")
+    return len(recipients)
+
+
+# ====================== REMINDERS ==========================
+
+@celery.task
+def schedule_reminders_task():
+    from app import database, reminders
+
+    try:
+        queued = reminders.schedule()
+    finally:
+        database.db_session.remove()
+
+    if queued:
+        print(f"[TASK] schedule_reminders_task → {queued} reminders queued")
+    return queued
+
+
+# one task is up to REMINDER_SEND_CHUNK emails (app/reminders.py)
+REMINDER_RATE = SMTP_RATE_PER_MINUTE / int(os.environ.get("REMINDER_SEND_CHUNK", 50))
+
+
+@celery.task(base=EmailTask, bind=True, autoretry_for=(), rate_limit=f"{REMINDER_RATE:g}/m")
+def send_reminders_task(self, reminders):
+    """
+    One chunk of reminders. A permanent failure dead-letters that one
+    reminder; transient ones are retried together, without resending
+    the rest.
+    """
+    print(f"[TASK] send_reminders_task → {len(reminders)} reminders")
+    sent, again, error = 0, [], None
+    for r in reminders:
+        html = f"""
+        <h2>Your Session Is Coming Up</h2>
+        <p>Hello {r['username']},</p>
+        <p><b>{r['service_name']}</b> with <b>{r['trainer_name']}</b></p>
+        <p>Date: {r['date']}, Time: {r['time']}</p>
+        """
+        try:
+            send_email(r["recipient"], "Session Reminder", html)
+        except TransientEmailError as e:
+            again.append(r)
+            error = e
+        except Exception as e:
+            self._dead_letter(([r],), {}, e)
+        else:
+            sent += 1
+
+    if again:
+        self.retry_rest(error, (again,))
+    return sent
@@ -0,0 +1,251 @@
+"""
+Per-process cache behind Flask-Login's user_loader (app/app.py).
+
+A hit costs no query: the cached row is attached to the request's session
+with merge(load=False), so routes can still read relationships, change
+the user and commit as before.
+
+Staleness is bounded by versions, not by a TTL:
+
+  * every change of a user row (ban/unban, profile, password, funds via
+    ledger.post) bumps User.cache_version in the same transaction, and
+    the commit drops the entry from this process's cache;
+  * the browser session carries the version its user last saw, so a
+    member's own change is picked up by every process on their next
+    request;
+  * changes made elsewhere (an admin on another process, a Celery
+    worker) are found by one indexed query on User.versioned_at, run at
+    most every CHECK_INTERVAL seconds per process, for rows stamped
+    since the newest stamp the previous check saw.
+
+versioned_at is stamped as the transaction commits, by the database's
+clock on Postgres (hosts' clocks differ; SQLite lives on one host).
+There, stamping commits hold a shared advisory lock that the check takes
+exclusively while it reads: no commit stamped before the newest stamp it
+sees can still be in flight.
+"""
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import has_request_context, session as browser_session
+from sqlalchemy import event, func, inspect, select, text, update
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app import database
+from app.models import User
+
+
+CHECK_INTERVAL = timedelta(seconds=float(os.environ.get("USER_CACHE_CHECK_INTERVAL", 1.0)))
+MAX_USERS = int(os.environ.get("USER_CACHE_SIZE", 10000))
+
+# pg_advisory_lock key: stamping commits (shared) vs the check (exclusive)
+STAMP_LOCK = 0x75736572
+
+SESSION_KEY = "user_version"   # [user_id, cache_version] in the browser session
+
+_cache = OrderedDict()          # user_id -> detached User, least recently used first
+_lock = threading.Lock()
+_checked_at = None             # app clock: when this process last checked
+_high_water = None             # newest versioned_at seen (the database's clock)
+stats = {"hits": 0, "misses": 0, "invalidated": 0}
+
+
+# ----------------------- VERSIONS ---------------------------------
+def _clock(dialect_name):
+    """ now, in UTC """
+    if dialect_name == "postgresql":
+        return func.timezone("UTC", func.clock_timestamp())
+    return datetime.utcnow()
+
+
+def bump_values():
+    """
+    SET clauses that bump the version, for core UPDATEs of user rows.
+    In a session, also note_bumped(): the commit stamps the row again.
+    """
+    table = User.__table__
+    return {
+        "cache_version": table.c.cache_version + 1,
+        "versioned_at": _clock(database.engine.dialect.name),
+    }
+
+
+def note_bumped(session, user_ids):
+    """ drop these users from the cache once the session commits """
+    session.info.setdefault("user_cache_bumped", set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_changed_users(session, flush_context):
+    changed = {
+        obj.id for obj in session.dirty
+        if isinstance(obj, User) and session.is_modified(obj, include_collections=False)
+    }
+    deleted = {obj.id for obj in session.deleted if isinstance(obj, User)}
+
+    if changed:
+        table = User.__table__
+        session.connection().execute(
+            update(table).where(table.c.id.in_(changed)).values(**bump_values())
+        )
+        for obj in session.dirty:
+            if isinstance(obj, User) and obj.id in changed:
+                session.expire(obj, ["cache_version", "versioned_at"])
+    if changed or deleted:
+        note_bumped(session, changed | deleted)
+
+
+@event.listens_for(Session, "before_commit")
+def _stamp_bumped(session):
+    # the commit's own flush comes after this hook
+    session.flush()
+    user_ids = session.info.get("user_cache_bumped")
+    if not user_ids:
+        return
+    connection = session.connection()
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_advisory_xact_lock_shared(:key)"), {"key": STAMP_LOCK})
+    table = User.__table__
+    connection.execute(
+        update(table)
+        .where(table.c.id.in_(sorted(user_ids)))
+        .values(versioned_at=_clock(connection.dialect.name))
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    user_ids = session.info.pop("user_cache_bumped", None)
+    if not user_ids:
+        return
+    invalidate(user_ids)
+
+    # this browser's user changed: its stamp is outdated everywhere
+    if has_request_context():
+        stamp = browser_session.get(SESSION_KEY)
+        if stamp and stamp[0] in user_ids:
+            browser_session.pop(SESSION_KEY, None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session):
+    session.info.pop("user_cache_bumped", None)
+
+
+# ----------------------- CACHE ------------------------------------
+def invalidate(user_ids):
+    with _lock:
+        for user_id in user_ids:
+            if _cache.pop(user_id, None) is not None:
+                stats["invalidated"] += 1
+
+
+def clear():
+    global _checked_at, _high_water
+    with _lock:
+        _cache.clear()
+        _checked_at = _high_water = None
+
+
+def _store(user):
+    """ keep a detached copy: the request's instance stays in its session """
+    snapshot = User(**{
+        attr.key: getattr(user, attr.key)
+        for attr in inspect(User).column_attrs
+    })
+    make_transient_to_detached(snapshot)
+    with _lock:
+        _cache[user.id] = snapshot
+        _cache.move_to_end(user.id)
+        while len(_cache) > MAX_USERS:
+            _cache.popitem(last=False)
+
+
+def _changed_since(session, since):
+    """ (id, cache_version, versioned_at) of rows stamped at or after `since` """
+    query = select(User.id, User.cache_version, User.versioned_at)
+    if since is not None:
+        query = query.where(User.versioned_at >= since)
+    else:
+        # first check: only the newest stamp matters
+        query = query.where(User.versioned_at.isnot(None)).order_by(User.versioned_at.desc()).limit(1)
+
+    if session.get_bind().dialect.name != "postgresql":
+        return session.execute(query).all()
+
+    # wait out commits that are stamping right now; new ones wait for us
+    connection = session.connection()
+    connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": STAMP_LOCK})
+    try:
+        return connection.execute(query).all()
+    finally:
+        connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": STAMP_LOCK})
+
+
+def _check_elsewhere(session):
+    """
+    Drop entries whose row changed in another process since the last
+    check. The first call only finds where to start from.
+    """
+    global _checked_at, _high_water
+    now = datetime.utcnow()
+    with _lock:
+        since = _high_water
+        if since is not None and now - _checked_at < CHECK_INTERVAL:
+            return
+        _checked_at = now
+        if since is not None and not _cache:
+            return
+
+    rows = _changed_since(session, since)
+    with _lock:
+        newest = max((stamp for _id, _version, stamp in rows), default=since or datetime.min)
+        _high_water = newest if _high_water is None else max(_high_water, newest)
+        if since is None:
+            return
+        stale = [
+            user_id for user_id, version, _stamp in rows
+            if user_id in _cache and _cache[user_id].cache_version < version
+        ]
+    invalidate(stale)
+
+
+def remember(user):
+    """ at login: the user was just read, so the first request is a hit """
+    _check_elsewhere(database.db_session)
+    _store(user)
+    browser_session[SESSION_KEY] = [user.id, user.cache_version]
+
+
+def load(user_id, session=None):
+    """
+    The user for this request, attached to `session`, or None when the
+    account is gone or banned.
+    """
+    session = session or database.db_session
+    _check_elsewhere(session)
+
+    stamp = browser_session.get(SESSION_KEY)
+    with _lock:
+        cached = _cache.get(user_id)
+        if cached is not None:
+            _cache.move_to_end(user_id)
+
+    if cached is not None and stamp and stamp[0] == user_id and stamp[1] <= cached.cache_version:
+        stats["hits"] += 1
+        user = session.merge(cached, load=False)
+    else:
+        stats["misses"] += 1
+        user = session.get(User, user_id)
+        if user is None:
+            return None
+        _store(user)
+
+    if stamp != [user_id, user.cache_version]:
+        browser_session[SESSION_KEY] = [user_id, user.cache_version]
+
+    if user.is_banned:
+        return None
+    return user
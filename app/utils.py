@@ -1,21 +1,28 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from werkzeug.security import check_password_hash
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
 
 from app.database import db_session
 from app import database
+from app import ledger, passwords, stats
+from app.ledger import InsufficientFunds
+from app.conflicts import SlotConflict, claim_slot, claim_slots, overlap_filter
 from app.models import (
     User,
     Trainer,
     Service,
     Reservation,
-    Transaction,
+    ReservationSeries,
+    WaitlistEntry,
 )
 
 from app.tasks import (
     send_booking_confirmation_email,
+    send_series_confirmation_email,
     send_booking_updated_email,
     send_booking_canceled_email,
+    promote_waitlist,
 )
 
 
@@ -27,10 +34,18 @@ def check_credentials(login, password):
         .first()
     )
 
-    if user and check_password_hash(user.password, password):
-        return user
+    if not user or not passwords.check_password(user.password, password):
+        return None
 
-    return None
+    # made with outdated parameters: upgrade while we have the password
+    if passwords.needs_rehash(user.password):
+        try:
+            user.password = passwords.hash_password(password)
+            database.db_session.commit()
+        except passwords.HashingBusy:
+            pass   # next login
+
+    return user
 
 
 # ----------------------- SAFE GET ---------------------------------
@@ -44,37 +59,80 @@ def _get_entity(model, pk):
         return db_session.query(model).get(pk)
 
 
-# ----------------------- PAYMENTS ---------------------------------
-def charge_user(user, service):
-    """ deduct funds when booking """
-    user.funds -= service.price
-
-    tx = Transaction(
-        user_id=user.id,
-        amount=-service.price,
-        type="payment",
-        created_at=datetime.utcnow()
+# ----------------------- RESERVATION SLOT -------------------------
+# legacy rows were stored in both formats
+RESERVATION_FORMATS = ("%Y-%m-%d %H:%M", "%d.%m.%Y %H:%M")
+
+
+def parse_reservation_start(date, time):
+    """ None if unparseable; only legacy rows may keep that """
+    raw = f"{date} {time}"
+    for fmt in RESERVATION_FORMATS:
+        try:
+            return datetime.strptime(raw, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def set_reservation_slot(reservation, date, time, service=None):
+    """ update date/time together with starts_at / ends_at """
+    service = service or reservation.service
+
+    reservation.date = date
+    reservation.time = time
+    reservation.starts_at = parse_reservation_start(date, time)
+    reservation.ends_at = (
+        reservation.starts_at + timedelta(minutes=service.duration)
+        if reservation.starts_at and service and service.duration
+        else None
     )
+    # a moved session gets its own reminder (app/reminders.py)
+    reservation.reminded_at = None
 
-    db_session.add(tx)
+
+# ----------------------- PAYMENTS ---------------------------------
+def charge_user(user, service, quantity=1, idempotency_key=None):
+    """
+    deduct funds when booking: one conditional UPDATE (see ledger.post),
+    so concurrent bookings can't both spend the same balance
+    """
+    amount = service.price * quantity
+    if ledger.post(user.id, -amount, "payment", idempotency_key, require_funds=True):
+        stats.incr("revenue", amount)
 
 
-def refund_user(user, service):
+def refund_user(user, service, idempotency_key=None):
     """ return funds on cancellation """
-    user.funds += service.price
+    if ledger.post(user.id, service.price, "refund", idempotency_key):
+        stats.incr("revenue", -service.price)
+
 
-    tx = Transaction(
-        user_id=user.id,
-        amount=service.price,
-        type="refund",
-        created_at=datetime.utcnow()
+# ----------------------- CREATE RESERVATION ------------------------
+def _existing_booking(user_id, idempotency_key):
+    return (
+        db_session.query(Reservation)
+        .filter_by(user_id=user_id, idempotency_key=idempotency_key)
+        .first()
     )
 
-    db_session.add(tx)
 
+def create_reservation(user_id, service_id, trainer_id, date, time, idempotency_key=None):
+    """
+    Book, charge and claim the trainer slot in one transaction.
+
+    Raises ValueError (bad date/time), InsufficientFunds or SlotConflict
+    (nothing is written). A repeated idempotency_key returns the
+    reservation it already created, without charging or emailing again.
+    """
+    if parse_reservation_start(date, time) is None:
+        raise ValueError(f"bad slot {date} {time}")
+
+    if idempotency_key:
+        existing = _existing_booking(user_id, idempotency_key)
+        if existing:
+            return existing
 
-# ----------------------- CREATE RESERVATION ------------------------
-def create_reservation(user_id, service_id, trainer_id, date, time):
     user = _get_entity(User, user_id)
     trainer = _get_entity(Trainer, trainer_id)
     service = _get_entity(Service, service_id)
@@ -86,27 +144,138 @@ def create_reservation(user_id, service_id, trainer_id, date, time):
         trainer_id=trainer_id,
         service_id=service_id,
         user_id=user_id,
-        date=date,
-        time=time,
+        idempotency_key=idempotency_key,
     )
+    set_reservation_slot(reservation, date, time, service)
 
-    db_session.add(reservation)
+    try:
+        # 💳 deduct funds
+        charge_user(user, service)
+
+        db_session.add(reservation)
+        stats.reservation_added(reservation)
+
+        # raises SlotConflict (rolled back) if the trainer is busy
+        claim_slot(reservation)
+
+        # outbox row: commits (or rolls back) together with the booking
+        send_booking_confirmation_email(
+            user.email,
+            user.login,
+            service.name,
+            trainer.name,
+            date,
+            time,
+            reservation.id,
+        )
+        db_session.commit()
+    except InsufficientFunds:
+        db_session.rollback()
+        raise
+    except IntegrityError:
+        # the same key committed concurrently: that booking wins
+        db_session.rollback()
+        existing = idempotency_key and _existing_booking(user_id, idempotency_key)
+        if existing:
+            return existing
+        raise
 
-    # 💳 deduct funds
-    charge_user(user, service)
+    return reservation
 
-    db_session.commit()
 
-    send_booking_confirmation_email(
-        user.email,
-        user.login,
-        service.name,
-        trainer.name,
-        date,
-        time,
+# ----------------------- SERIES ------------------------------------
+MAX_SERIES = 52
+
+
+class InvalidSeries(ValueError):
+    """ the repeat rule is out of range (count, interval) """
+
+
+def series_dates(first_date, count, every_days=7):
+    start = datetime.strptime(first_date, "%Y-%m-%d").date()
+    return [(start + timedelta(days=every_days * i)).isoformat() for i in range(count)]
+
+
+def create_series(user_id, service_id, trainer_id, first_date, time, count,
+                  every_days=7, idempotency_key=None):
+    """
+    Book `count` sessions, `every_days` apart, as one unit: one transaction,
+    one batched INSERT, one payment for the total, one overlap query for
+    the whole set and one summary email. All or nothing.
+
+    Raises InvalidSeries (bad rule), ValueError (bad date/time),
+    InsufficientFunds or SlotConflict.
+    """
+    if not 1 <= count <= MAX_SERIES or every_days < 1:
+        raise InvalidSeries(f"series must have 1..{MAX_SERIES} sessions at least a day apart")
+    if parse_reservation_start(first_date, time) is None:
+        raise ValueError(f"bad slot {first_date} {time}")
+
+    if idempotency_key:
+        existing = (
+            db_session.query(ReservationSeries)
+            .filter_by(user_id=user_id, idempotency_key=idempotency_key)
+            .first()
+        )
+        if existing:
+            return existing
+
+    user = _get_entity(User, user_id)
+    trainer = _get_entity(Trainer, trainer_id)
+    service = _get_entity(Service, service_id)
+
+    if not user or not trainer or not service:
+        return None
+
+    dates = series_dates(first_date, count, every_days)
+
+    series = ReservationSeries(
+        user_id=user_id,
+        trainer_id=trainer_id,
+        service_id=service_id,
+        first_date=first_date,
+        time=time,
+        every_days=every_days,
+        count=count,
+        idempotency_key=idempotency_key,
     )
+    for date in dates:
+        reservation = Reservation(trainer_id=trainer_id, service_id=service_id, user_id=user_id)
+        set_reservation_slot(reservation, date, time, service)
+        series.reservations.append(reservation)
 
-    return reservation
+    try:
+        charge_user(user, service, quantity=count)
+
+        db_session.add(series)
+        stats.reservations_added(series.reservations)
+
+        claim_slots(series.reservations)
+
+        send_series_confirmation_email(
+            user.email,
+            user.login,
+            service.name,
+            trainer.name,
+            dates,
+            time,
+        )
+        db_session.commit()
+    except InsufficientFunds:
+        db_session.rollback()
+        raise
+    except IntegrityError:
+        db_session.rollback()
+        existing = idempotency_key and (
+            db_session.query(ReservationSeries)
+            .filter_by(user_id=user_id, idempotency_key=idempotency_key)
+            .first()
+        )
+        if existing:
+            return existing
+        raise
+
+    return series
 
 
 # ----------------------- UPDATE RESERVATION ------------------------
@@ -120,10 +289,14 @@ def update_reservation(reservation_id, user_id, new_date, new_time):
     if not reservation:
         return None
 
-    reservation.date = new_date
-    reservation.time = new_time
+    if parse_reservation_start(new_date, new_time) is None:
+        raise ValueError(f"bad slot {new_date} {new_time}")
 
-    db_session.commit()
+    old_starts_at = reservation.starts_at
+    set_reservation_slot(reservation, new_date, new_time)
+    stats.reservation_moved(reservation, old_starts_at)
+
+    claim_slot(reservation)
 
     user = reservation.user
 
@@ -132,7 +305,9 @@ def update_reservation(reservation_id, user_id, new_date, new_time):
         user.login,
         new_date,
         new_time,
+        reservation.id,
     )
+    db_session.commit()
 
     return reservation
 
@@ -150,16 +325,185 @@ def cancel_reservation(reservation_id, user_id):
 
     user = reservation.user
     service = reservation.service
+    trainer_id, starts_at = reservation.trainer_id, reservation.starts_at
+    date, time = reservation.date, reservation.time
 
     # ♻️ refund funds
     refund_user(user, service)
 
+    stats.reservation_removed(reservation)
     db_session.delete(reservation)
-    db_session.commit()
 
     send_booking_canceled_email(
         user.email,
         user.login,
+        reservation_id,
+        date,
+        time,
+    )
+
+    waitlist_slot_freed(trainer_id, starts_at)
+    db_session.commit()
+
+    return True
+
+
+# ----------------------- WAITLIST ----------------------------------
+def _waiting(trainer_id, starts_at):
+    # served by ix_waitlist_entry_slot_queue: the head is one index seek
+    return (
+        db_session.query(WaitlistEntry)
+        .filter_by(trainer_id=trainer_id, starts_at=starts_at, status="waiting")
+        .order_by(WaitlistEntry.id)
+    )
+
+
+def waitlist_position(entry):
+    """ 1-based place in the slot's queue """
+    return _waiting(entry.trainer_id, entry.starts_at).filter(WaitlistEntry.id <= entry.id).count()
+
+
+def join_waitlist(user_id, service_id, trainer_id, date, time):
+    """
+    Queue the member for a taken slot. Joining twice returns the same
+    entry. Raises ValueError for an unparseable date/time.
+    """
+    user = _get_entity(User, user_id)
+    trainer = _get_entity(Trainer, trainer_id)
+    service = _get_entity(Service, service_id)
+
+    if not user or not trainer or not service:
+        return None
+
+    starts_at = parse_reservation_start(date, time)
+    if starts_at is None:
+        raise ValueError(f"bad slot {date} {time}")
+
+    existing = _waiting(trainer_id, starts_at).filter_by(user_id=user_id).first()
+    if existing:
+        return existing
+
+    entry = WaitlistEntry(
+        trainer_id=trainer_id,
+        starts_at=starts_at,
+        service_id=service_id,
+        user_id=user_id,
+        date=date,
+        time=time,
+    )
+    db_session.add(entry)
+    try:
+        db_session.flush()
+    except IntegrityError:
+        # double submit: ux_waitlist_entry_waiting_user kept the first one
+        db_session.rollback()
+        return _waiting(trainer_id, starts_at).filter_by(user_id=user_id).first()
+
+    # the slot may have freed up meanwhile: nobody would cancel it again
+    busy = (
+        db_session.query(Reservation.id)
+        .filter(overlap_filter(trainer_id, starts_at, starts_at + timedelta(minutes=service.duration or 1)))
+        .first()
     )
+    if not busy:
+        promote_waitlist(trainer_id, starts_at.isoformat())
+    db_session.commit()
+
+    return entry
+
+
+def waitlist_slot_freed(trainer_id, starts_at):
+    """
+    Call in the cancellation's transaction, before its commit. Promotion
+    runs in a Celery task (via the outbox), so the request only pays for
+    one indexed lookup.
+    """
+    if starts_at is None or _waiting(trainer_id, starts_at).first() is None:
+        return False
 
+    promote_waitlist(trainer_id, starts_at.isoformat())
     return True
+
+
+def _skip_entry(entry_id):
+    table = WaitlistEntry.__table__
+    db_session.execute(
+        update(table)
+        .where(table.c.id == entry_id, table.c.status == "waiting")
+        .values(status="skipped")
+    )
+    db_session.commit()
+
+
+def promote_waitlist_head(trainer_id, starts_at):
+    """
+    Book the slot for the first waiting member: claim the entry, charge,
+    claim the trainer slot, commit, all in one transaction. Members who
+    can't pay are skipped. Returns the reservation, or None when nobody
+    is waiting or the slot is taken again.
+
+    Safe to run concurrently for one slot: the entry flips
+    waiting -> promoted with a conditional UPDATE, and claim_slot lets
+    only one booking of the slot commit.
+    """
+    table = WaitlistEntry.__table__
+
+    while True:
+        entry = _waiting(trainer_id, starts_at).first()
+        if entry is None:
+            return None
+
+        claimed = db_session.execute(
+            update(table)
+            .where(table.c.id == entry.id, table.c.status == "waiting")
+            .values(status="promoted")
+        ).rowcount
+        if not claimed:
+            # a concurrent promotion took this one: look at the new head
+            db_session.rollback()
+            continue
+        db_session.expire(entry, ["status"])
+
+        user = _get_entity(User, entry.user_id)
+        trainer = _get_entity(Trainer, entry.trainer_id)
+        service = _get_entity(Service, entry.service_id)
+        if not user or not trainer or not service:
+            db_session.rollback()
+            _skip_entry(entry.id)
+            continue
+
+        reservation = Reservation(
+            trainer_id=entry.trainer_id,
+            service_id=entry.service_id,
+            user_id=entry.user_id,
+        )
+        set_reservation_slot(reservation, entry.date, entry.time, service)
+
+        try:
+            charge_user(user, service)
+
+            db_session.add(reservation)
+            stats.reservation_added(reservation)
+
+            # rolls back (entry is waiting again) if the slot was re-booked
+            claim_slot(reservation)
+        except InsufficientFunds:
+            db_session.rollback()
+            _skip_entry(entry.id)
+            continue
+        except SlotConflict:
+            return None
+
+        entry.reservation_id = reservation.id
+        send_booking_confirmation_email(
+            user.email,
+            user.login,
+            service.name,
+            trainer.name,
+            entry.date,
+            entry.time,
+            reservation.id,
+        )
+        db_session.commit()
+
+        return reservation
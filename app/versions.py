@@ -0,0 +1,144 @@
+"""
+Per-table change counters behind export reuse and the calendar ETag.
+
+A flush only notes which tracked tables it touched; the counters move
+right before the commit, in the same transaction, so data and counter
+commit (or roll back) together.
+
+Postgres keeps one sequence per table: nextval() never blocks, but it is
+seen before the commit. A reader in that instant could pair the new
+counter with old data, so the counter moves once more after the commit
+(best effort): new data may briefly show under an old counter, never old
+data under the current one. Elsewhere the data_version rows, seeded by
+the migration and init_versions, are updated; SQLite serializes writers
+anyway.
+"""
+from itertools import chain
+
+from sqlalchemy import event, select, text, update
+from sqlalchemy.orm import Session
+
+from app import database
+from app.bulk import insert_missing
+from app.models import DataVersion
+
+
+# tables whose changes invalidate cached artifacts
+TRACKED_TABLES = {
+    "reservation",
+    "user",
+    "trainer",
+    "service",
+    "transaction",
+    "audit_log",
+}
+
+
+def _sequence(name):
+    return f"data_version_{name}_seq"
+
+
+def init_versions(engine=None):
+    """ one counter per tracked table, starting at 0 (idempotent) """
+    engine = engine or database.engine
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            for name in sorted(TRACKED_TABLES):
+                conn.exec_driver_sql(f'CREATE SEQUENCE IF NOT EXISTS "{_sequence(name)}"')
+            return
+        for name in sorted(TRACKED_TABLES):
+            insert_missing(conn, DataVersion.__table__, ["name"], {"name": name, "version": 0})
+
+
+def bump(connection, names):
+    names = sorted(set(names) & TRACKED_TABLES)
+    if not names:
+        return
+
+    if connection.dialect.name == "postgresql":
+        calls = ", ".join(f"nextval('\"{_sequence(name)}\"')" for name in names)
+        connection.exec_driver_sql(f"SELECT {calls}")
+        return
+
+    table = DataVersion.__table__
+    connection.execute(
+        update(table)
+        .where(table.c.name.in_(names))
+        .values(version=table.c.version + 1)
+    )
+
+
+def current_versions(session, names):
+    names = sorted(set(names) & TRACKED_TABLES)
+    versions = dict.fromkeys(names, 0)
+    if not names:
+        return versions
+
+    if session.get_bind().dialect.name == "postgresql":
+        columns = ", ".join(
+            f'(SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM "{_sequence(name)}")'
+            for name in names
+        )
+        versions.update(zip(names, session.execute(text(f"SELECT {columns}")).one()))
+        return versions
+
+    versions.update(session.execute(
+        select(DataVersion.name, DataVersion.version)
+        .where(DataVersion.name.in_(names))
+    ).all())
+    return versions
+
+
+def version_stamp(session, names):
+    """ e.g. "reservation:12,user:3" """
+    versions = current_versions(session, names)
+    return ",".join(f"{name}:{versions[name]}" for name in sorted(versions))
+
+
+@event.listens_for(Session, "after_flush")
+def _track_changes(session, flush_context):
+    dirty = (obj for obj in session.dirty if session.is_modified(obj))
+    names = {
+        obj.__table__.name
+        for obj in chain(session.new, dirty, session.deleted)
+        if getattr(obj, "__table__", None) is not None
+    } & TRACKED_TABLES
+
+    if names:
+        session.info.setdefault("data_version_changed", set()).update(names)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_in_transaction(session):
+    # the commit's own flush comes after this hook: flush first so its
+    # tables are counted too
+    session.flush()
+    names = session.info.pop("data_version_changed", None)
+    if not names:
+        return
+    connection = session.connection()
+    bump(connection, names)
+    if connection.dialect.name == "postgresql":
+        session.info.setdefault("data_version_recheck", set()).update(names)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _bump_after_commit(session, transaction):
+    # by now the session has given its connection back to the pool; the
+    # data is saved whatever happens here
+    if transaction.parent is not None:
+        return
+    names = session.info.pop("data_version_recheck", None)
+    if not names:
+        return
+    try:
+        with session.get_bind().begin() as conn:
+            bump(conn, names)
+    except Exception as e:
+        print(f"[VERSIONS] post-commit bump of {sorted(names)} failed: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session):
+    session.info.pop("data_version_changed", None)
+    session.info.pop("data_version_recheck", None)
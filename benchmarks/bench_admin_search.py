@@ -0,0 +1,128 @@
+"""
+Admin reservation search benchmark.
+
+Seeds synthetic users / trainers / services / reservations and measures
+p50 / p99 latency of one search page (query + count) for the old LIKE
+scan and the indexed search.
+
+    DATABASE_URL=sqlite:///bench_search.db python benchmarks/bench_admin_search.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_search.db")
+
+from app import database
+from app.models import User, Trainer, Service, Reservation, FitnessCenter
+from app.reservation_query import reservation_query, paginate
+from app import search
+
+
+QUERIES = ["john", "yoga", "gmail", "member_12345", "emily", "xyz_nothing"]
+FIRST_NAMES = ["John", "Emily", "Michael", "Olena", "Taras", "Sophia", "Mark", "Anna"]
+SERVICES = ["Yoga", "Pilates", "Boxing", "Crossfit", "Stretching", "Spinning"]
+
+
+def seed(rows, users, batch=20000):
+    session = database.db_session
+    if session.query(Reservation.id).first():
+        print("database already seeded, skipping")
+        return
+
+    session.add(FitnessCenter(name="Bench Gym", address="-", contacts="-"))
+    session.commit()
+
+    engine = database.engine
+    with engine.begin() as conn:
+        conn.execute(Trainer.__table__.insert(), [
+            {"name": f"{random.choice(FIRST_NAMES)} Trainer {i}", "gym_id": 1, "is_active": True}
+            for i in range(200)
+        ])
+        conn.execute(Service.__table__.insert(), [
+            {"name": f"{name} {i}", "duration": 60, "price": 20, "description": "-", "is_active": True}
+            for i, name in enumerate(SERVICES * 5)
+        ])
+        conn.execute(User.__table__.insert(), [
+            {
+                "login": f"member_{i}",
+                "password": "-",
+                "birth_date": "2000-01-01",
+                "phone": "-",
+                "email": f"member_{i}@{random.choice(['gmail.com', 'ukr.net', 'mail.com'])}",
+                "funds": 0,
+            }
+            for i in range(users)
+        ])
+
+    start = datetime(2024, 1, 1, 8, 0)
+    done = 0
+    while done < rows:
+        n = min(batch, rows - done)
+        chunk = []
+        for _ in range(n):
+            starts_at = start + timedelta(minutes=15 * random.randrange(0, 4 * 24 * 365 * 2))
+            chunk.append({
+                "user_id": random.randint(1, users),
+                "trainer_id": random.randint(1, 200),
+                "service_id": random.randint(1, len(SERVICES) * 5),
+                "date": starts_at.strftime("%Y-%m-%d"),
+                "time": starts_at.strftime("%H:%M"),
+                "starts_at": starts_at,
+                "ends_at": starts_at + timedelta(minutes=60),
+                "status": "active",
+            })
+        with engine.begin() as conn:
+            conn.execute(Reservation.__table__.insert(), chunk)
+        done += n
+        print(f"seeded {done}/{rows}")
+
+
+def like_page(q):
+    query, _ = search._like_search(reservation_query(), q)
+    return paginate(query, page=1, per_page=10)
+
+
+def indexed_page(q):
+    return paginate(reservation_query(q=q), page=1, per_page=10)
+
+
+def measure(fn, q, repeat):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(q)
+        timings.append((time.perf_counter() - t0) * 1000)
+        database.db_session.remove()
+    timings.sort()
+    p50 = statistics.median(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    return p50, p99
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    database.init_db()
+    seed(args.rows, args.users)
+    search.rebuild_search_index()
+
+    print(f"\n{'query':<16}{'like p50':>12}{'like p99':>12}{'index p50':>12}{'index p99':>12}  (ms)")
+    for q in QUERIES:
+        like = measure(like_page, q, args.repeat)
+        indexed = measure(indexed_page, q, args.repeat)
+        print(f"{q:<16}{like[0]:>12.1f}{like[1]:>12.1f}{indexed[0]:>12.1f}{indexed[1]:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
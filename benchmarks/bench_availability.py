@@ -0,0 +1,152 @@
+"""
+Trainer availability benchmark.
+
+Seeds one gym with trainers and a few weeks of bookings, then answers
+"free 60-minute slots across the gym for the next N days" three ways:
+
+  naive     load the reservations in range, test every candidate slot
+  bitmaps   app.availability.free_slots (one read of the bitmaps)
+  compute   the bit arithmetic alone, bitmaps already in memory
+
+    DATABASE_URL=sqlite:///bench_availability.db python benchmarks/bench_availability.py --trainers 40 --days 14
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_availability.db")
+
+from app import database
+from app.models import Trainer, Service, Reservation, FitnessCenter, TrainerAvailability
+from app import availability
+
+
+def seed(trainers, days, per_day):
+    session = database.db_session
+    if session.query(FitnessCenter.id).filter_by(name="Bench Availability Gym").first():
+        print("database already seeded, skipping")
+        return
+
+    center = FitnessCenter(name="Bench Availability Gym", address="-", contacts="-")
+    session.add(center)
+    session.commit()
+
+    service = Service(name="Bench 60", duration=60, price=10, description="-", fitness_center_id=center.id)
+    staff = [Trainer(name=f"Bench Trainer {i}", gym_id=center.id) for i in range(trainers)]
+    session.add_all([service, *staff])
+    session.commit()
+
+    rows = []
+    today = date.today()
+    for trainer in staff:
+        for offset in range(days):
+            day = today + timedelta(days=offset)
+            for hour in random.sample(range(7, 21), per_day):
+                starts_at = datetime.combine(day, datetime.min.time()) + timedelta(hours=hour)
+                rows.append({
+                    "trainer_id": trainer.id,
+                    "service_id": service.id,
+                    "user_id": 1,
+                    "date": day.isoformat(),
+                    "time": f"{hour:02d}:00",
+                    "starts_at": starts_at,
+                    "ends_at": starts_at + timedelta(minutes=60),
+                    "status": "active",
+                })
+
+    with database.engine.begin() as conn:
+        conn.execute(Reservation.__table__.insert(), rows)
+
+    # bulk insert bypasses the ORM listener
+    availability.rebuild(days=days + 1)
+    print(f"seeded {len(rows)} reservations")
+
+
+def naive(service, trainers, days):
+    """ the pre-bitmap way: scan reservations, test each candidate start """
+    session = database.db_session
+    today = date.today()
+    start = datetime.combine(today, availability.OPEN)
+    end = datetime.combine(today + timedelta(days=days), availability.OPEN)
+
+    booked = {}
+    for trainer_id, starts_at, ends_at in session.query(
+        Reservation.trainer_id, Reservation.starts_at, Reservation.ends_at
+    ).filter(
+        Reservation.trainer_id.in_([t.id for t in trainers]),
+        Reservation.status == "active",
+        Reservation.starts_at >= start - timedelta(days=1),
+        Reservation.starts_at < end,
+    ):
+        booked.setdefault(trainer_id, []).append((starts_at, ends_at))
+
+    length = timedelta(minutes=service.duration)
+    result = {}
+    for t in trainers:
+        for offset in range(days):
+            day = today + timedelta(days=offset)
+            slot = datetime.combine(day, availability.OPEN)
+            close = datetime.combine(day, availability.CLOSE)
+            free = []
+            while slot + length <= close:
+                if not any(s < slot + length and e > slot for s, e in booked.get(t.id, ())):
+                    free.append(slot)
+                slot += timedelta(minutes=availability.SLOT_MINUTES)
+            result[(t.id, day)] = free
+    return result
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return statistics.median(samples), samples[max(int(len(samples) * 0.99) - 1, 0)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trainers", type=int, default=40)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--per-day", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    database.init_db()
+    seed(args.trainers, args.days, args.per_day)
+
+    session = database.db_session
+    service = session.query(Service).filter_by(name="Bench 60").first()
+    trainers = session.query(Trainer).filter_by(gym_id=service.fitness_center_id).all()
+
+    bitmaps = {
+        (row.trainer_id, row.day): row.busy
+        for row in session.query(TrainerAvailability)
+    }
+    slots_needed = service.duration // availability.SLOT_MINUTES
+
+    def compute():
+        for busy in bitmaps.values():
+            availability.free_starts(busy, slots_needed)
+
+    for label, fn in [
+        ("naive", lambda: naive(service, trainers, args.days)),
+        ("bitmaps", lambda: availability.free_slots(service, days=args.days)),
+        ("compute", compute),
+    ]:
+        p50, p99 = timed(fn, args.repeat)
+        print(f"{label:8s} p50 {p50 * 1000:9.3f} ms   p99 {p99 * 1000:9.3f} ms")
+
+    print(f"{len(bitmaps)} trainer-days, {args.trainers} trainers x {args.days} days")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Login throughput: password checks/sec from `--threads` request threads
+(a burst of logins), with the KDF
+
+  inline      on the request thread, as before (werkzeug directly)
+  pool=N      in app.passwords.HashPool with N worker processes
+
+Past workers + `--queue` waiting callers the pool sheds (503 in the app);
+"shed" counts those, and they are not in the throughput.
+
+    python benchmarks/bench_login.py --logins 200 --threads 16 --pools 1,2,4
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BASE_DIR)
+
+from app.passwords import METHOD, HashPool, HashingBusy
+
+
+def run(label, check, pwhash, logins, threads):
+    latencies, shed = [], 0
+
+    def login(_):
+        started = time.perf_counter()
+        try:
+            assert check(pwhash, "correct horse")
+        except HashingBusy:
+            return None
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as workers:
+        for latency in workers.map(login, range(logins)):
+            if latency is None:
+                shed += 1
+            else:
+                latencies.append(latency)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    print(
+        f"{label:10s} {len(latencies) / elapsed:8.1f} logins/s   "
+        f"p95 {p95 * 1000:7.1f} ms   {shed:4d} shed"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--pools", default="1,2,4")
+    parser.add_argument("--queue", type=int, default=64)
+    parser.add_argument("--method", default=METHOD)
+    args = parser.parse_args()
+
+    pwhash = generate_password_hash("correct horse", args.method)
+
+    run("inline", check_password_hash, pwhash, args.logins, args.threads)
+    for workers in [int(n) for n in args.pools.split(",")]:
+        pool = HashPool(workers=workers, queue=args.queue)
+        try:
+            pool.check(pwhash, "correct horse")   # start the worker processes
+            run(f"pool={workers}", pool.check, pwhash, args.logins, args.threads)
+        finally:
+            pool.close()
+
+    print(f"{args.logins} logins, {args.threads} request threads, {args.method}, {os.cpu_count()} CPUs")
+
+
+if __name__ == "__main__":
+    main()
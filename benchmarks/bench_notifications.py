@@ -0,0 +1,86 @@
+"""
+Notification dispatch benchmark.
+
+Compares the old per-request `asyncio.run(stub())` with submitting to the
+long-lived dispatcher, then measures end-to-end throughput through a fake
+sink that costs `--sink-ms` per batch (think one SMTP / HTTP round trip).
+
+    python benchmarks/bench_notifications.py --events 20000 --sink-ms 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BASE_DIR)
+
+from app.notifications import Dispatcher, FakeSink
+
+
+async def _stub(event):
+    return
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return (
+        statistics.median(samples) * 1e6,
+        samples[int(len(samples) * 0.99) - 1] * 1e6,
+    )
+
+
+def bench_old(events):
+    timings = []
+    for i in range(events):
+        started = time.perf_counter()
+        asyncio.run(_stub({"reservation_id": i}))
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def bench_dispatcher(events, sink_ms, batch_size):
+    sink = FakeSink(delay=sink_ms / 1000)
+    dispatcher = Dispatcher([sink], maxsize=events, batch_size=batch_size, batch_wait=0.005)
+    dispatcher.start()
+
+    timings = []
+    started_all = time.perf_counter()
+    for i in range(events):
+        started = time.perf_counter()
+        dispatcher.submit({"action": "canceled", "reservation_id": i})
+        timings.append(time.perf_counter() - started)
+    submitted = time.perf_counter() - started_all
+
+    dispatcher.flush(timeout=600)
+    drained = time.perf_counter() - started_all
+    dispatcher.stop()
+
+    assert len(sink.events) == events
+    return timings, submitted, drained, len(sink.batches)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--sink-ms", type=float, default=5.0)
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+
+    p50, p99 = _percentiles(bench_old(min(args.events, 5000)))
+    print(f"asyncio.run per request   p50 {p50:8.1f} us   p99 {p99:8.1f} us")
+
+    timings, submitted, drained, batches = bench_dispatcher(args.events, args.sink_ms, args.batch_size)
+    p50, p99 = _percentiles(timings)
+    print(f"dispatcher.submit         p50 {p50:8.1f} us   p99 {p99:8.1f} us")
+    print(
+        f"{args.events} events through a {args.sink_ms} ms/batch sink: "
+        f"{batches} batches, submitted in {submitted:.2f} s, drained in {drained:.2f} s "
+        f"({args.events / drained:,.0f} events/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+SMTP sending benchmark: emails/sec against the local SMTP stand-in
+(tests/smtp_stub.py), which delays every reply by `--latency-ms` like a
+network round trip.
+
+  per-message   the old send_email: connect, EHLO, login, send, QUIT each time
+  pooled        app.smtp_pool.SMTPPool: sessions reused across messages
+
+The stand-in has no TLS, so the STARTTLS handshake the old code also paid
+for every email is not in the "per-message" numbers: the real gap is wider.
+
+    python benchmarks/bench_smtp.py --emails 500 --latency-ms 2 --threads 4
+"""
+import argparse
+import os
+import smtplib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BASE_DIR)
+
+from app.smtp_pool import SMTPPool
+from tests.smtp_stub import SMTPStub
+
+
+MESSAGE = "Subject: Booking updated\r\n\r\nYour session moved to 18:00.\r\n"
+
+
+def per_message(port):
+    def send(_):
+        with smtplib.SMTP("127.0.0.1", port) as server:
+            server.login("sender@a.com", "secret")
+            server.sendmail("sender@a.com", ["member@a.com"], MESSAGE)
+    return send
+
+
+def pooled(port, threads):
+    pool = SMTPPool("127.0.0.1", port, "sender@a.com", "secret", starttls=False, size=threads)
+
+    def send(_):
+        pool.send("sender@a.com", ["member@a.com"], MESSAGE)
+    return send
+
+
+def run(label, send, emails, threads, server):
+    connections = server.connections
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as workers:
+        list(workers.map(send, range(emails)))
+    elapsed = time.perf_counter() - started
+    print(
+        f"{label:12s} {emails / elapsed:8.0f} emails/s   "
+        f"{elapsed * 1000 / emails:6.2f} ms/email   "
+        f"{server.connections - connections:5d} connections"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--emails", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+
+    server = SMTPStub(latency=args.latency_ms / 1000).start()
+    try:
+        run("per-message", per_message(server.port), args.emails, args.threads, server)
+        run("pooled", pooled(server.port, args.threads), args.emails, args.threads, server)
+    finally:
+        server.stop()
+
+    print(f"{args.emails} emails, {args.latency_ms} ms per reply, {args.threads} sending threads")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
 import os
 import sys
+import uuid
+from contextlib import contextmanager
+
 import pytest
+from sqlalchemy import event
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if BASE_DIR not in sys.path:
@@ -8,9 +12,17 @@ if BASE_DIR not in sys.path:
 
 # ---- тестова база ----
 os.environ["DATABASE_URL"] = "sqlite:///test.db"
+# notifications go to FakeSink (see the `notifications` fixture), never to Celery
+os.environ["NOTIFY_SINKS"] = ""
+# the user cache's cross-process check would add a query to budgets at
+# random; tests/test_user_cache.py runs it on purpose
+os.environ["USER_CACHE_CHECK_INTERVAL"] = "3600"
+
+from werkzeug.security import generate_password_hash
 
 from app.app import app
 from app import database
+from app.models import User
 
 
 @pytest.fixture
@@ -22,3 +34,139 @@ def client():
 
     with app.test_client() as client:
         yield client
+
+
+@pytest.fixture
+def make_user():
+    """
+    make_user("bk", funds=100): a committed member with a unique login
+    (and email); any other User column can be passed too
+    """
+    def make(prefix="u", **fields):
+        login = f"{prefix}_{uuid.uuid4().hex[:8]}"
+        values = {
+            "login": login,
+            "password": "123",
+            "birth_date": "2000-01-01",
+            "phone": "000",
+            "email": f"{login}@a.com",
+        }
+        values.update(fields)
+        user = User(**values)
+        database.db_session.add(user)
+        database.db_session.commit()
+        return user
+
+    return make
+
+
+@pytest.fixture
+def admin_client(client):
+    login = f"admin_{uuid.uuid4().hex[:8]}"
+    database.db_session.add(User(
+        login=login,
+        password=generate_password_hash("admin"),
+        birth_date="2000-01-01",
+        phone="000",
+        email=f"{login}@a.com",
+        is_admin=True,
+    ))
+    database.db_session.commit()
+    database.db_session.remove()
+
+    client.post("/login", data={"login": login, "password": "admin"})
+    return client
+
+
+@pytest.fixture
+def notifications():
+    """ fresh dispatcher whose only sink records events in memory """
+    from app import notifications as notify
+
+    sink = notify.FakeSink()
+    dispatcher = notify.configure([sink], batch_wait=0.01)
+    yield sink
+    dispatcher.stop(timeout=1.0)
+
+
+# ---- N+1 guard ----
+@contextmanager
+def count_queries(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture(autouse=True)
+def request_query_budgets(request):
+    """
+    Every GET a test client sends is held to the QUERY_BUDGETS entry of
+    the loader profiles it used (app/loaders.py): a lazy load per row
+    fails whichever test happens to render the page.
+    """
+    if "client" not in request.fixturenames:
+        yield
+        return
+
+    from flask import g, has_request_context, request_finished, request_started
+    from app.loaders import QUERY_BUDGETS
+
+    overruns = []
+
+    def started(sender, **extra):
+        g.query_statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and "query_statements" in g:
+            g.query_statements.append(statement)
+
+    def finished(sender, response, **extra):
+        from flask import request as flask_request
+        profiles = g.get("loader_profiles")
+        if flask_request.method != "GET" or not profiles:
+            return
+        limit = max(QUERY_BUDGETS[profile] for profile in profiles)
+        statements = g.pop("query_statements", [])
+        if len(statements) > limit:
+            overruns.append(
+                f"GET {flask_request.full_path}: {len(statements)} queries, "
+                f"budget of {sorted(profiles)} is {limit}:\n" + "\n\n".join(statements)
+            )
+
+    request_started.connect(started, app)
+    request_finished.connect(finished, app)
+    event.listen(database.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield
+    finally:
+        event.remove(database.engine, "before_cursor_execute", before_cursor_execute)
+        request_finished.disconnect(finished, app)
+        request_started.disconnect(started, app)
+
+    assert not overruns, "\n\n".join(overruns)
+
+
+@pytest.fixture
+def query_budget():
+    """
+    with query_budget(5):
+        client.get(...)
+
+    fails when the block runs more than 5 SQL statements
+    """
+    @contextmanager
+    def budget(limit):
+        with count_queries(database.engine) as statements:
+            yield statements
+        assert len(statements) <= limit, (
+            f"{len(statements)} queries, budget is {limit}:\n" + "\n\n".join(statements)
+        )
+
+    return budget
@@ -0,0 +1,101 @@
+"""
+Local SMTP stand-in: a threaded socket server speaking just enough SMTP
+(EHLO, AUTH PLAIN, MAIL, RCPT, DATA, NOOP, RSET, QUIT) for smtplib.
+No TLS: use it with starttls=False. `latency` delays every reply, like
+a network round trip would.
+"""
+import socket
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, text):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.wfile.write(text.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+            server.live.add(self.connection)
+
+        try:
+            self.reply("220 stub ESMTP")
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                verb = line.decode().strip().split(" ", 1)[0].upper()
+
+                if verb == "EHLO":
+                    self.reply("250-stub\r\n250-AUTH PLAIN\r\n250 8BITMIME")
+                elif verb == "AUTH":
+                    with server.lock:
+                        server.logins += 1
+                    self.reply("235 2.7.0 Authentication successful")
+                elif verb == "NOOP":
+                    with server.lock:
+                        server.noops += 1
+                    self.reply("250 OK")
+                elif verb in ("HELO", "MAIL", "RCPT", "RSET"):
+                    self.reply("250 OK")
+                elif verb == "DATA":
+                    self.reply("354 End data with <CR><LF>.<CR><LF>")
+                    body = []
+                    for data in self.rfile:
+                        if data == b".\r\n":
+                            break
+                        body.append(data)
+                    with server.lock:
+                        server.messages.append(b"".join(body))
+                    self.reply("250 OK queued")
+                elif verb == "QUIT":
+                    self.reply("221 Bye")
+                    return
+                else:
+                    self.reply("502 Command not implemented")
+        except OSError:
+            return
+        finally:
+            with server.lock:
+                server.live.discard(self.connection)
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency=0.0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.live = set()
+        self.connections = 0
+        self.logins = 0
+        self.noops = 0
+        self.messages = []
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def drop_connections(self):
+        """ the server hangs up on every open session """
+        with self.lock:
+            for sock in list(self.live):
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def stop(self):
+        self.drop_connections()
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,36 @@
+import uuid
+
+from app.models import AuditLog, Trainer
+from app import database
+from app.audit import log_action
+
+
+def _logs(entity):
+    return database.db_session.query(AuditLog).filter_by(entity=entity).all()
+
+
+def test_log_action_joins_the_transaction(client):
+    session = database.db_session
+    entity = f"audit_{uuid.uuid4().hex[:8]}"
+
+    log_action("update", entity, 1)
+    session.rollback()
+    assert _logs(entity) == []
+
+    log_action("update", entity, 2, user_id=7)
+    session.commit()
+    assert [(log.entity_id, log.user_id) for log in _logs(entity)] == [(2, 7)]
+
+
+def test_admin_mutation_logs_in_same_commit(admin_client):
+    session = database.db_session
+    trainer = Trainer(name="Audit Trainer", gym_id=1)
+    session.add(trainer)
+    session.commit()
+
+    admin_client.post(f"/admin/trainers/{trainer.id}/delete")
+
+    session.expire_all()
+    logs = session.query(AuditLog).filter_by(entity="trainer", entity_id=trainer.id).all()
+    assert [log.action for log in logs] == ["deactivate"]
+    assert logs[0].user_id is not None
@@ -0,0 +1,130 @@
+from datetime import date, datetime
+
+import pytest
+
+from app.models import Trainer, Service, FitnessCenter, TrainerAvailability
+from app import database
+from app.availability import free_slots, free_starts, interval_masks, rebuild, slot_time, FULL_DAY
+from app.utils import create_reservation, update_reservation, cancel_reservation
+
+
+DAY = date(2037, 6, 1)
+
+
+def test_bitmap_arithmetic():
+    # 10:00-11:30 on a 07:00 opening = slots 12..17
+    masks = interval_masks(datetime(2037, 6, 1, 10, 0), datetime(2037, 6, 1, 11, 30))
+    assert masks == {DAY: 0b111111 << 12}
+
+    starts = free_starts(masks[DAY], 4)   # 60 minutes
+    assert not starts & (1 << 9)           # 09:15 would run into 10:00
+    assert starts & (1 << 8)               # 09:00-10:00 fits
+    assert starts & (1 << 18)              # 11:30
+    assert slot_time(18) == "11:30"
+    assert free_starts(FULL_DAY, 1) == 0
+
+
+@pytest.fixture
+def gym(client, monkeypatch, make_user):
+    from app import utils
+
+    for name in ("send_booking_confirmation_email", "send_booking_updated_email", "send_booking_canceled_email"):
+        monkeypatch.setattr(utils, name, lambda *args, **kwargs: None)
+
+    session = database.db_session
+    center = FitnessCenter(name="Slots Gym", address="-", contacts="-")
+    session.add(center)
+    session.commit()
+
+    service = Service(name="Slots", duration=60, price=10, description="x", fitness_center_id=center.id)
+    trainers = [Trainer(name=f"Slots Trainer {i}", gym_id=center.id) for i in range(2)]
+    user = make_user("av", funds=1000)
+    session.add_all([service, *trainers])
+    session.commit()
+    return user.id, service.id, [t.id for t in trainers]
+
+
+def _times(result, trainer_id, day=0):
+    return next(t["times"] for t in result["days"][day]["trainers"] if t["id"] == trainer_id)
+
+
+def test_bitmaps_follow_book_move_cancel(gym):
+    user_id, service_id, (first, second) = gym
+    service = database.db_session.get(Service, service_id)
+    now = datetime(2037, 5, 1)
+
+    r = create_reservation(user_id, service_id, first, DAY.isoformat(), "10:00")
+    result = free_slots(service, day_from=DAY, days=1, now=now)
+    assert "10:00" not in _times(result, first)
+    assert "09:15" not in _times(result, first)
+    assert "09:00" in _times(result, first)
+    assert "10:00" in _times(result, second)
+
+    update_reservation(r.id, user_id, DAY.isoformat(), "10:30")
+    result = free_slots(service, day_from=DAY, days=1, now=now)
+    assert "09:00" in _times(result, first) and "09:30" in _times(result, first)
+    assert "10:00" not in _times(result, first) and "11:30" in _times(result, first)
+
+    cancel_reservation(r.id, user_id)
+    result = free_slots(service, day_from=DAY, days=1, now=now)
+    assert _times(result, first) == _times(result, second)
+
+    # the incremental bitmaps agree with a rebuild from reservations
+    session = database.db_session
+    before = {
+        (row.trainer_id, row.day): row.busy
+        for row in session.query(TrainerAvailability).filter(TrainerAvailability.busy != 0)
+    }
+    rebuild(day_from=date(2037, 1, 1), days=365)
+    after = {(row.trainer_id, row.day): row.busy for row in session.query(TrainerAvailability)}
+    assert {k: v for k, v in before.items() if k[1].year == 2037} == {k: v for k, v in after.items() if k[1].year == 2037}
+
+
+def test_availability_endpoint(gym, admin_client):
+    _user_id, service_id, (first, _second) = gym
+    resp = admin_client.get(f"/services/{service_id}/availability?date={DAY}&days=2&trainer_id={first}")
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert [d["date"] for d in data["days"]] == ["2037-06-01", "2037-06-02"]
+    assert _times(data, first)[:2] == ["07:00", "07:15"]
+    assert _times(data, first)[-1] == "21:00"
+
+    assert admin_client.get(f"/services/{service_id}/availability?days=x").status_code == 400
+
+
+def _busy(trainer_id, day=DAY):
+    row = database.db_session.get(TrainerAvailability, (trainer_id, day))
+    return row.busy if row else 0
+
+
+def test_release_keeps_a_slot_shared_with_the_next_session(gym):
+    user_id, _service_id, (first, _second) = gym
+    session = database.db_session
+    service = Service(name="Off grid", duration=50, price=10, description="x")
+    session.add(service)
+    session.commit()
+
+    a = create_reservation(user_id, service.id, first, DAY.isoformat(), "10:00")   # 10:00-10:50
+    create_reservation(user_id, service.id, first, DAY.isoformat(), "10:50")       # 10:50-11:40
+    cancel_reservation(a.id, user_id)
+
+    # 10:45 is still B's
+    session.expire_all()
+    assert _busy(first) == interval_masks(datetime(2037, 6, 1, 10, 50), datetime(2037, 6, 1, 11, 40))[DAY]
+    assert _busy(first) & (1 << 15)
+
+
+def test_release_without_loaded_history(gym):
+    user_id, service_id, (first, _second) = gym
+    session = database.db_session
+
+    r = create_reservation(user_id, service_id, first, DAY.isoformat(), "10:00")
+    assert _busy(first)
+
+    # status set on an expired instance: the old value was never loaded
+    session.expire(r)
+    r.status = "canceled"
+    session.commit()
+
+    session.expire_all()
+    assert _busy(first) == 0
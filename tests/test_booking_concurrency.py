@@ -0,0 +1,113 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import func
+
+from app.models import User, Trainer, Service, Reservation, Transaction
+from app import database
+from app.conflicts import SlotConflict
+from app.utils import create_reservation, InsufficientFunds
+
+
+PRICE = 10
+WORKERS = 16
+
+
+@pytest.fixture
+def setup(client, monkeypatch):
+    from app import utils
+
+    emails = []
+    monkeypatch.setattr(utils, "send_booking_confirmation_email", lambda *args: emails.append(args))
+
+    session = database.db_session
+    trainers = [Trainer(name=f"Stress Trainer {i}", gym_id=1) for i in range(4)]
+    service = Service(name="Stress", duration=60, price=PRICE, description="x")
+    session.add_all([service, *trainers])
+    session.commit()
+    ids = service.id, [t.id for t in trainers]
+    database.db_session.remove()
+    return ids, emails
+
+
+def _run(attempts):
+    def book(args):
+        try:
+            r = create_reservation(*args)
+            return ("ok", r.id)
+        except InsufficientFunds:
+            return ("funds", None)
+        except SlotConflict:
+            return ("conflict", None)
+        finally:
+            database.db_session.remove()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(WORKERS) as pool:
+        results = list(pool.map(book, attempts))
+    elapsed = time.perf_counter() - started
+    print(f"\n{len(attempts)} bookings in {elapsed:.2f} s ({len(attempts) / elapsed:.0f}/s)")
+    return results
+
+
+def test_parallel_bookings_keep_balance_and_slots(setup, make_user):
+    (service_id, trainer_ids), emails = setup
+    user_id = make_user("bk", funds=30 * PRICE).id
+    database.db_session.remove()
+
+    # 100 distinct slots, each submitted twice with the same key (double-click / retry)
+    day = date(2038, 1, 1)
+    slots = [
+        (trainer_ids[i % 4], (day + timedelta(days=i // 4)).isoformat(), "10:00", f"key-{i}")
+        for i in range(100)
+    ]
+    attempts = [
+        (user_id, service_id, trainer_id, d, t, key)
+        for trainer_id, d, t, key in slots
+        for _ in range(2)
+    ]
+
+    results = _run(attempts)
+
+    session = database.db_session
+    user = session.get(User, user_id)
+    booked = session.query(Reservation).filter_by(user_id=user_id).all()
+    charged = session.query(func.count(Transaction.id)).filter_by(user_id=user_id, type="payment").scalar()
+
+    violations = []
+    if user.funds < 0:
+        violations.append(f"negative balance {user.funds}")
+    if len(booked) != 30:
+        violations.append(f"{len(booked)} reservations for a 30-booking balance")
+    if charged != len(booked):
+        violations.append(f"{charged} payments for {len(booked)} reservations")
+    if user.funds != 30 * PRICE - PRICE * len(booked):
+        violations.append(f"balance {user.funds} doesn't match {len(booked)} bookings")
+    if len({r.idempotency_key for r in booked}) != len(booked):
+        violations.append("duplicate booking for one idempotency key")
+    if len(emails) != len(booked):
+        violations.append(f"{len(emails)} emails for {len(booked)} bookings")
+
+    print(f"outcomes: { {k: [r[0] for r in results].count(k) for k in ('ok', 'funds', 'conflict')} }")
+    assert violations == []
+
+
+def test_parallel_bookings_of_one_slot(setup, make_user):
+    (service_id, trainer_ids), _emails = setup
+    users = [make_user("bk", funds=PRICE).id for _ in range(50)]
+    database.db_session.remove()
+
+    attempts = [(u, service_id, trainer_ids[0], "2038-06-01", "18:00", None) for u in users]
+    results = [outcome for outcome, _ in _run(attempts)]
+
+    assert results.count("ok") == 1
+    assert results.count("conflict") == 49
+
+    session = database.db_session
+    assert session.query(Reservation).filter(
+        Reservation.trainer_id == trainer_ids[0], Reservation.date == "2038-06-01"
+    ).count() == 1
+    # losers were not charged
+    assert session.query(func.sum(User.funds)).filter(User.id.in_(users)).scalar() == 49 * PRICE
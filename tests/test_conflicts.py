@@ -0,0 +1,107 @@
+import threading
+
+import pytest
+
+from app.models import Trainer, Service, Reservation
+from app import database
+from app.conflicts import SlotConflict
+from app.utils import create_reservation, update_reservation
+
+
+@pytest.fixture
+def booking(client, monkeypatch, make_user):
+    from app import utils
+
+    for name in ("send_booking_confirmation_email", "send_booking_updated_email"):
+        monkeypatch.setattr(utils, name, lambda *args, **kwargs: None)
+
+    session = database.db_session
+    user = make_user("cf", funds=1000)
+    trainer = Trainer(name="Conflict Trainer", gym_id=1)
+    long_service = Service(name="Long", duration=90, price=10, description="x")
+    short_service = Service(name="Short", duration=30, price=10, description="x")
+    session.add_all([trainer, long_service, short_service])
+    session.commit()
+    return user.id, trainer.id, long_service.id, short_service.id
+
+
+def test_overlapping_intervals_conflict(booking):
+    user_id, trainer_id, long_id, short_id = booking
+
+    first = create_reservation(user_id, long_id, trainer_id, "2036-03-01", "10:00")   # 10:00-11:30
+
+    with pytest.raises(SlotConflict):
+        create_reservation(user_id, short_id, trainer_id, "2036-03-01", "11:00")      # inside
+    with pytest.raises(SlotConflict):
+        create_reservation(user_id, long_id, trainer_id, "2036-03-01", "09:00")       # 09:00-10:30
+
+    # touching intervals are fine
+    create_reservation(user_id, short_id, trainer_id, "2036-03-01", "11:30")
+    create_reservation(user_id, short_id, trainer_id, "2036-03-01", "09:30")
+
+    # a canceled session frees its slot
+    first.status = "canceled"
+    database.db_session.commit()
+    create_reservation(user_id, short_id, trainer_id, "2036-03-01", "10:30")
+
+    count = database.db_session.query(Reservation).filter_by(trainer_id=trainer_id, status="active").count()
+    assert count == 3
+
+
+def test_reschedule_into_overlap_is_rolled_back(booking):
+    user_id, trainer_id, long_id, short_id = booking
+
+    create_reservation(user_id, long_id, trainer_id, "2036-04-01", "10:00")
+    other = create_reservation(user_id, short_id, trainer_id, "2036-04-01", "14:00")
+
+    with pytest.raises(SlotConflict):
+        update_reservation(other.id, user_id, "2036-04-01", "11:00")
+    with pytest.raises(ValueError):
+        update_reservation(other.id, user_id, "2036-04-01", "25:99")
+
+    database.db_session.expire_all()
+    assert database.db_session.get(Reservation, other.id).time == "14:00"
+
+
+def test_concurrent_bookings_only_one_wins(booking):
+    user_id, trainer_id, long_id, _short_id = booking
+    database.db_session.remove()
+
+    barrier = threading.Barrier(4)
+    results = []
+
+    def book(minute):
+        barrier.wait()
+        try:
+            create_reservation(user_id, long_id, trainer_id, "2036-05-01", f"10:{minute:02d}")
+            results.append("ok")
+        except SlotConflict:
+            results.append("conflict")
+        finally:
+            database.db_session.remove()
+
+    threads = [threading.Thread(target=book, args=(m,)) for m in (0, 10, 20, 30)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(results) == ["conflict", "conflict", "conflict", "ok"]
+
+
+def test_restore_into_a_rebooked_slot_is_refused(booking, admin_client):
+    user_id, trainer_id, long_id, short_id = booking
+
+    first = create_reservation(user_id, long_id, trainer_id, "2036-06-01", "10:00")
+    first.status = "canceled"
+    database.db_session.commit()
+    create_reservation(user_id, short_id, trainer_id, "2036-06-01", "10:30")
+    first_id = first.id
+    database.db_session.remove()
+
+    res = admin_client.post(f"/admin/reservations/{first_id}/restore")
+    assert res.status_code == 302
+
+    assert database.db_session.get(Reservation, first_id).status == "canceled"
+    database.db_session.remove()
+    assert b"overlapping" in admin_client.get(f"/admin/reservations/{first_id}").data
@@ -0,0 +1,162 @@
+import json
+import smtplib
+import socket
+
+import pytest
+
+from app import database, dead_letters, tasks
+from app.models import DeadLetter, OutboxMessage
+
+
+@pytest.fixture
+def session(client, monkeypatch):
+    session = database.db_session
+    session.query(DeadLetter).delete()
+    session.query(OutboxMessage).delete()
+    session.commit()
+    yield session
+    session.rollback()
+    database.db_session.remove()
+
+
+class FailingPool:
+    def __init__(self, error):
+        self.error = error
+
+    def send(self, sender, recipient, message):
+        raise self.error
+
+
+@pytest.mark.parametrize("error, transient", [
+    (smtplib.SMTPResponseException(421, b"try again later"), True),
+    (smtplib.SMTPServerDisconnected("gone"), True),
+    (socket.timeout("timed out"), True),
+    (smtplib.SMTPRecipientsRefused({"a@a.com": (450, b"mailbox busy")}), True),
+    (smtplib.SMTPResponseException(550, b"no such user"), False),
+    (smtplib.SMTPRecipientsRefused({"a@a.com": (550, b"no such user")}), False),
+    (smtplib.SMTPAuthenticationError(535, b"bad credentials"), False),
+])
+def test_send_email_tells_transient_from_permanent(monkeypatch, error, transient):
+    monkeypatch.setattr(tasks, "PASSWORD", "secret")
+    monkeypatch.setattr(tasks, "smtp_pool", lambda: FailingPool(error))
+
+    expected = tasks.TransientEmailError if transient else type(error)
+    with pytest.raises(expected):
+        tasks.send_email("a@a.com", "Hi", "<p>hi</p>")
+
+
+def test_transient_failure_retries_then_dead_letters(session, monkeypatch):
+    attempts = []
+
+    def throttled(*args):
+        attempts.append(args[0])
+        raise tasks.TransientEmailError("421 4.7.0 try again later")
+
+    monkeypatch.setattr(tasks, "send_email", throttled)
+    monkeypatch.setattr(tasks.send_welcome_email_task, "max_retries", 3)
+    before = dead_letters.metrics(session)
+
+    # eager: the retries run back to back instead of after their countdown
+    tasks.send_welcome_email_task.apply(args=("kate@a.com", "kate", "http://x/login"))
+
+    assert attempts == ["kate@a.com"] * 4
+    [letter] = dead_letters.waiting(session)
+    assert letter.task == tasks.send_welcome_email_task.name
+    assert json.loads(letter.args) == ["kate@a.com", "kate", "http://x/login"]
+    assert letter.retries == 3
+    assert "try again later" in letter.error
+
+    after = dead_letters.metrics(session)
+    assert after["retries"] - before["retries"] == 3
+    assert after["dead_letters"] - before["dead_letters"] == 1
+    assert after["depth"] == 1
+
+
+def test_permanent_failure_is_not_retried(session, monkeypatch):
+    attempts = []
+
+    def rejected(*args):
+        attempts.append(args[0])
+        raise smtplib.SMTPResponseException(550, b"no such user")
+
+    monkeypatch.setattr(tasks, "send_email", rejected)
+    tasks.send_booking_canceled_email_task.apply(args=("bob@a.com", "bob"))
+
+    assert attempts == ["bob@a.com"]
+    [letter] = dead_letters.waiting(session)
+    assert letter.retries == 0
+
+
+def test_permanent_digest_failure_keeps_its_events(session, monkeypatch):
+    from app import digest
+
+    events = [{"username": "bob", "kind": "canceled", "reservation_id": 5}]
+
+    def rejected(recipient, events):
+        raise smtplib.SMTPResponseException(550, b"no such user")
+
+    monkeypatch.setattr(digest, "collect", lambda recipient: list(events))
+    monkeypatch.setattr(digest, "deliver", rejected)
+    tasks.send_digest_task.apply(args=("bob@a.com",))
+
+    # collected events left the buffer: the letter carries them
+    [letter] = dead_letters.waiting(session)
+    assert json.loads(letter.args) == ["bob@a.com"]
+    assert json.loads(letter.kwargs) == {"events": events}
+
+
+def test_notification_tasks_are_fire_and_forget():
+    for task in (tasks.send_welcome_email_task, tasks.send_digest_task, tasks.send_reminders_task):
+        assert task.ignore_result
+        assert task.rate_limit
+        assert task.max_retries == tasks.EMAIL_MAX_RETRIES
+
+    backoff = tasks.send_welcome_email_task
+    assert backoff.retry_backoff == tasks.EMAIL_RETRY_BACKOFF and backoff.retry_jitter
+
+
+def test_reminder_chunk_retries_only_what_failed(session, monkeypatch):
+    sent, calls = [], []
+
+    def flaky(recipient, subject, html):
+        calls.append(recipient)
+        if recipient.startswith("busy"):
+            raise tasks.TransientEmailError("452 too many recipients")
+        if recipient.startswith("gone"):
+            raise smtplib.SMTPResponseException(550, b"no such user")
+        sent.append(recipient)
+
+    monkeypatch.setattr(tasks, "send_email", flaky)
+    monkeypatch.setattr(tasks.send_reminders_task, "max_retries", 2)
+
+    reminder = {"username": "x", "service_name": "Yoga", "trainer_name": "Ann", "date": "2042-01-01", "time": "10:00"}
+    chunk = [{**reminder, "recipient": r} for r in ("ok@a.com", "busy@a.com", "gone@a.com")]
+    tasks.send_reminders_task.apply(args=(chunk,))
+
+    # the good address is never sent twice, the busy one is tried 1 + 2 times
+    assert sent == ["ok@a.com"]
+    assert calls.count("busy@a.com") == 3
+    assert calls.count("gone@a.com") == 1
+
+    letters = {json.loads(l.args)[0][0]["recipient"]: l for l in dead_letters.waiting(session)}
+    assert set(letters) == {"busy@a.com", "gone@a.com"}
+    assert letters["busy@a.com"].retries == 2
+    assert letters["gone@a.com"].retries == 0
+
+
+def test_replay_republishes_through_the_outbox(session):
+    dead_letters.record(tasks.send_welcome_email_task.name, ("kate@a.com", "kate", "u"), {}, RuntimeError("x"))
+    dead_letters.record(tasks.send_digest_task.name, ("bob@a.com",), {"events": []}, RuntimeError("y"))
+    dead_letters.record(tasks.send_digest_task.name, ("ann@a.com",), {"events": []}, RuntimeError("z"))
+
+    assert dead_letters.replay(session, task=tasks.send_welcome_email_task.name) == 1
+    [message] = session.query(OutboxMessage).all()
+    assert json.loads(message.args) == ["kate@a.com", "kate", "u"]
+    assert dead_letters.depth(session) == 2
+
+    # the command line replays the rest
+    assert dead_letters.main(["replay", "--all"]) == 0
+    assert dead_letters.depth(session) == 0
+    digests = session.query(OutboxMessage).filter_by(task=tasks.send_digest_task.name).all()
+    assert sorted(json.loads(m.args)[0] for m in digests) == ["ann@a.com", "bob@a.com"]
+    assert all(json.loads(m.kwargs) == {"events": []} for m in digests)
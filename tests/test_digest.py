@@ -0,0 +1,153 @@
+import json
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import database, digest, tasks
+from app.models import PendingNotification, NotificationDigest, OutboxMessage
+
+
+def _event(kind, reservation_id=None, **details):
+    return {"username": "kate", "kind": kind, "reservation_id": reservation_id, **details}
+
+
+def test_coalesce_collapses_superseded_changes():
+    booked = _event("booked", 1, service_name="Yoga", trainer_name="Ann", date="2040-01-01", time="10:00")
+
+    assert digest.coalesce([
+        booked,
+        _event("updated", 1, date="2040-01-02", time="11:00"),
+        _event("updated", 1, date="2040-01-03", time="12:00"),
+        _event("canceled", 1, date="2040-01-03", time="12:00"),
+    ]) == []
+
+    assert digest.coalesce([booked, _event("updated", 1, date="2040-01-02", time="11:00")]) == [
+        {**booked, "date": "2040-01-02", "time": "11:00"},
+    ]
+
+    series = _event("series", dates=["2040-01-01", "2040-01-08"], time="09:00", service_name="Yoga", trainer_name="Ann")
+    result = digest.coalesce([
+        _event("updated", 2, date="2040-01-05", time="08:00"),
+        series,
+        _event("updated", 2, date="2040-01-06", time="09:00"),
+        _event("canceled", 3),
+    ])
+    assert [(e["kind"], e.get("date")) for e in result] == [("updated", "2040-01-06"), ("series", None), ("canceled", None)]
+
+
+def _scheduled(*recipients):
+    """ digest tasks waiting in the outbox for these recipients, oldest first """
+    messages = (
+        database.db_session.query(OutboxMessage)
+        .filter_by(task=tasks.send_digest_task.name)
+        .order_by(OutboxMessage.id)
+    )
+    return [
+        (tuple(json.loads(m.args)), round((m.eta - m.created_at).total_seconds()))
+        for m in messages
+        if json.loads(m.args)[0] in recipients
+    ]
+
+
+@pytest.fixture
+def buffered(client, monkeypatch):
+    monkeypatch.setattr(digest, "WINDOW", 60)
+
+    sent = []
+    monkeypatch.setattr(tasks, "send_email", lambda recipient, subject, html: sent.append((recipient, subject, html)))
+    yield sent
+    database.db_session.rollback()
+
+
+def test_a_window_of_changes_is_one_message(buffered):
+    sent = buffered
+    kate, bob = f"kate_{uuid.uuid4().hex[:6]}@a.com", f"bob_{uuid.uuid4().hex[:6]}@a.com"
+
+    # the public aliases buffer instead of queueing one task per email
+    tasks.send_booking_confirmation_email(kate, "kate", "Yoga", "Ann", "2040-01-01", "10:00", 11)
+    tasks.send_booking_updated_email(kate, "kate", "2040-01-02", "11:00", 11)
+    tasks.send_booking_confirmation_email(kate, "kate", "Boxing", "Max", "2040-01-04", "18:00", 12)
+    tasks.send_booking_updated_email(kate, "kate", "2040-01-05", "18:00", 12)
+    tasks.send_booking_canceled_email(kate, "kate", 12, "2040-01-05", "18:00")
+    tasks.send_booking_updated_email(kate, "kate", "2040-01-09", "07:00", 13)
+    tasks.send_booking_updated_email(bob, "bob", "2040-01-03", "09:00", 14)
+    database.db_session.commit()
+
+    assert _scheduled(kate, bob) == [((kate,), 60), ((bob,), 60)]
+
+    assert tasks.send_digest_task(kate) == 1
+    [(recipient, subject, html)] = sent
+    assert (recipient, subject) == (kate, "Your bookings: 2 updates")
+    assert "Yoga" in html and "2040-01-02, 11:00" in html and "2040-01-09" in html
+    assert "Boxing" not in html
+
+    session = database.db_session
+    assert session.query(PendingNotification).filter_by(recipient=kate).count() == 0
+    assert session.get(NotificationDigest, kate) is None
+
+    # a new window opens with the next change
+    tasks.send_booking_updated_email(kate, "kate", "2040-01-10", "07:00", 13)
+    database.db_session.commit()
+    assert _scheduled(kate) == [((kate,), 60), ((kate,), 60)]
+
+
+def test_lone_event_keeps_its_email(buffered):
+    sent = buffered
+    bob = f"bob_{uuid.uuid4().hex[:6]}@a.com"
+
+    tasks.send_booking_updated_email(bob, "bob", "2040-01-03", "09:00", 21)
+    tasks.send_booking_updated_email(bob, "bob", "2040-01-04", "10:00", 21)
+    database.db_session.commit()
+    tasks.send_digest_task(bob)
+
+    [(recipient, subject, html)] = sent
+    assert subject == "Booking Updated"
+    assert "2040-01-04" in html and "2040-01-03" not in html
+
+
+def test_lost_digest_is_flushed(buffered, monkeypatch):
+    sent = buffered
+    ann = f"ann_{uuid.uuid4().hex[:6]}@a.com"
+    tasks.send_booking_canceled_email(ann, "ann", 31)
+    database.db_session.commit()
+
+    # each overdue digest is its own task; run them here
+    monkeypatch.setattr(tasks.send_digest_task, "delay", lambda recipient: tasks.send_digest_task(recipient))
+
+    # still within its window
+    tasks.flush_digests_task()
+    assert [r for r, _, _ in sent if r == ann] == []
+
+    # its task never ran
+    session = database.db_session
+    session.query(NotificationDigest).filter_by(recipient=ann).update(
+        {"due_at": datetime.utcnow() - timedelta(hours=1)}
+    )
+    session.commit()
+    tasks.flush_digests_task()
+
+    assert [(r, s) for r, s, _ in sent if r == ann] == [(ann, "Booking Canceled")]
+
+
+def test_buffered_emails_without_a_window_are_flushed(buffered, monkeypatch):
+    sent = buffered
+    eve = f"eve_{uuid.uuid4().hex[:6]}@a.com"
+    tasks.send_booking_canceled_email(eve, "eve", 41)
+    database.db_session.commit()
+    monkeypatch.setattr(tasks.send_digest_task, "delay", lambda recipient: tasks.send_digest_task(recipient))
+
+    # the window ended before this email was committed: nothing points at it
+    session = database.db_session
+    session.query(NotificationDigest).filter_by(recipient=eve).delete()
+    session.commit()
+    tasks.flush_digests_task()
+    assert [r for r, _, _ in sent if r == eve] == []
+
+    session.query(PendingNotification).filter_by(recipient=eve).update(
+        {"created_at": datetime.utcnow() - timedelta(hours=1)}
+    )
+    session.commit()
+    tasks.flush_digests_task()
+
+    assert [(r, s) for r, s, _ in sent if r == eve] == [(eve, "Booking Canceled")]
@@ -0,0 +1,111 @@
+import json
+import uuid
+
+import pytest
+from openpyxl import load_workbook
+
+from app.models import Reservation, Trainer, Service
+from app import database
+from app.exports import reservation_export_rows, iter_csv, iter_ndjson, xlsx_file
+from app.utils import set_reservation_slot
+
+
+def _unique_year():
+    """ test.db persists between runs: a year no earlier run booked into """
+    return 2100 + uuid.uuid4().int % 7000
+
+
+def _seed(make_user, year):
+    session = database.db_session
+
+    user = make_user("exp", email="e@a.com")
+    trainer = Trainer(name="Export Trainer", gym_id=1)
+    service = Service(name="Spinning", duration=45, price=10, description="x")
+    session.add_all([trainer, service])
+    session.commit()
+
+    for day, status in [("02", "active"), ("03", "active"), ("03", "canceled")]:
+        r = Reservation(user_id=user.id, trainer_id=trainer.id, service_id=service.id, status=status)
+        set_reservation_slot(r, f"{year}-03-{day}", "10:00", service)
+        session.add(r)
+    session.commit()
+    return user
+
+
+def test_export_filters_and_formats(client, make_user):
+    year = _unique_year()
+    user = _seed(make_user, year)
+
+    day = f"{year}-03-03"
+    rows = list(reservation_export_rows(status="upcoming", date_from=day, date_to=day, batch_size=1))
+    assert len(rows) == 1
+    assert rows[0][1:6] == [user.login, "e@a.com", "Export Trainer", "Spinning", f"{day} 10:00"]
+
+    csv_text = "".join(iter_csv(iter(rows)))
+    assert csv_text.splitlines()[0].startswith("ID,User login")
+    assert len(csv_text.splitlines()) == 2
+
+    record = json.loads("".join(iter_ndjson(iter(rows))))
+    assert record["Status"] == "active"
+
+    ws = load_workbook(xlsx_file(iter(rows))).active
+    assert ws.max_row == 2
+
+
+def test_background_export_reuses_artifact(client, monkeypatch, tmp_path, make_user):
+    from app import export_jobs
+    from app.tasks import run_export_job_task
+
+    monkeypatch.setattr(export_jobs, "EXPORT_DIR", str(tmp_path))
+    queued = []
+    monkeypatch.setattr(run_export_job_task, "delay", lambda job_id: queued.append(job_id))
+
+    year = _unique_year()
+    user = _seed(make_user, year)
+    params = {"date_from": f"{year}-03-01", "date_to": f"{year}-03-31"}
+
+    job = export_jobs.request_export("reservations", "csv", params)
+    export_jobs.run_export_job(job.id)
+    assert job.status == "done"
+    assert job.total == 3
+
+    again = export_jobs.request_export("reservations", "csv", params)
+    assert again.id == job.id
+    assert queued == [job.id]
+
+    user.email = "changed@a.com"
+    database.db_session.commit()
+
+    fresh = export_jobs.request_export("reservations", "csv", params)
+    assert fresh.id != job.id
+
+
+def test_version_stamp_moves_with_the_commit(client, monkeypatch):
+    from app import versions
+    from app.versions import version_stamp
+
+    session = database.db_session
+    before = version_stamp(session, ("trainer",))
+
+    # already moved when commit() returns
+    session.add(Trainer(name="Versioned", gym_id=1))
+    session.commit()
+    after = version_stamp(session, ("trainer",))
+    assert after != before
+
+    session.add(Trainer(name="Rolled back", gym_id=1))
+    session.flush()
+    session.rollback()
+    assert version_stamp(session, ("trainer",)) == after
+
+    # no data without its counter
+    def failing(connection, names):
+        raise RuntimeError("counter unavailable")
+
+    name = f"Unversioned {uuid.uuid4().hex[:8]}"
+    monkeypatch.setattr(versions, "bump", failing)
+    session.add(Trainer(name=name, gym_id=1))
+    with pytest.raises(RuntimeError):
+        session.commit()
+    session.rollback()
+    assert session.query(Trainer).filter_by(name=name).count() == 0
@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import User, Service, Transaction, BalanceSnapshot
+from app import database, ledger
+from app.ledger import InsufficientFunds
+from app.utils import charge_user, refund_user
+from tests.conftest import count_queries
+
+
+def test_entries_move_funds_once_per_key(client, make_user):
+    user_id = make_user("lg").id
+    session = database.db_session
+
+    assert ledger.post(user_id, 100, "topup", idempotency_key="pay-1") is not None
+    session.commit()
+    assert ledger.post(user_id, 100, "topup", idempotency_key="pay-1") is None
+    session.commit()
+
+    service = Service(name="Ledger", duration=60, price=30, description="x")
+    session.add(service)
+    session.commit()
+    user = session.get(User, user_id)
+
+    charge_user(user, service, quantity=3)
+    session.commit()
+    with pytest.raises(InsufficientFunds):
+        charge_user(user, service)
+    session.rollback()
+    refund_user(user, service)
+    session.commit()
+
+    assert session.get(User, user_id).funds == 100 - 90 + 30
+    assert [t.type for t in session.query(Transaction).filter_by(user_id=user_id).order_by(Transaction.id)] == [
+        "topup", "payment", "refund",
+    ]
+    assert ledger.balance(user_id) == 40
+    assert ledger.reconcile(user_ids=[user_id]) == {}
+
+
+def test_balance_is_snapshot_plus_tail(client, make_user):
+    user_id = make_user("lg").id
+    session = database.db_session
+    for amount in (50, -20, 5):
+        ledger.post(user_id, amount, "topup")
+    session.commit()
+
+    # everything is settled an hour later
+    assert ledger.take_snapshots(now=datetime.utcnow() + timedelta(hours=1)) >= 1
+    snapshot = session.get(BalanceSnapshot, user_id)
+    last_id = session.query(Transaction.id).filter_by(user_id=user_id).order_by(Transaction.id.desc()).limit(1).scalar()
+    assert (snapshot.balance, snapshot.last_transaction_id) == (35, last_id)
+
+    ledger.post(user_id, 7, "topup")
+    session.commit()
+    # entries younger than SNAPSHOT_LAG stay in the tail
+    ledger.take_snapshots()
+    assert session.get(BalanceSnapshot, user_id).balance == 35
+
+    with count_queries(database.engine) as statements:
+        assert ledger.balance(user_id) == 42
+    assert len(statements) == 1
+    assert session.get(User, user_id).funds == 42
+
+
+def test_reconcile_reports_and_adjusts_drift(client, make_user):
+    user_id = make_user("lg", funds=500).id   # balance written outside the ledger
+    clean_id = make_user("lg").id
+    ledger.post(clean_id, 10, "topup")
+    database.db_session.commit()
+
+    assert ledger.reconcile(user_ids=[user_id, clean_id]) == {user_id: (500, 0)}
+    ledger.reconcile(user_ids=[user_id, clean_id], fix=True)
+
+    assert ledger.reconcile(user_ids=[user_id, clean_id]) == {}
+    adjustment = database.db_session.query(Transaction).filter_by(user_id=user_id).one()
+    assert (adjustment.type, adjustment.amount) == ("adjustment", 500)
+
+
+def test_resubmitted_top_up_is_credited_once(admin_client):
+    session = database.db_session
+    admin = session.query(User).filter_by(is_admin=True).order_by(User.id.desc()).first()
+    before = admin.funds or 0
+
+    for _ in range(2):
+        admin_client.post("/profile/payment/process", data={"amount": "25", "idempotency_key": "form-1"})
+
+    session.expire_all()
+    assert session.get(User, admin.id).funds == before + 25
+    assert session.query(Transaction).filter_by(user_id=admin.id, type="topup").count() == 1
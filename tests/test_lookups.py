@@ -0,0 +1,46 @@
+import uuid
+
+from app.models import Trainer
+from app import database
+from app.lookups import lookup_trainers, lookup_users, clear_cache
+
+
+def test_trainer_lookup_prefix_and_cursor(client):
+    session = database.db_session
+    prefix = f"lk{uuid.uuid4().hex[:6]}"
+
+    session.add_all([Trainer(name=f"{prefix} Trainer {i}", gym_id=1) for i in range(5)])
+    session.add(Trainer(name=f"x{prefix} Other", gym_id=1))
+    session.commit()
+    clear_cache()
+
+    first = lookup_trainers(prefix.upper(), limit=3)
+    assert [r["label"] for r in first["results"]] == [f"{prefix} Trainer {i}" for i in range(3)]
+    assert first["next_cursor"]
+
+    second = lookup_trainers(prefix, cursor=first["next_cursor"], limit=3)
+    assert [r["label"] for r in second["results"]] == [f"{prefix} Trainer {i}" for i in range(3, 5)]
+    assert second["next_cursor"] is None
+
+    # cached for the TTL: a new row does not show up until the cache is cleared
+    session.add(Trainer(name=f"{prefix} Trainer 9", gym_id=1))
+    session.commit()
+    assert lookup_trainers(prefix, cursor=first["next_cursor"], limit=3) == second
+
+    clear_cache()
+    third = lookup_trainers(prefix, cursor=first["next_cursor"], limit=3)
+    assert len(third["results"]) == 3
+
+
+def test_lookup_endpoint(admin_client):
+    clear_cache()
+    resp = admin_client.get("/admin/lookup/users?q=ADMIN_&limit=5")
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["results"]
+    assert all(r["label"].startswith("admin_") for r in data["results"])
+
+    by_email = lookup_users(data["results"][0]["label"] + "@")
+    assert [r["id"] for r in by_email["results"]] == [data["results"][0]["id"]]
+
+    assert admin_client.get("/admin/lookup/gyms?q=a").status_code == 404
@@ -0,0 +1,84 @@
+import threading
+
+from app.models import Trainer, Service, Reservation
+from app import database
+from app.notifications import Dispatcher, FakeSink
+from app.utils import set_reservation_slot
+
+
+def _event(i):
+    return {"action": "canceled", "reservation_id": i}
+
+
+def test_dispatcher_batches_and_keeps_order():
+    sink = FakeSink()
+    dispatcher = Dispatcher([sink], maxsize=100, batch_size=10, batch_wait=0.05)
+
+    for i in range(25):
+        assert dispatcher.submit(_event(i))
+    assert dispatcher.flush()
+    dispatcher.stop()
+
+    assert [e["reservation_id"] for e in sink.events] == list(range(25))
+    assert max(len(batch) for batch in sink.batches) <= 10
+    assert len(sink.batches) < 25
+
+
+def test_full_queue_drops_instead_of_blocking():
+    release = threading.Event()
+
+    class BlockedSink(FakeSink):
+        def send(self, events):
+            release.wait(2)
+            super().send(events)
+
+    sink = BlockedSink()
+    dispatcher = Dispatcher([sink], maxsize=3, batch_size=1, batch_wait=0)
+
+    results = [dispatcher.submit(_event(i)) for i in range(10)]
+    assert results.count(False) >= 6
+    assert dispatcher.stats["dropped"] == results.count(False)
+
+    release.set()
+    assert dispatcher.flush()
+    dispatcher.stop()
+
+
+def test_failing_sink_does_not_stop_others():
+    class BrokenSink:
+        name = "broken"
+
+        def send(self, events):
+            raise RuntimeError("down")
+
+    sink = FakeSink()
+    dispatcher = Dispatcher([BrokenSink(), sink], batch_wait=0)
+    dispatcher.submit(_event(1))
+    assert dispatcher.flush()
+    dispatcher.stop()
+
+    assert len(sink.events) == 1
+    assert dispatcher.stats["failed"] == 1
+
+
+def test_admin_cancel_submits_event(admin_client, notifications, make_user):
+    session = database.db_session
+    user = make_user("nt")
+    email = user.email
+    trainer = Trainer(name="Notify Trainer", gym_id=1)
+    service = Service(name="Notify", duration=60, price=10, description="x")
+    session.add_all([trainer, service])
+    session.commit()
+
+    r = Reservation(user_id=user.id, trainer_id=trainer.id, service_id=service.id)
+    set_reservation_slot(r, "2035-01-01", "10:00", service)
+    session.add(r)
+    session.commit()
+
+    admin_client.post(f"/admin/reservations/{r.id}/cancel")
+
+    from app.notifications import get_dispatcher
+    assert get_dispatcher().flush()
+    assert [(e["action"], e["reservation_id"], e["email"]) for e in notifications.events] == [
+        ("canceled", r.id, email)
+    ]
@@ -0,0 +1,132 @@
+import json
+import uuid
+
+import pytest
+
+from app import database, outbox, tasks
+from app.models import OutboxMessage
+
+
+class FakeCelery:
+    """ records send_task calls; fails on the message numbered fail_at """
+
+    def __init__(self, fail_at=None):
+        self.sent = []
+        self.fail_at = fail_at
+        self.connections = 0
+
+    def producer_or_acquire(self):
+        fake = self
+
+        class Producer:
+            def __enter__(self):
+                fake.connections += 1
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+        return Producer()
+
+    def send_task(self, name, args, kwargs, eta, producer):
+        if len(self.sent) == self.fail_at:
+            raise ConnectionError("broker went away")
+        self.sent.append((name, args, kwargs, eta))
+
+
+@pytest.fixture
+def session(client):
+    session = database.db_session
+    # messages from earlier tests shouldn't reach this test's relay
+    session.query(OutboxMessage).delete()
+    session.commit()
+    yield session
+    session.rollback()
+    database.db_session.remove()
+
+
+def test_message_rolls_back_with_the_business_transaction(session):
+    recipient = f"kate_{uuid.uuid4().hex[:6]}@a.com"
+
+    tasks.send_welcome_email(recipient, "kate", "http://x/login")
+    session.rollback()
+    assert outbox.pending(session) == 0
+
+    tasks.send_welcome_email(recipient, "kate", "http://x/login")
+    session.commit()
+    [message] = session.query(OutboxMessage).all()
+    assert message.task == tasks.send_welcome_email_task.name
+    assert json.loads(message.args) == [recipient, "kate", "http://x/login"]
+    assert message.sent_at is None
+
+
+def test_relay_publishes_in_order_over_one_connection(session):
+    for i in range(5):
+        outbox.publish(tasks.promote_waitlist_task, (i, "2040-01-01T10:00:00"), session=session)
+    outbox.publish("app.tasks.send_digest_task", ("a@a.com",), countdown=60, session=session)
+    session.commit()
+
+    celery = FakeCelery()
+    assert outbox.relay_once(session, batch_size=4, celery=celery) == 4
+    assert outbox.relay_once(session, batch_size=4, celery=celery) == 2
+    assert outbox.relay_once(session, batch_size=4, celery=celery) == 0
+
+    assert [args[0] for _, args, _, _ in celery.sent[:5]] == [0, 1, 2, 3, 4]
+    name, args, _, eta = celery.sent[5]
+    assert (name, args) == ("app.tasks.send_digest_task", ["a@a.com"])
+    assert eta is not None
+    assert celery.connections == 2
+    assert outbox.pending(session) == 0
+
+
+def test_broker_failure_keeps_the_rest_for_the_next_round(session):
+    for i in range(4):
+        outbox.publish(tasks.promote_waitlist_task, (i, "2040-01-01T10:00:00"), session=session)
+    session.commit()
+
+    assert outbox.relay_once(session, celery=FakeCelery(fail_at=1)) == 1
+    assert outbox.pending(session) == 3
+
+    failed = (
+        session.query(OutboxMessage)
+        .filter(OutboxMessage.sent_at.is_(None))
+        .order_by(OutboxMessage.id)
+        .first()
+    )
+    assert failed.attempts == 1
+    assert "broker went away" in failed.last_error
+
+    # the broker is back: nothing lost, nothing sent twice
+    celery = FakeCelery()
+    assert outbox.relay_once(session, celery=celery) == 3
+    assert [args[0] for _, args, _, _ in celery.sent] == [1, 2, 3]
+
+
+def test_booking_email_commits_with_the_booking(session, monkeypatch):
+    from app import digest
+    from app.conflicts import SlotConflict
+    from app.models import Service, Trainer, User
+    from app.utils import create_reservation
+
+    monkeypatch.setattr(digest, "WINDOW", 0)
+
+    login = f"u_{uuid.uuid4().hex[:8]}"
+    user = User(login=login, password="x", birth_date="2000-01-01", phone="0",
+                email=f"{login}@a.com", funds=100)
+    trainer = Trainer(name=f"T {login}", gym_id=1)
+    service = Service(name=f"S {login}", price=10, duration=60, description="x")
+    session.add_all([user, trainer, service])
+    session.commit()
+
+    reservation = create_reservation(user.id, service.id, trainer.id, "2041-03-01", "10:00")
+
+    [message] = session.query(OutboxMessage).all()
+    assert message.task == tasks.send_booking_confirmation_email_task.name
+    assert json.loads(message.args)[0] == user.email
+    assert json.loads(message.args)[-1] == "10:00"
+    assert reservation.id is not None
+
+    # a booking that fails to commit leaves no email behind
+    with pytest.raises(SlotConflict):
+        create_reservation(user.id, service.id, trainer.id, "2041-03-01", "10:00")
+    assert outbox.pending(session) == 1
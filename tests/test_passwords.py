@@ -0,0 +1,99 @@
+import threading
+import time
+import uuid
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app import database, passwords
+from app.models import User
+
+
+def _member(password_hash):
+    login = f"pw_{uuid.uuid4().hex[:8]}"
+    user = User(login=login, password=password_hash, birth_date="2000-01-01", phone="0", email=f"{login}@a.com")
+    database.db_session.add(user)
+    database.db_session.commit()
+    user_id = user.id
+    database.db_session.remove()
+    return login, user_id
+
+
+def test_pool_hashes_with_the_configured_parameters():
+    pool = passwords.HashPool(workers=1, queue=0)
+    try:
+        pwhash = pool.hash("s3cret", method="pbkdf2:sha256:1000")
+        assert pwhash.startswith("pbkdf2:sha256:1000$")
+        assert pool.check(pwhash, "s3cret")
+        assert not pool.check(pwhash, "wrong")
+        assert pool.stats == {"hashed": 1, "checked": 2, "shed": 0}
+    finally:
+        pool.close()
+
+    assert passwords.needs_rehash(pwhash)
+    assert not passwords.needs_rehash(pwhash, method="pbkdf2:sha256:1000")
+
+
+def test_login_upgrades_an_outdated_hash(client):
+    login, user_id = _member(generate_password_hash("pw", method="pbkdf2:sha256:1000"))
+
+    res = client.post("/login", data={"login": login, "password": "pw"})
+    assert res.status_code == 302 and res.headers["Location"].endswith("/user")
+
+    upgraded = database.db_session.get(User, user_id).password
+    database.db_session.remove()
+    assert upgraded.startswith(passwords.METHOD + "$")
+
+    # the new hash logs in too, and stays as it is
+    client.get("/logout")
+    assert client.post("/login", data={"login": login, "password": "pw"}).status_code == 302
+    assert database.db_session.get(User, user_id).password == upgraded
+    database.db_session.remove()
+
+
+def test_saturated_pool_sheds_with_503(client):
+    login, _user_id = _member(generate_password_hash("pw", method="pbkdf2:sha256:1000"))
+
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_check(pwhash, password):
+        entered.set()
+        release.wait(5)
+        return True
+
+    pool = passwords.configure(workers=0, queue=0)
+    try:
+        # the only slot is taken by a login still hashing
+        busy = threading.Thread(target=pool._run, args=("checked", slow_check, "x", "y"))
+        busy.start()
+        assert entered.wait(5)
+
+        res = client.post("/login", data={"login": login, "password": "pw"})
+        assert res.status_code == 503
+        assert res.headers["Retry-After"]
+        assert pool.stats["shed"] == 1
+    finally:
+        release.set()
+        busy.join()
+        passwords.configure()
+
+
+
+def test_timed_out_hash_keeps_its_slot_until_done():
+    pool = passwords.HashPool(workers=1, queue=0, timeout=0.2)
+    try:
+        pool._run("checked", time.sleep, 0)   # start the worker process
+
+        with pytest.raises(passwords.HashingBusy):
+            pool._run("checked", time.sleep, 1)
+
+        # the worker is still sleeping: its slot is not free yet
+        assert not pool._slots.acquire(blocking=False)
+
+        deadline = time.monotonic() + 5
+        while not pool._slots.acquire(blocking=False):
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        pool._slots.release()
+    finally:
+        pool.close()
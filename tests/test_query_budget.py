@@ -0,0 +1,56 @@
+import uuid
+
+from app.models import Reservation, User, Trainer, Service
+from app import database
+from app.utils import set_reservation_slot
+
+
+def _seed_reservations(n, user=None):
+    """ every reservation gets its own trainer / service (and user) so lazy loads would show """
+    session = database.db_session
+    tag = uuid.uuid4().hex[:8]
+
+    for i in range(n):
+        owner = user or User(login=f"qb_{tag}_{i}", password="-", birth_date="2000-01-01", phone="0", email=f"qb{i}@a.com")
+        trainer = Trainer(name=f"QB Trainer {tag} {i}", gym_id=1)
+        service = Service(name=f"QB {i}", duration=60, price=5, description="x")
+        session.add_all([owner, trainer, service])
+        session.flush()
+
+        r = Reservation(user_id=owner.id, trainer_id=trainer.id, service_id=service.id)
+        set_reservation_slot(r, "2035-01-01", f"{8 + i}:00", service)
+        session.add(r)
+
+    session.commit()
+    database.db_session.remove()
+    return tag
+
+
+def test_admin_reservation_page_has_flat_query_count(admin_client, query_budget):
+    tag = _seed_reservations(10)
+
+    # user_loader + count + page
+    with query_budget(3):
+        res = admin_client.get(f"/admin/reservations/partial?q=qb trainer {tag}&per_page=10")
+
+    assert res.status_code == 200
+    assert res.data.count(b"QB Trainer") == 10
+
+
+def test_member_pages_have_flat_query_count(client, query_budget):
+    session = database.db_session
+    from werkzeug.security import generate_password_hash
+
+    login = f"member_{uuid.uuid4().hex[:8]}"
+    member = User(login=login, password=generate_password_hash("pw"), birth_date="2000-01-01", phone="0", email="m@a.com", funds=100)
+    session.add(member)
+    session.commit()
+    _seed_reservations(8, user=member)
+
+    client.post("/login", data={"login": login, "password": "pw"})
+
+    # user_loader + reservations
+    with query_budget(2):
+        assert client.get("/user").status_code == 200
+    with query_budget(2):
+        assert client.get("/reservations").status_code == 200
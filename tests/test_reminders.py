@@ -0,0 +1,105 @@
+import json
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from app import database, reminders, tasks
+from app.models import User, Trainer, Service, Reservation, OutboxMessage
+from app.utils import set_reservation_slot
+
+
+NOW = datetime(2042, 5, 1, 9, 0)
+
+
+@pytest.fixture
+def session(client):
+    session = database.db_session
+    # earlier tests' reservations and messages stay out of this window
+    session.query(OutboxMessage).delete()
+    session.commit()
+    yield session
+    session.rollback()
+    database.db_session.remove()
+
+
+def _book(session, offsets, status="active"):
+    """ one member's reservations starting `offsets` (hours) after NOW """
+    login = f"rm_{uuid.uuid4().hex[:8]}"
+    user = User(login=login, password="x", birth_date="2000-01-01", phone="0", email=f"{login}@a.com")
+    trainer = Trainer(name=f"Coach {login}", gym_id=1)
+    service = Service(name="Pilates", duration=60, price=10, description="x")
+    session.add_all([user, trainer, service])
+
+    booked = []
+    for hours in offsets:
+        starts_at = NOW + timedelta(hours=hours)
+        reservation = Reservation(user=user, trainer=trainer, service=service, status=status)
+        set_reservation_slot(reservation, starts_at.strftime("%Y-%m-%d"), starts_at.strftime("%H:%M"), service)
+        session.add(reservation)
+        booked.append(reservation)
+    session.commit()
+    return booked
+
+
+def _queued(session):
+    messages = (
+        session.query(OutboxMessage)
+        .filter_by(task=tasks.send_reminders_task.name)
+        .order_by(OutboxMessage.id)
+    )
+    return [json.loads(m.args)[0] for m in messages]
+
+
+def test_each_session_in_the_window_is_reminded_once(session):
+    soon = _book(session, [1, 5, 23])
+    _book(session, [-2, 30])                  # started already / too far ahead
+    _book(session, [2], status="canceled")
+
+    assert reminders.schedule(session, now=NOW, hours=24) == 3
+    [chunk] = _queued(session)
+    assert [r["time"] for r in chunk] == ["10:00", "14:00", "08:00"]
+    assert chunk[0]["recipient"] == soon[0].user.email
+    assert chunk[0]["service_name"] == "Pilates"
+
+    # the next run finds nothing new
+    assert reminders.schedule(session, now=NOW + timedelta(minutes=5), hours=24) == 0
+    assert len(_queued(session)) == 1
+
+
+def test_chunks_fan_out_as_few_tasks(session):
+    _book(session, [1 + i / 60 for i in range(23)])
+
+    assert reminders.schedule(session, now=NOW, hours=24, scan_chunk=10, send_chunk=4) == 23
+    # 10 + 10 + 3 rows scanned -> 4 + 4 + 2, 4 + 4 + 2, 3 reminders per task
+    assert [len(chunk) for chunk in _queued(session)] == [4, 4, 2, 4, 4, 2, 3]
+    assert session.query(Reservation).filter(
+        Reservation.status == "active",
+        Reservation.starts_at >= NOW,
+        Reservation.starts_at < NOW + timedelta(hours=24),
+        Reservation.reminded_at.is_(None),
+    ).count() == 0
+
+
+def test_moved_session_is_reminded_again(session):
+    [reservation] = _book(session, [3])
+    reminders.schedule(session, now=NOW, hours=24)
+
+    set_reservation_slot(reservation, "2042-05-01", "18:00")
+    session.commit()
+
+    assert reminders.schedule(session, now=NOW, hours=24) == 1
+    assert _queued(session)[-1][0]["time"] == "18:00"
+
+
+def test_window_query_is_a_range_scan(session):
+    query = reminders._due(NOW, NOW + timedelta(hours=24), 500)
+    compiled = query.compile(session.get_bind(), compile_kwargs={"literal_binds": True})
+    plan = session.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+
+    # SQLite may pick ix_reservation_status_starts_at over the partial
+    # index; either way it's an index range, never the whole table
+    [reservation_step] = [row[-1] for row in plan if " reservation " in f"{row[-1]} "]
+    assert reservation_step.startswith("SEARCH reservation USING INDEX ix_reservation_")
+    assert "starts_at>" in reservation_step
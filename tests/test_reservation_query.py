@@ -0,0 +1,107 @@
+import uuid
+from datetime import datetime
+
+from app.models import Reservation, Trainer, Service
+from app import database
+from app.reservation_query import reservation_query, with_ui_status, paginate
+from app.utils import set_reservation_slot
+
+
+def test_status_derived_in_sql(client, make_user):
+    session = database.db_session
+
+    user = make_user("rq")
+    trainer = Trainer(name="Query Trainer", gym_id=1)
+    service = Service(name="Pilates", duration=60, price=10, description="x")
+    session.add_all([trainer, service])
+    session.commit()
+
+    now = datetime(2026, 5, 10, 12, 0)
+    for date, time, status in [
+        ("2026-05-01", "10:00", "active"),
+        ("10.05.2026", "18:00", "active"),
+        ("20.05.2026", "09:00", "active"),
+        ("2026-06-01", "09:00", "canceled"),
+    ]:
+        r = Reservation(user_id=user.id, trainer_id=trainer.id, service_id=service.id, status=status)
+        set_reservation_slot(r, date, time, service)
+        session.add(r)
+    session.commit()
+
+    rows = with_ui_status(reservation_query(user_id=user.id, now=now).all())
+    assert [r.ui_status for r in rows] == ["past", "today", "upcoming", "canceled"]
+
+    upcoming = reservation_query(status="upcoming", user_id=user.id, now=now).all()
+    assert [r.date for r, _ in upcoming] == ["20.05.2026"]
+
+    page_rows, total, total_pages, page = paginate(
+        reservation_query(user_id=user.id, now=now), page=2, per_page=3
+    )
+    assert (total, total_pages, page, len(page_rows)) == (4, 2, 2, 1)
+
+    assert rows[1].starts_at == datetime(2026, 5, 10, 18, 0)
+    assert rows[1].ends_at == datetime(2026, 5, 10, 19, 0)
+
+
+def test_search_index_follows_renames(client, make_user):
+    session = database.db_session
+
+    user = make_user("srch")
+    login = user.login
+    trainer = Trainer(name="Before Rename", gym_id=1)
+    service = Service(name="Boxing", duration=30, price=10, description="x")
+    session.add_all([trainer, service])
+    session.commit()
+
+    r = Reservation(user_id=user.id, trainer_id=trainer.id, service_id=service.id)
+    set_reservation_slot(r, "2026-07-01", "10:00", service)
+    session.add(r)
+    session.commit()
+
+    assert [row.id for row, _ in reservation_query(q=login[2:])] == [r.id]
+
+    new_name = f"Trainer {uuid.uuid4().hex[:8]}"
+    trainer.name = new_name
+    session.commit()
+
+    assert [row.id for row, _ in reservation_query(q=new_name.upper())] == [r.id]
+    assert reservation_query(q="before rename", user_id=user.id).all() == []
+
+
+def test_calendar_events_window(client, make_user):
+    from app.reservation_query import calendar_events
+
+    session = database.db_session
+
+    # test.db persists between runs: a gym no earlier run booked into
+    gym_id = uuid.uuid4().int % 10**9
+    trainer = Trainer(name="Calendar Trainer", gym_id=gym_id)
+    service = Service(name="Zumba", duration=50, price=10, description="x")
+    user = make_user("cal")
+    session.add_all([trainer, service])
+    session.commit()
+
+    for date in ("2033-02-27", "2033-03-01", "2033-04-01"):
+        r = Reservation(user_id=user.id, trainer_id=trainer.id, service_id=service.id)
+        set_reservation_slot(r, date, "08:00", service)
+        session.add(r)
+    session.commit()
+
+    events = calendar_events(datetime(2033, 2, 27), datetime(2033, 3, 2), gym_id=gym_id)
+    assert [e["start"] for e in events] == ["2033-02-27T08:00:00", "2033-03-01T08:00:00"]
+    assert events[0]["end"] == "2033-02-27T08:50:00"
+    assert events[0]["title"].startswith(user.login)
+
+    assert calendar_events(datetime(2033, 2, 27), datetime(2033, 3, 2), gym_id=gym_id + 1) == []
+
+
+def test_listing_query_strings_are_parsed_defensively(admin_client):
+    from app.reservation_query import MAX_PER_PAGE
+
+    for path in ("/admin/reservations", "/admin/reservations/partial"):
+        res = admin_client.get(f"{path}?page=x&per_page=ten&user_id=me&trainer_id=1e3&service_id=%20")
+        assert res.status_code == 200
+
+    assert admin_client.get("/admin/reservations/partial?per_page=100000").status_code == 200
+    rows, _total, _pages, _page = paginate(reservation_query(), per_page=100000)
+    assert len(rows) <= MAX_PER_PAGE
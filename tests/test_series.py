@@ -0,0 +1,99 @@
+import uuid
+
+import pytest
+
+from app.models import User, Trainer, Service, Reservation, ReservationSeries, Transaction
+from app import database
+from app.conflicts import SlotConflict
+from app.utils import create_reservation, create_series, InsufficientFunds
+from tests.conftest import count_queries
+
+
+PRICE = 25
+
+
+@pytest.fixture
+def member(client, monkeypatch):
+    from app import utils
+
+    emails = []
+    monkeypatch.setattr(utils, "send_booking_confirmation_email", lambda *args: emails.append(("single", args)))
+    monkeypatch.setattr(utils, "send_series_confirmation_email", lambda *args: emails.append(("series", args)))
+
+    session = database.db_session
+    user = User(login=f"sr_{uuid.uuid4().hex[:8]}", password="123", birth_date="2000-01-01", phone="000", email="sr@a.com", funds=1000)
+    trainer = Trainer(name="Series Trainer", gym_id=1)
+    service = Service(name="Weekly", duration=60, price=PRICE, description="x")
+    session.add_all([user, trainer, service])
+    session.commit()
+    return user.id, trainer.id, service.id, emails
+
+
+def test_series_is_one_transaction_one_charge_one_email(member):
+    user_id, trainer_id, service_id, emails = member
+
+    series = create_series(user_id, service_id, trainer_id, "2039-01-03", "18:00", count=12, idempotency_key="s-1")
+
+    session = database.db_session
+    booked = session.query(Reservation).filter_by(series_id=series.id).order_by(Reservation.starts_at).all()
+    assert [r.date for r in booked[:3]] == ["2039-01-03", "2039-01-10", "2039-01-17"]
+    assert len(booked) == 12
+
+    payments = session.query(Transaction).filter_by(user_id=user_id, type="payment").all()
+    assert [t.amount for t in payments] == [-12 * PRICE]
+    assert session.get(User, user_id).funds == 1000 - 12 * PRICE
+    assert [kind for kind, _ in emails] == ["series"]
+
+    # retried submit: same series, nothing charged twice
+    assert create_series(user_id, service_id, trainer_id, "2039-01-03", "18:00", count=12, idempotency_key="s-1").id == series.id
+    assert session.query(ReservationSeries).filter_by(user_id=user_id).count() == 1
+    assert len(emails) == 1
+
+
+def test_series_conflict_or_funds_books_nothing(member):
+    user_id, trainer_id, service_id, _emails = member
+    create_reservation(user_id, service_id, trainer_id, "2039-03-21", "18:30")   # clashes with week 3
+
+    with pytest.raises(SlotConflict):
+        create_series(user_id, service_id, trainer_id, "2039-03-07", "18:00", count=4)
+    with pytest.raises(InsufficientFunds):
+        create_series(user_id, service_id, trainer_id, "2039-06-06", "18:00", count=52)
+    with pytest.raises(ValueError):
+        create_series(user_id, service_id, trainer_id, "2039-06-06", "18:00", count=0)
+
+    session = database.db_session
+    assert session.query(Reservation).filter_by(user_id=user_id).count() == 1
+    assert session.get(User, user_id).funds == 1000 - PRICE
+
+
+def test_series_costs_about_one_booking(member):
+    user_id, trainer_id, service_id, _emails = member
+
+    with count_queries(database.engine) as single:
+        create_reservation(user_id, service_id, trainer_id, "2039-09-01", "07:00")
+    with count_queries(database.engine) as series:
+        create_series(user_id, service_id, trainer_id, "2039-09-02", "07:00", count=12)
+
+    # SQLite has no insert sentinel, so the ORM sends the occurrences as one
+    # INSERT each (Postgres batches them); everything else must not grow with count
+    inserts = [s for s in series if s.startswith("INSERT INTO reservation ")]
+    assert len(inserts) == 12
+    assert len(series) - len(inserts) <= len(single), "\n".join(series)
+
+
+def test_booking_form_tells_a_bad_date_from_a_bad_count(member, admin_client):
+    _user_id, trainer_id, service_id, _emails = member
+
+    def book(date, weeks, time="18:00"):
+        return admin_client.post(f"/book/{service_id}", data={
+            "trainer_id": trainer_id, "date": date, "time": time, "repeat_weeks": weeks,
+        }).get_data(as_text=True)
+
+    assert "valid date" in book("03/01/2039", 4)
+    assert "1 to 52 weekly sessions" in book("2039-01-03", 99)
+
+    # a single booking too: nothing is charged or booked without a slot
+    assert "valid date" in book("2039-01-03", 1, time="25:99")
+    assert "valid date" in book("2039-01-03", 1, time="evening")
+    assert "valid date" in book("2039-01-03", 4, time="25:99")
+    assert database.db_session.query(Reservation).filter_by(trainer_id=trainer_id).count() == 0
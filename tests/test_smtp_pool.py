@@ -0,0 +1,124 @@
+import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.smtp_pool import SMTPPool
+from tests.smtp_stub import SMTPStub
+
+
+MESSAGE = "Subject: hi\r\n\r\nhello\r\n"
+
+
+@pytest.fixture
+def smtp():
+    server = SMTPStub().start()
+    yield server
+    server.stop()
+
+
+def _pool(server, **settings):
+    settings.setdefault("noop_after", 60)
+    return SMTPPool("127.0.0.1", server.port, "sender@a.com", "secret", starttls=False, **settings)
+
+
+def test_sessions_are_reused(smtp):
+    pool = _pool(smtp)
+    for i in range(20):
+        pool.send("sender@a.com", [f"member{i}@a.com"], MESSAGE)
+    pool.close()
+
+    assert len(smtp.messages) == 20
+    assert (smtp.connections, smtp.logins) == (1, 1)
+    assert pool.stats["reuses"] == 19
+
+
+def test_max_messages_per_session(smtp):
+    pool = _pool(smtp, max_messages=5)
+    for i in range(20):
+        pool.send("sender@a.com", ["member@a.com"], MESSAGE)
+
+    assert len(smtp.messages) == 20
+    assert smtp.connections == 4
+
+
+def test_parallel_senders_stay_within_pool_size(smtp):
+    pool = _pool(smtp, size=3)
+    with ThreadPoolExecutor(8) as workers:
+        list(workers.map(lambda i: pool.send("sender@a.com", ["member@a.com"], MESSAGE), range(60)))
+
+    assert len(smtp.messages) == 60
+    assert smtp.connections <= 3
+
+
+def test_dropped_session_is_replaced(smtp):
+    # idle sessions get a NOOP first
+    pool = _pool(smtp, noop_after=0)
+    pool.send("sender@a.com", ["member@a.com"], MESSAGE)
+    smtp.drop_connections()
+    time.sleep(0.05)
+    pool.send("sender@a.com", ["member@a.com"], MESSAGE)
+
+    assert len(smtp.messages) == 2
+    assert smtp.connections == 2
+    assert pool.stats["noops"] == 1
+
+    # no health check: the send itself fails and is retried once
+    pool = _pool(smtp)
+    pool.send("sender@a.com", ["member@a.com"], MESSAGE)
+    smtp.drop_connections()
+    time.sleep(0.05)
+    pool.send("sender@a.com", ["member@a.com"], MESSAGE)
+
+    assert len(smtp.messages) == 4
+    assert pool.stats["reconnects"] == 1
+
+
+def test_unreachable_server_raises():
+    server = SMTPStub()
+    port = server.port
+    server.server_close()
+
+    pool = SMTPPool("127.0.0.1", port, starttls=False, timeout=1)
+    with pytest.raises(OSError):
+        pool.send("sender@a.com", ["member@a.com"], MESSAGE)
+    # the slot was given back
+    assert pool._slots.acquire(blocking=False)
+
+
+def test_interrupted_send_drops_the_session(smtp, monkeypatch):
+    pool = _pool(smtp, size=1)
+    pool.send("sender@a.com", ["member@a.com"], MESSAGE)
+
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(smtplib.SMTP, "sendmail", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        pool.send("sender@a.com", ["member@a.com"], MESSAGE)
+    monkeypatch.undo()
+
+    # the slot came back; the half-used session did not
+    pool.send("sender@a.com", ["member@a.com"], MESSAGE)
+    assert len(smtp.messages) == 2
+    assert smtp.connections == 2
+
+
+def test_send_email_uses_the_pool(smtp, monkeypatch):
+    from app import tasks, smtp_pool
+
+    monkeypatch.setattr(tasks, "PASSWORD", "secret")
+    monkeypatch.setattr(tasks, "SMTP_SERVER", "127.0.0.1")
+    monkeypatch.setattr(tasks, "SMTP_PORT", smtp.port)
+    monkeypatch.setattr(tasks, "SMTP_STARTTLS", False)
+    smtp_pool.close_pool()
+
+    try:
+        for _ in range(3):
+            tasks.send_email("member@a.com", "Booking", "<p>booked</p>")
+    finally:
+        smtp_pool.close_pool()
+
+    assert len(smtp.messages) == 3
+    assert smtp.connections == 1
@@ -0,0 +1,60 @@
+import uuid
+
+from app.models import Trainer, Service
+from app import database, stats
+from app.utils import create_reservation, update_reservation, cancel_reservation
+
+
+def test_counters_follow_write_paths(client, monkeypatch, make_user):
+    from app import utils
+
+    for name in ("send_booking_confirmation_email", "send_booking_updated_email", "send_booking_canceled_email"):
+        monkeypatch.setattr(utils, name, lambda *args, **kwargs: None)
+
+    session = database.db_session
+    stats.reconcile()
+
+    user = make_user("st", funds=100)
+    trainer = Trainer(name="Stats Trainer", gym_id=1)
+    service = Service(name="Stats", duration=60, price=30, description="x")
+    session.add_all([trainer, service])
+    session.commit()
+
+    before = stats.read(stats.DASHBOARD_COUNTERS)
+
+    r = create_reservation(user.id, service.id, trainer.id, "2034-01-01", "10:00")
+    update_reservation(r.id, user.id, "2034-01-02", "10:00")
+
+    after = stats.read(stats.DASHBOARD_COUNTERS)
+    assert after["reservations"] == before["reservations"] + 1
+    assert after["active_reservations"] == before["active_reservations"] + 1
+    assert after["revenue"] == before["revenue"] + 30
+
+    cancel_reservation(r.id, user.id)
+    assert stats.read(stats.DASHBOARD_COUNTERS)["revenue"] == before["revenue"]
+
+    # the users / trainers / services above were inserted directly - reconcile picks them up
+    drift = stats.reconcile()
+    assert set(drift) <= {"users", "trainers", "services"}
+    assert stats.reconcile() == {}
+
+
+def test_deltas_commit_with_the_transaction_and_fold_away(client):
+    from app.models import StatDelta
+
+    session = database.db_session
+    name = f"test_{uuid.uuid4().hex[:8]}"
+
+    stats.incr(name, 5)
+    session.rollback()
+    stats.incr(name, 2)
+    stats.incr(name, 1)
+    session.commit()
+
+    # one row for the transaction, nothing from the rolled-back one
+    assert session.query(StatDelta.value).filter(StatDelta.name == name).all() == [(3,)]
+    assert stats.read((name,)) == {name: 3}
+
+    assert stats.fold() >= 1
+    assert session.query(StatDelta).filter(StatDelta.name == name).count() == 0
+    assert stats.read((name,)) == {name: 3}
@@ -0,0 +1,116 @@
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+from werkzeug.security import generate_password_hash
+
+from app import database, ledger, user_cache
+from app.app import app
+from app.models import User
+from tests.conftest import count_queries
+
+
+@pytest.fixture
+def member(client):
+    """ (its own logged-in client, user id): admin_client takes `client` """
+    login = f"uc_{uuid.uuid4().hex[:8]}"
+    user = User(login=login, password=generate_password_hash("pw"), birth_date="2000-01-01",
+                phone="0", email=f"{login}@a.com", funds=100)
+    database.db_session.add(user)
+    database.db_session.commit()
+    user_id = user.id
+    database.db_session.remove()
+
+    member_client = app.test_client()
+    member_client.post("/login", data={"login": login, "password": "pw"})
+    return member_client, user_id
+
+
+def _user_queries(statements):
+    return [s for s in statements if "FROM user" in s]
+
+
+def test_cached_user_costs_no_query(member):
+    client, _user_id = member
+
+    for _ in range(3):
+        with count_queries(database.engine) as statements:
+            assert client.get("/profile").status_code == 200
+        assert _user_queries(statements) == []
+
+
+def test_funds_change_is_seen_on_the_next_request(member):
+    client, user_id = member
+    client.get("/profile")
+
+    ledger.post(user_id, 30, "deposit")
+    database.db_session.commit()
+    database.db_session.remove()
+
+    assert b"$130" in client.get("/profile").data
+
+
+def test_profile_edit_through_the_cached_user_is_saved(member):
+    client, user_id = member
+    client.get("/profile")
+    version = database.db_session.get(User, user_id).cache_version
+    database.db_session.remove()
+
+    client.post("/profile/edit", data={
+        "login": f"renamed_{user_id}", "email": "new@a.com", "phone": "1", "birth_date": "2000-01-01",
+    })
+
+    user = database.db_session.get(User, user_id)
+    assert (user.email, user.cache_version) == ("new@a.com", version + 1)
+    database.db_session.remove()
+    assert b"new@a.com" in client.get("/profile").data
+
+
+def test_ban_logs_the_member_out_on_the_next_request(member):
+    client, user_id = member
+    assert client.get("/profile").status_code == 200
+
+    # what admin_ban_user does
+    database.db_session.get(User, user_id).is_banned = True
+    database.db_session.commit()
+    database.db_session.remove()
+
+    res = client.get("/profile")
+    assert res.status_code == 302 and "/login" in res.headers["Location"]
+
+
+def test_change_made_elsewhere_is_found_by_the_periodic_check(member, monkeypatch):
+    client, user_id = member
+    assert client.get("/profile").status_code == 200
+
+    # another process bans the member: no commit hook runs here
+    table = User.__table__
+    with database.engine.begin() as conn:
+        conn.execute(
+            update(table).where(table.c.id == user_id)
+            .values(is_banned=True, **user_cache.bump_values())
+        )
+
+    # until the check runs, this process still trusts its entry
+    assert client.get("/profile").status_code == 200
+
+    monkeypatch.setattr(user_cache, "_checked_at", datetime.utcnow() - timedelta(hours=2))
+    assert client.get("/profile").status_code == 302
+
+
+def test_version_is_stamped_as_the_transaction_commits(member):
+    _client, user_id = member
+    session = database.db_session
+    stamp = select(User.versioned_at).where(User.id == user_id)
+
+    session.get(User, user_id).phone = "1"
+    session.flush()
+    flushed = session.execute(stamp).scalar()
+    time.sleep(0.01)
+    session.commit()
+
+    # a slow transaction is not stamped in the past of a check it missed
+    assert session.execute(stamp).scalar() > flushed
+    database.db_session.remove()
@@ -0,0 +1,107 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.models import User, Trainer, Service, Reservation, Transaction, WaitlistEntry
+from app import database
+from app.tasks import promote_waitlist_task
+from app.utils import (
+    create_reservation,
+    cancel_reservation,
+    join_waitlist,
+    waitlist_position,
+    promote_waitlist_head,
+)
+
+
+PRICE = 20
+SLOT = ("2040-02-03", "09:00")
+
+
+@pytest.fixture
+def slot(client, monkeypatch):
+    from app import utils
+
+    sent = {"emails": [], "promotions": []}
+    for name in ("send_booking_confirmation_email", "send_booking_canceled_email"):
+        monkeypatch.setattr(utils, name, lambda *args, _n=name: sent["emails"].append((_n, args)))
+    monkeypatch.setattr(utils, "promote_waitlist", lambda *args: sent["promotions"].append(args))
+
+    session = database.db_session
+    trainer = Trainer(name="Waitlist Trainer", gym_id=1)
+    service = Service(name="Waitlisted", duration=60, price=PRICE, description="x")
+    session.add_all([trainer, service])
+    session.commit()
+    ids = trainer.id, service.id
+    database.db_session.remove()
+    return ids, sent
+
+
+def test_cancellation_promotes_first_waiter(slot, make_user):
+    (trainer_id, service_id), sent = slot
+    holder, broke, first, second = [make_user("wl", funds=funds).id for funds in (PRICE, 0, PRICE, PRICE)]
+
+    booked = create_reservation(holder, service_id, trainer_id, *SLOT)
+    entries = [join_waitlist(u, service_id, trainer_id, *SLOT) for u in (broke, first, second)]
+    assert [waitlist_position(e) for e in entries] == [1, 2, 3]
+    assert join_waitlist(first, service_id, trainer_id, *SLOT).id == entries[1].id
+    assert sent["promotions"] == []   # slot is taken: nothing to promote yet
+
+    cancel_reservation(booked.id, holder)
+    assert sent["promotions"] == [(trainer_id, "2040-02-03T09:00:00")]
+
+    # the Celery task, run inline
+    reservation_id = promote_waitlist_task(*sent["promotions"][0])
+
+    session = database.db_session
+    reservation = session.get(Reservation, reservation_id)
+    assert (reservation.user_id, reservation.date, reservation.time) == (first, *SLOT)
+    assert session.get(User, first).funds == 0
+    assert session.query(Transaction).filter_by(user_id=first, type="payment").count() == 1
+    assert sent["emails"][-1][0] == "send_booking_confirmation_email"
+
+    statuses = {e.user_id: (e.status, e.reservation_id) for e in session.query(WaitlistEntry).filter_by(trainer_id=trainer_id)}
+    assert statuses == {
+        broke: ("skipped", None),
+        first: ("promoted", reservation_id),
+        second: ("waiting", None),
+    }
+
+    # slot is taken again: the next run leaves the queue alone
+    assert promote_waitlist_head(trainer_id, reservation.starts_at) is None
+    assert session.query(WaitlistEntry).filter_by(user_id=second, status="waiting").count() == 1
+
+
+def test_cancel_without_waiters_queues_nothing(slot, make_user):
+    (trainer_id, service_id), sent = slot
+    holder = make_user("wl", funds=PRICE).id
+
+    booked = create_reservation(holder, service_id, trainer_id, "2040-02-04", "09:00")
+    cancel_reservation(booked.id, holder)
+
+    assert sent["promotions"] == []
+
+
+def test_concurrent_promotions_book_the_slot_once(slot, make_user):
+    (trainer_id, service_id), _sent = slot
+    waiters = [make_user("wl", funds=PRICE).id for _ in range(5)]
+    for u in waiters:
+        join_waitlist(u, service_id, trainer_id, "2040-02-05", "09:00")
+    starts_at = database.db_session.query(WaitlistEntry.starts_at).filter_by(user_id=waiters[0]).scalar()
+    database.db_session.remove()
+
+    def promote(_):
+        try:
+            r = promote_waitlist_head(trainer_id, starts_at)
+            return r and r.user_id
+        finally:
+            database.db_session.remove()
+
+    with ThreadPoolExecutor(8) as pool:
+        winners = [w for w in pool.map(promote, range(8)) if w]
+
+    session = database.db_session
+    assert winners == [waiters[0]]
+    assert session.query(Reservation).filter_by(trainer_id=trainer_id, starts_at=starts_at).count() == 1
+    assert session.query(Transaction).filter(Transaction.user_id.in_(waiters)).count() == 1
+    assert session.query(WaitlistEntry).filter_by(trainer_id=trainer_id, status="waiting").count() == 4